@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.buffer
+================
+A write-behind buffer for votes, for items that get voted on faster than
+their rows can be updated one vote at a time.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import unicode_literals
+import atexit
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import PendingVote
+from .registry import get_content_type_id, get_settings_for_content_type
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBuffer(object):
+    """
+    Collects votes in the `PendingVote` table, and writes them to the real
+    vote tables in batches with `VoteManager.bulk_add_votes`. If a user
+    votes on the same item more than once before the buffer is flushed,
+    only their last vote is written, and each item's scores are only
+    recalculated once per flush. Adding a vote is a single ``INSERT`` into
+    a table nothing else touches, so it never waits on the item's row.
+
+    The buffer is flushed when this process has added `max_size` votes (in
+    the thread that added the last one), `max_delay` seconds after the first
+    one (in a background thread), and when the process exits. A flush writes
+    every pending vote, not just this process's -- so if a process is killed
+    outright, its votes are written by the next flush anywhere. (The
+    ``flush_vote_buffer`` command does one, if you want to run it from cron.)
+
+    `pre_vote` and `post_vote` are sent once for every vote, when it's
+    written, and `post_vote` only after the write has been committed. If a
+    batch can't be written, its votes stay pending, and are tried again by
+    later flushes, up to `max_attempts` times. Votes that still can't be
+    written are left in the table (and logged) for someone to look at.
+
+    :param max_size:        How many votes to add before flushing. Defaults
+                            to the `DEMOCRACY_VOTE_BUFFER_SIZE` setting,
+                            or 500.
+    :param max_delay:       How many seconds a vote can wait before being
+                            written. Defaults to the
+                            `DEMOCRACY_VOTE_BUFFER_DELAY` setting, or 2. If
+                            this is 0, votes are only written when the
+                            buffer fills up, or when `flush` is called.
+    :param max_attempts:    How many times to try writing a vote. Defaults
+                            to the `DEMOCRACY_VOTE_BUFFER_ATTEMPTS` setting,
+                            or 5.
+    :param claim_timeout:   How many seconds a flush has to write the votes
+                            it's claimed before another flush may take them
+                            over. Defaults to the
+                            `DEMOCRACY_VOTE_BUFFER_CLAIM_TIMEOUT` setting,
+                            or 60.
+    """
+    def __init__(self, max_size=None, max_delay=None, max_attempts=None,
+                 claim_timeout=None):
+        if max_size is None:
+            max_size = getattr(settings, 'DEMOCRACY_VOTE_BUFFER_SIZE', 500)
+        if max_delay is None:
+            max_delay = getattr(settings, 'DEMOCRACY_VOTE_BUFFER_DELAY', 2)
+        if max_attempts is None:
+            max_attempts = getattr(settings,
+                                   'DEMOCRACY_VOTE_BUFFER_ATTEMPTS', 5)
+        if claim_timeout is None:
+            claim_timeout = getattr(settings,
+                                    'DEMOCRACY_VOTE_BUFFER_CLAIM_TIMEOUT', 60)
+
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+
+        self._lock = threading.Lock()
+        self._added = 0
+        self._timer = None
+
+        atexit.register(self.flush)
+
+    def __len__(self):
+        """
+        The number of items and users with a vote (or a removal) waiting
+        to be written, from any process.
+        """
+        return PendingVote.objects.values('content_type', 'object_id',
+                                          'user').distinct().count()
+
+    def add(self, item, user, reason_obj):
+        """
+        Adds a vote to the buffer. (`ObjectVotes.add_vote` calls this for
+        buffered items.)
+
+        :param item:        The item being voted on.
+        :param user:        The user voting.
+        :param reason_obj:  The `VoteReason` they're voting with.
+        :return:            An unsaved vote object, which will not be
+                            updated when the vote is written.
+        """
+        self._spool(item, user, reason_obj.direction, reason_obj.reason)
+        return type(item).votes.vote_model(item=item, user=user,
+                                           direction=reason_obj.direction,
+                                           reason=reason_obj.reason)
+
+    def discard(self, item, user):
+        """
+        Throws away a user's vote on an item, if it hasn't been written yet.
+        (`ObjectVotes.remove_vote` calls this for buffered items.)
+
+        This adds a removal to the buffer rather than deleting the pending
+        vote, so a flush that's already started writing the vote can't
+        bring it back -- the removal is written after it.
+        """
+        self._spool(item, user, 0, '')
+
+    def _spool(self, item, user, direction, reason):
+        PendingVote.objects.create(
+            content_type_id=get_content_type_id(item), object_id=item.pk,
+            user_id=user.pk, direction=direction, reason=reason
+        )
+
+        with self._lock:
+            self._added += 1
+            full = self._added >= self.max_size
+
+            if not full and self._timer is None and self.max_delay:
+                self._timer = threading.Timer(self.max_delay,
+                                              self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all the pending votes to the database.
+        """
+        with self._lock:
+            self._added = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        # Votes that fail are left for the next flush, rather than tried
+        # again straight away.
+        while True:
+            token = self._claim()
+            if token is None or not self._write(token):
+                break
+
+    def _claim(self):
+        """
+        Claims the oldest batch of pending votes that nobody else is writing,
+        and returns the token they were claimed with, or `None` if there's
+        nothing to write.
+        """
+        now = timezone.now()
+        claimable = PendingVote.objects.filter(
+            Q(claimed=None) |
+            Q(claimed__lt=now - timedelta(seconds=self.claim_timeout)),
+            attempts__lt=self.max_attempts
+        )
+        ids = list(claimable.order_by('id')
+                            .values_list('id', flat=True)[:self.max_size])
+        if not ids:
+            return None
+
+        # If another flush got some of them first, the UPDATE skips those.
+        token = uuid.uuid4().hex
+        claimable.filter(id__in=ids).update(claimed=now, claimed_by=token)
+        return token
+
+    def _write(self, token):
+        """
+        Writes the votes claimed with `token`, then deletes them. Returns
+        `False` if any of them couldn't be written.
+        """
+        rows = PendingVote.objects.filter(claimed_by=token)
+
+        # The last entry for each item and user wins.
+        latest = {}
+        row_ids = {}
+        for row in rows.order_by('id'):
+            key = (row.content_type_id, row.object_id, row.user_id)
+            latest[key] = row
+            row_ids.setdefault(key, []).append(row.id)
+
+        ids_by_model = {}
+        for (ctype_id, object_id, _) in latest:
+            ids_by_model.setdefault(ctype_id, set()).add(object_id)
+        items = {}
+        for (ctype_id, ids) in ids_by_model.items():
+            vote_settings = get_settings_for_content_type(ctype_id)
+            if vote_settings is None:
+                continue
+            found = vote_settings.model._default_manager.in_bulk(list(ids))
+            items.update(((ctype_id, pk), item)
+                         for (pk, item) in found.items())
+        users = get_user_model()._default_manager.in_bulk(
+            list(set(user_id for (_, _, user_id) in latest))
+        )
+
+        adds = {}
+        removals = []
+        for (key, row) in latest.items():
+            item = items.get(key[:2])
+            user = users.get(key[2])
+            if item is None or user is None:
+                # It's gone, and so are its votes.
+                continue
+            elif row.direction == 0:
+                removals.append((key, item, user))
+            else:
+                vote_model = type(item).votes.vote_model
+                adds.setdefault(vote_model, []).append(
+                    (key, (item, user, row.direction, row.reason))
+                )
+
+        failed = set()
+        for (vote_model, votes) in adds.items():
+            try:
+                vote_model.objects.bulk_add_votes(
+                    [vote for (_, vote) in votes], per_vote_signals=True
+                )
+            except Exception:
+                logger.exception("Could not write a batch of %d votes",
+                                 len(votes))
+                failed.update(key for (key, _) in votes)
+
+        for (key, item, user) in removals:
+            try:
+                vote = item.votes.vote_objects.get_user_vote(item, user)
+                if vote is not None:
+                    vote.delete()
+            except Exception:
+                logger.exception("Could not remove %s's vote on %r",
+                                 user, item)
+                failed.add(key)
+
+        done = [pk for (key, ids) in row_ids.items() if key not in failed
+                for pk in ids]
+        PendingVote.objects.filter(id__in=done).delete()
+
+        if failed:
+            # The rest are tried again by a later flush.
+            retry = [pk for key in failed for pk in row_ids[key]]
+            PendingVote.objects.filter(id__in=retry).update(
+                claimed=None, claimed_by='', attempts=F('attempts') + 1
+            )
+            given_up = PendingVote.objects.filter(
+                id__in=retry, attempts__gte=self.max_attempts
+            ).count()
+            if given_up:
+                logger.error("Gave up on writing %d votes, which are still "
+                             "in the pending vote table", given_up)
+        return not failed
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # This thread got its own database connection, so clean it up.
+            connection.close()
+
+
+_default_buffer = None
+
+
+def get_default_buffer():
+    """
+    Returns the `VoteBuffer` used by ``Votable(buffered=True)``, creating it
+    the first time.
+    """
+    global _default_buffer
+    if _default_buffer is None:
+        _default_buffer = VoteBuffer()
+    return _default_buffer
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.management.commands.flush_vote_buffer
+===============================================
+Writes any buffered votes that are still pending -- say, because the
+process that buffered them was killed before it could flush.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.core.management.base import NoArgsCommand
+
+from ...buffer import get_default_buffer
+from ...models import PendingVote
+
+
+class Command(NoArgsCommand):
+    help = ("Writes any buffered votes that are still pending, including "
+            "ones left behind by processes that were killed.")
+
+    def handle_noargs(self, **options):
+        before = PendingVote.objects.count()
+        get_default_buffer().flush()
+        if int(options.get('verbosity', 1)) >= 1:
+            self.stdout.write("Wrote %d pending votes (%d left)" %
+                              (before, PendingVote.objects.count()))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.management.commands.rebuild_vote_tallies
+==================================================
+Recounts every vote and rebuilds the `VoteTally` table from scratch.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.loading import get_model
+
+from ...models import VoteTally
+from ...voting import VoteSettings, get_votable_models
+
+
+class Command(BaseCommand):
+    args = "[app_label.ModelName ...]"
+    help = ("Recounts the votes on the given models (or every votable model) "
+            "and rebuilds their vote tallies from scratch.")
+
+    def handle(self, *labels, **options):
+        if labels:
+            models = []
+            for label in labels:
+                try:
+                    app_label, model_name = label.split(".")
+                except ValueError:
+                    raise CommandError("Models must be given as "
+                                       "app_label.ModelName, not %s" % label)
+
+                model = get_model(app_label, model_name)
+                if model is None:
+                    raise CommandError("Model %s not found" % label)
+                if not isinstance(getattr(model, 'votes', None), VoteSettings):
+                    raise CommandError("Model %s is not votable" % label)
+                models.append(model)
+        else:
+            models = get_votable_models()
+
+        for model in models:
+            VoteTally.objects.rebuild(model)
+            if int(options.get('verbosity', 1)) >= 1:
+                self.stdout.write("Rebuilt vote tallies for %s.%s" %
+                                  (model._meta.app_label,
+                                   model._meta.object_name))
@@ -8,20 +8,45 @@ Additional database support for our models.
 :license:   MIT/X11, see package's LICENSE for details
 """
 from __future__ import unicode_literals
+import time
 
-from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction, IntegrityError
+from django.db.models.query import QuerySet
 from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+from .registry import get_content_type_id, get_settings_for_content_type
+
+
+REASON_VERSION_KEY = "democracy:reasons:version"
+REASON_KEY = "democracy:reasons:%s:v%s"
 
 
 class VoteReasonManager(models.Manager):
     """
     This is a manager for `VoteReason`. You don't need to do anything
     fancy with it.
+
+    Each model's reasons are cached in the Django cache, so every process
+    shares them, and each process keeps its own copy in memory too. Saving
+    or deleting a reason bumps a version number in the cache, which is part
+    of the shared copies' keys, and which other processes check at most
+    once every `DEMOCRACY_REASON_CACHE_INTERVAL` seconds (default 1) -- so
+    for up to that long after a change, they may still use the old reasons.
+
+    The version is bumped when the reason is saved, not when it's
+    committed, so a process that loads the reasons in between can share
+    the old ones under the new version. Shared copies only last for
+    `DEMOCRACY_REASON_CACHE_TIMEOUT` seconds (default 300), which is how
+    long that can go on.
     """
     def __init__(self, *args, **kwargs):
         super(VoteReasonManager, self).__init__(*args, **kwargs)
         self._reason_cache = {}
+        self._version = None
+        self._version_checked = 0
 
     def contribute_to_class(self, model_cls, name):
         super(VoteReasonManager, self).contribute_to_class(model_cls, name)
@@ -30,20 +55,53 @@ class VoteReasonManager(models.Manager):
         post_delete.connect(self._clear_reason_cache, sender=model_cls)
 
     def _clear_reason_cache(self, sender, **kwargs):
-        if 'instance' in kwargs:
-            model = kwargs['instance'].content_type.model_class()
-            if model in self._reason_cache:
-                del self._reason_cache[model]
+        if 'instance' not in kwargs:
+            return
+        vote_settings = get_settings_for_content_type(
+            kwargs['instance'].content_type_id
+        )
+        if vote_settings is not None:
+            self._reason_cache.pop(vote_settings.model, None)
 
-    def get_for_model(self, model):
-        """
-        Gets the voting reasons in the database for a particular model class.
+        # A new version means new keys for the shared copies, and tells the
+        # other processes to throw out their own copies.
+        old_version = self._version
+        try:
+            self._version = cache.incr(REASON_VERSION_KEY)
+        except ValueError:
+            self._version = self._reset_version()
+        if old_version is None or self._version != old_version + 1:
+            # Someone else changed something since we last checked, so
+            # anything else we have might be stale too.
+            self._reason_cache.clear()
 
-        :param model:   The model to grab.
-        :return:        A list of `VoteReason` objects.
-        """
-        if model in self._reason_cache:
-            return self._reason_cache[model]
+    def _reset_version(self):
+        version = int(time.time() * 1000)
+        if not cache.add(REASON_VERSION_KEY, version, None):
+            version = cache.get(REASON_VERSION_KEY, version)
+        return version
+
+    def _check_version(self):
+        now = time.time()
+        interval = getattr(settings, 'DEMOCRACY_REASON_CACHE_INTERVAL', 1)
+        if now - self._version_checked < interval:
+            return
+        self._version_checked = now
+
+        version = cache.get(REASON_VERSION_KEY)
+        if version is None:
+            version = self._reset_version()
+        if version != self._version:
+            # Something changed somewhere, so anything we have might be
+            # stale. (The shared copies of whatever changed were deleted.)
+            self._reason_cache.clear()
+            self._version = version
+
+    def _get_cached(self, model):
+        self._check_version()
+        cached = self._reason_cache.get(model)
+        if cached is not None:
+            return cached
 
         vote_settings = getattr(model, 'votes', None)
 
@@ -52,42 +110,574 @@ class VoteReasonManager(models.Manager):
         if not isinstance(vote_settings, VoteSettings):
             raise TypeError("Models must have a Votable named 'votes'")
 
-        ctype = ContentType.objects.get_for_model(model)
+        key = REASON_KEY % (vote_settings.content_type_id, self._version)
+        reasons = cache.get(key)
+        if reasons is None:
+            qset = self.filter(content_type__id=vote_settings.content_type_id)
+            if not vote_settings.downvotes_allowed:
+                # Silently drop downvotes so we don't have to worry about it.
+                qset = qset.filter(direction=1)
+            reasons = tuple(qset)
+            cache.set(key, reasons,
+                      getattr(settings, 'DEMOCRACY_REASON_CACHE_TIMEOUT', 300))
+
+        table = dict(((r.direction, r.reason), r) for r in reasons)
+        cached = self._reason_cache[model] = (reasons, table)
+        return cached
+
+    def get_for_model(self, model):
+        """
+        Gets the voting reasons in the database for a particular model class.
+
+        :param model:   The model to grab.
+        :return:        A list of `VoteReason` objects.
+        """
+        return self._get_cached(model)[0]
+
+    def get_table_for_model(self, model):
+        """
+        Like `get_for_model`, but returns a dict mapping each reason's
+        ``(direction, reason)`` to the `VoteReason`, for quick lookups.
+        """
+        return self._get_cached(model)[1]
 
-        qset = self.filter(content_type__id=ctype.id)
-        if not vote_settings.downvotes_allowed:
-            # Silently drop downvotes so we don't have to worry about it.
-            qset = qset.filter(direction=1)
 
-        reasons = self._reason_cache[model] = tuple(qset)
-        return reasons
+def _item_ids(items):
+    """
+    Turns an iterable of model instances and/or primary keys into a list
+    of primary keys.
+    """
+    return [item.pk if isinstance(item, models.Model) else item
+            for item in items]
 
 
 class VoteManager(models.Manager):
     """
     This is a manager for `Vote`.
 
-    If you have a custom `AbstractVote` subclass, you will need to implement
-    each of these methods as well. But otherwise, we don't do anything
-    fancy with the managers.
+    Everything here finds votes through `for_model` and `item_field`, so a
+    custom `AbstractVote` subclass only needs to override those two (like
+    `ItemVoteManager` does for the models `make_vote_model` builds).
     """
+    #: The field that holds the primary key of each vote's item.
+    item_field = 'object_id'
+
+    def for_model(self, model):
+        """
+        Returns a `QuerySet` of every vote on items of `model`.
+        """
+        return self.filter(content_type__pk=get_content_type_id(model))
+
     def get_user_vote(self, item, user):
         """
         Returns a particular user's `Vote` on an item, or `None` if they
         have not yet voted.
         """
-        ctype = ContentType.objects.get_for_model(item)
         try:
-            return self.get(content_type__pk=ctype.id, object_id=item.id,
-                            user=user)
+            return self.for_item(item).get(user=user)
         except models.ObjectDoesNotExist:
             return None
 
+    def count_by_reason(self, model, items=None):
+        """
+        Counts the effective votes on items of the same model by direction
+        and reason, using a single grouped query.
+
+        :param model:   The model class the items are instances of.
+        :param items:   An iterable of items, or their primary keys.
+                        If this is `None`, every item with votes is counted.
+        :return:        A dict mapping each item's primary key to a dict
+                        mapping ``(direction, reason)`` to a number of votes.
+                        Items without any effective votes are left out.
+        """
+        if items is None:
+            qset = self.for_model(model)
+        else:
+            qset = self.for_items(model, items)
+
+        item_field = self.item_field
+        reasons = qset.filter(effective=True) \
+            .values(item_field, 'direction', 'reason') \
+            .annotate(votes=models.Count('direction'))
+
+        counts = {}
+        for row in reasons:
+            counts.setdefault(row[item_field], {})[
+                (row['direction'], row['reason'])
+            ] = row['votes']
+        return counts
+
+    def bulk_add_votes(self, votes, per_vote_signals=False):
+        """
+        Places lots of votes at once, like calling `ObjectVotes.add_vote`
+        for each one, but with a handful of queries per model instead of
+        several per vote. Each item's tally, counters, and scores are only
+        adjusted once, by the net change from all of its votes, and instead
+        of the usual per-vote signals, `pre_bulk_vote` and `post_bulk_vote`
+        are each sent once per model.
+
+        If the same user votes on the same item more than once, their
+        last vote wins.
+
+        If `per_vote_signals` is `True`, `pre_vote` and `post_vote` are sent
+        for every vote (just like `AbstractVote.save` does) instead.
+
+        :param votes:       An iterable of ``(item, user, direction, reason)``
+                            tuples. `direction` and `reason` can be in any
+                            format `VoteSettings.get_reason_object` accepts.
+        :raises ValueError: If any direction/reason combination is invalid,
+                            or any item's votes aren't stored in this
+                            manager's model. (In that case, no votes are
+                            saved.)
+        :return:            A list of the saved `Vote` objects.
+        """
+        # Circular dependencies :-(
+        from .models import VoteTally, vote_change
+        from .signals import (pre_bulk_vote, post_bulk_vote, pre_vote,
+                              post_vote, vote_counts_changed)
+
+        # Sort out which votes go with which model, and check the reasons
+        # before touching the database.
+        by_model = {}
+        for (item, user, direction, reason) in votes:
+            vote_model = type(item).votes.vote_model
+            if vote_model is not self.model:
+                raise ValueError("Votes on %s are stored as %s, not %s" %
+                                 (type(item).__name__, vote_model.__name__,
+                                  self.model.__name__))
+
+            reason_obj = type(item).votes.get_reason_object(direction, reason)
+            if reason_obj is None:
+                raise ValueError("%s %s is not a valid voting reason" %
+                                 (direction, reason))
+
+            placed = by_model.setdefault(type(item), {})
+            placed[(item.pk, user.pk)] = (item, user, reason_obj)
+
+        item_field = self.item_field
+        saved = []
+        for (model, placed) in by_model.items():
+            items = dict((pk, item) for ((pk, _), (item, _, _))
+                         in placed.items())
+            user_ids = set(user_id for (_, user_id) in placed.keys())
+
+            def find_votes():
+                return dict(
+                    ((getattr(vote, item_field), vote.user_id), vote)
+                    for vote in self.for_items(model, list(items.keys()))
+                                    .filter(user__pk__in=list(user_ids))
+                    if (getattr(vote, item_field), vote.user_id) in placed
+                )
+
+            existing = find_votes()
+            batch = []
+            now = timezone.now()
+            for (key, (item, user, reason_obj)) in placed.items():
+                vote = existing.get(key)
+                if vote is None:
+                    vote = self.model(item=item, user=user)
+                else:
+                    # Leave "effective" in place!
+                    vote.vote_date = now
+                vote.direction = reason_obj.direction
+                vote.reason = reason_obj.reason
+                vote._item_cache = item
+                batch.append(vote)
+
+            new_votes = set((getattr(v, item_field), v.user_id)
+                            for v in batch if v.pk is None)
+            if per_vote_signals:
+                for vote in batch:
+                    pre_vote.send(vote.item, vote=vote,
+                                  new=vote.pk is None)
+            else:
+                pre_bulk_vote.send(model, votes=batch)
+
+            with transaction.atomic():
+                # Lock the existing votes, and see how they stand now.
+                old_pks = [v.pk for v in batch if v.pk is not None]
+                old_states = {}
+                if old_pks:
+                    old_states = dict(
+                        (pk, (direction, reason, effective))
+                        for (pk, direction, reason, effective)
+                        in self.select_for_update().filter(pk__in=old_pks)
+                               .values_list('pk', 'direction', 'reason',
+                                            'effective')
+                    )
+                for vote in batch:
+                    if vote.pk is not None and vote.pk not in old_states:
+                        # It was deleted since we looked.
+                        vote.pk = None
+                        new_votes.add((getattr(vote, item_field),
+                                       vote.user_id))
+
+                self.bulk_create([v for v in batch if v.pk is None])
+
+                # Update the existing votes in as few queries as possible.
+                changes = {}
+                for vote in batch:
+                    if vote.pk is not None:
+                        changes.setdefault(
+                            (vote.direction, vote.reason, vote.effective), []
+                        ).append(vote.pk)
+                for ((direction, reason, effective), pks) in changes.items():
+                    self.filter(pk__in=pks).update(
+                        direction=direction, reason=reason,
+                        effective=effective, vote_date=now
+                    )
+
+                # Add up how each item's counts changed, and apply that to
+                # its tally, like `ObjectVotes.record_vote_change` does.
+                deltas = {}
+                for vote in batch:
+                    upvotes, downvotes, reasons = vote_change(
+                        old_states.get(vote.pk),
+                        (vote.direction, vote.reason, vote.effective)
+                    )
+                    delta = deltas.setdefault(getattr(vote, item_field),
+                                              [0, 0, {}])
+                    delta[0] += upvotes
+                    delta[1] += downvotes
+                    for (key, change) in reasons.items():
+                        delta[2][key] = delta[2].get(key, 0) + change
+
+                for (pk, (upvotes, downvotes, reasons)) in deltas.items():
+                    if not (upvotes or downvotes or any(reasons.values())):
+                        continue
+                    item = items[pk]
+                    counts = VoteTally.objects.apply_change(
+                        item, upvotes, downvotes, reasons
+                    )
+                    item.votes.set_vote_counts(*counts)
+
+                    if upvotes or downvotes:
+                        vote_counts_changed.send(model, item=item,
+                                                 upvotes=upvotes,
+                                                 downvotes=downvotes)
+
+            # bulk_create doesn't tell us the new primary keys.
+            batch = list(find_votes().values())
+            for vote in batch:
+                vote._item_cache = items[getattr(vote, item_field)]
+
+            if per_vote_signals:
+                for vote in batch:
+                    post_vote.send(vote.item, vote=vote,
+                                   new=(getattr(vote, item_field),
+                                        vote.user_id) in new_votes)
+            else:
+                post_bulk_vote.send(model, votes=batch)
+            saved.extend(batch)
+
+        return saved
+
+    def get_user_votes(self, model, items, user):
+        """
+        Returns a particular user's votes on several items of the same model,
+        using a single query.
+
+        :param model:   The model class the items are instances of.
+        :param items:   An iterable of items, or their primary keys.
+        :param user:    The user whose votes to look up.
+        :return:        A dict mapping item primary keys to `Vote` objects.
+                        Items the user hasn't voted on are left out.
+        """
+        items = list(items)
+        if not items:
+            return {}
+
+        instances = dict((item.pk, item) for item in items
+                         if isinstance(item, models.Model))
+
+        votes = {}
+        for vote in self.for_items(model, items).filter(user=user):
+            item_id = getattr(vote, self.item_field)
+            if item_id in instances:
+                # Save the vote a trip to the database for its item.
+                vote._item_cache = instances[item_id]
+            votes[item_id] = vote
+        return votes
+
     def for_item(self, item):
         """
         Returns a `QuerySet` of votes for a particular item, not in any
         particular order.
         """
-        ctype = ContentType.objects.get_for_model(item)
-        return self.filter(content_type__pk=ctype.id, object_id=item.id)
+        return self.for_model(type(item)).filter(**{self.item_field: item.pk})
+
+    def for_items(self, model, items):
+        """
+        Returns a `QuerySet` of votes for several items of the same model,
+        not in any particular order.
+
+        :param model:   The model class the items are instances of.
+        :param items:   An iterable of items, or their primary keys.
+        """
+        return self.for_model(model).filter(
+            **{self.item_field + '__in': _item_ids(items)}
+        )
+
+    def get_vote_counts_bulk(self, model, items):
+        """
+        Counts the effective votes on several items of the same model at
+        once, using a single grouped query.
+
+        :param model:   The model class the items are instances of.
+        :param items:   An iterable of items, or their primary keys.
+        :return:        A dict mapping each item's primary key to a tuple of
+                        ``(upvotes, downvotes)``.
+        """
+        ids = _item_ids(items)
+        if not ids:
+            return {}
+
+        counts = dict((pk, [0, 0]) for pk in ids)
+
+        # The filters match the (content_type, object_id, effective,
+        # direction) index -- or (item, effective, direction), for
+        # `make_vote_model` tables -- so this never touches the table.
+        item_field = self.item_field
+        directions = self.for_items(model, ids) \
+            .filter(effective=True).values(item_field, 'direction') \
+            .annotate(votes=models.Count('direction'))
+
+        for row in directions:
+            # Just ignore anything that's not 1 or -1.
+            if row['direction'] == 1:
+                counts[row[item_field]][0] = row['votes']
+            elif row['direction'] == -1:
+                counts[row[item_field]][1] = row['votes']
+
+        return dict((pk, tuple(c)) for (pk, c) in counts.items())
+
+
+class ItemVoteManager(VoteManager):
+    """
+    This is a manager for vote models with a real foreign key to the items
+    they're votes on, like the ones `make_vote_model` builds. Every vote in
+    the table is on the same model, so there's no content type to check.
+    """
+    item_field = 'item_id'
+
+    def for_model(self, model):
+        item_model = self.model._meta.get_field('item').rel.to
+        if not issubclass(model, item_model):
+            raise TypeError("%s only has votes on %s" %
+                            (self.model.__name__, item_model.__name__))
+        return self.all()
+
+
+class VoteTallyManager(models.Manager):
+    """
+    This is a manager for `VoteTally`. An item's tally is created the first
+    time it's needed by counting the item's votes, and after that it's
+    adjusted in place whenever one of those votes changes. "Needed" includes
+    reading the counts, so the first read of an item's counts writes its
+    tally (with an ``INSERT`` or two).
+    """
+    def _for_model(self, model, ids=None):
+        qset = self.filter(content_type__pk=get_content_type_id(model))
+        if ids is not None:
+            qset = qset.filter(object_id__in=ids)
+        return qset
+
+    def _create_from_votes(self, model, ids=None):
+        """
+        Creates tallies (and reason tallies) by counting the votes on the
+        items of `model` with the given primary keys, or on every item of
+        `model` that has votes if `ids` is `None`.
+
+        :raises IntegrityError: If some of the tallies already exist.
+        """
+        # Circular dependencies :-(
+        from .models import VoteReasonTally
+
+        ctype_id = get_content_type_id(model)
+        breakdown = model.votes.vote_model.objects.count_by_reason(model, ids)
+        if ids is None:
+            ids = list(breakdown.keys())
+
+        tallies = []
+        for pk in ids:
+            reasons = breakdown.get(pk, {})
+            tallies.append(self.model(
+                content_type_id=ctype_id, object_id=pk,
+                upvotes=sum(n for ((d, r), n) in reasons.items() if d == 1),
+                downvotes=sum(n for ((d, r), n) in reasons.items() if d == -1)
+            ))
+
+        with transaction.atomic():
+            self.bulk_create(tallies)
+
+            # bulk_create doesn't tell us the new primary keys.
+            tally_ids = dict(self._for_model(model, ids)
+                                 .values_list('object_id', 'id'))
+            VoteReasonTally.objects.bulk_create([
+                VoteReasonTally(tally_id=tally_ids[pk], direction=direction,
+                                reason=reason, votes=votes)
+                for (pk, reasons) in breakdown.items() if pk in tally_ids
+                for ((direction, reason), votes) in reasons.items()
+            ])
+
+    def get_for_items(self, model, items):
+        """
+        Returns the tallies for several items of the same model, creating any
+        that don't exist yet.
+
+        :param model:   The model class the items are instances of.
+        :param items:   An iterable of items, or their primary keys.
+        :return:        A dict mapping item primary keys to `VoteTally`
+                        objects.
+        """
+        ids = _item_ids(items)
+        if not ids:
+            return {}
+
+        tallies = dict((t.object_id, t) for t in self._for_model(model, ids))
+        missing = [pk for pk in ids if pk not in tallies]
+        if missing:
+            try:
+                self._create_from_votes(model, missing)
+            except IntegrityError:
+                # Somebody else got there first, and theirs are just as good.
+                pass
+            tallies.update((t.object_id, t)
+                           for t in self._for_model(model, missing))
+        return tallies
+
+    def get_for_item(self, item):
+        """
+        Returns the tally for an item, creating it if it doesn't exist yet.
+        """
+        return self.get_for_items(type(item), [item])[item.pk]
+
+    def get_vote_counts_bulk(self, model, items):
+        """
+        Returns a dict mapping the primary keys of several items of the same
+        model to tuples of ``(upvotes, downvotes)``. Like `get_for_items`,
+        this creates any tallies that are missing, so even though it's a
+        read, it can write.
+        """
+        return dict((pk, (tally.upvotes, tally.downvotes))
+                    for (pk, tally) in self.get_for_items(model, items).items())
+
+    def apply_change(self, item, upvotes, downvotes, reasons):
+        """
+        Adjusts an item's tally after one of its votes changes. Call this
+        within an `atomic` block, after the vote itself has been saved.
+
+        :param item:        The item that was voted on.
+        :param upvotes:     The change in the number of upvotes.
+        :param downvotes:   The change in the number of downvotes.
+        :param reasons:     A dict mapping ``(direction, reason)`` to the
+                            change in the number of votes for that reason.
+        :return:            The item's new ``(upvotes, downvotes)``.
+        """
+        # Circular dependencies :-(
+        from .models import VoteReasonTally
+
+        rows = self._for_model(type(item)).filter(object_id=item.pk)
+        changes = {'upvotes': models.F('upvotes') + upvotes,
+                   'downvotes': models.F('downvotes') + downvotes}
+
+        if not rows.update(**changes):
+            # There isn't a tally yet, so count the votes instead -- since
+            # the vote is already saved, that includes this change.
+            try:
+                self._create_from_votes(type(item), [item.pk])
+                return rows.values_list('upvotes', 'downvotes')[0]
+            except IntegrityError:
+                # Somebody else counted first, without this change.
+                rows.update(**changes)
+
+        tally_id, upvotes, downvotes = \
+            rows.values_list('id', 'upvotes', 'downvotes')[0]
+
+        for ((direction, reason), change) in reasons.items():
+            if not change:
+                continue
+
+            reason_rows = VoteReasonTally.objects.filter(
+                tally__pk=tally_id, direction=direction, reason=reason
+            )
+            if not reason_rows.update(votes=models.F('votes') + change):
+                VoteReasonTally.objects.create(
+                    tally_id=tally_id, direction=direction, reason=reason,
+                    votes=change
+                )
+
+        return upvotes, downvotes
+
+    def rebuild(self, model, items=None):
+        """
+        Throws away the tallies for `model`, and counts its votes again
+        from scratch. Use this if votes were changed without going through
+        `AbstractVote.save` and `AbstractVote.delete` (for example, by
+        loading fixtures).
+
+        :param model:   The model class to rebuild the tallies for.
+        :param items:   An iterable of items, or their primary keys.
+                        If this is `None`, every item is rebuilt.
+        :return:        A dict mapping item primary keys to their new
+                        `VoteTally` objects. If `items` is `None`, only
+                        items with votes are included.
+        """
+        # Circular dependencies :-(
+        from .models import VoteReasonTally
+
+        ids = None if items is None else _item_ids(items)
+        reason_tallies = VoteReasonTally.objects \
+            .filter(tally__content_type__pk=get_content_type_id(model))
+        if ids is not None:
+            reason_tallies = reason_tallies.filter(tally__object_id__in=ids)
+
+        with transaction.atomic():
+            reason_tallies.delete()
+            self._for_model(model, ids).delete()
+            self._create_from_votes(model, ids)
+            return dict((t.object_id, t) for t in self._for_model(model, ids))
+
+
+class VotableQuerySet(QuerySet):
+    """
+    A `QuerySet` for models with a `Votable`. It can look up the current
+    user's votes on all of its items with one extra query, a bit like
+    `prefetch_related` does.
+    """
+    def __init__(self, *args, **kwargs):
+        super(VotableQuerySet, self).__init__(*args, **kwargs)
+        self._user_votes_lookup = None
+        self._user_votes_done = False
+
+    def with_user_votes(self, user, attr='user_vote'):
+        """
+        Returns a new `QuerySet` that sets `attr` on each item to the
+        `user`'s vote on it (or `None`) as soon as the results are fetched.
+        """
+        clone = self._clone()
+        clone._user_votes_lookup = (user, attr)
+        return clone
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        clone = super(VotableQuerySet, self)._clone(klass, setup, **kwargs)
+        clone._user_votes_lookup = self._user_votes_lookup
+        return clone
+
+    def _fetch_all(self):
+        super(VotableQuerySet, self)._fetch_all()
+        if self._user_votes_lookup is not None and not self._user_votes_done:
+            user, attr = self._user_votes_lookup
+            self.model.votes.attach_user_votes(self._result_cache, user, attr)
+            self._user_votes_done = True
+
+
+class VotableManager(models.Manager):
+    """
+    A manager for models with a `Votable`, which returns `VotableQuerySet`\s.
+    """
+    def get_queryset(self):
+        return VotableQuerySet(self.model, using=self._db)
 
+    def with_user_votes(self, user, attr='user_vote'):
+        return self.get_queryset().with_user_votes(user, attr)
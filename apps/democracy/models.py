@@ -12,22 +12,134 @@ from __future__ import unicode_literals
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.db import models, transaction
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 
-from .managers import VoteManager, VoteReasonManager
+from .managers import (ItemVoteManager, VoteManager, VoteReasonManager,
+                       VoteTallyManager)
+from .registry import get_content_type_id, get_settings_for_content_type
 from .signals import pre_vote, post_vote, pre_remove_vote, post_remove_vote
 
 
+class VotedItem(generic.GenericForeignKey):
+    """
+    A `GenericForeignKey` for votes and tallies. Votable models are found
+    by content type ID in the registry, so loading or setting an item
+    doesn't touch `ContentType` at all. Anything else is left to
+    `GenericForeignKey`.
+    """
+    def contribute_to_class(self, cls, name):
+        super(VotedItem, self).contribute_to_class(cls, name)
+        # `Model.__init__` hands keyword arguments it doesn't recognize to
+        # properties, which is how `instance_pre_init` caches the item.
+        self.init_attr = "_%s_init" % name
+        setattr(cls, self.init_attr, property(
+            fset=lambda instance, value: setattr(instance, self.cache_attr,
+                                                 value)
+        ))
+
+    def instance_pre_init(self, signal, sender, args, kwargs, **_kwargs):
+        """
+        Handles ``Vote(item=...)``, setting the content type ID from the
+        registry instead of loading the `ContentType`, and caching the item
+        so reading it back doesn't load it again.
+        """
+        if self.name not in kwargs:
+            return
+        value = kwargs.pop(self.name)
+        ct_attname = self.model._meta.get_field(self.ct_field).get_attname()
+        if value is None:
+            kwargs[ct_attname] = kwargs[self.fk_field] = None
+        else:
+            kwargs[ct_attname] = get_content_type_id(value)
+            kwargs[self.fk_field] = value._get_pk_val()
+        kwargs[self.init_attr] = value
+
+    def __get__(self, instance, instance_type=None):
+        if instance is None:
+            return self
+        try:
+            return getattr(instance, self.cache_attr)
+        except AttributeError:
+            pass
+
+        ct_attname = self.model._meta.get_field(self.ct_field).get_attname()
+        vote_settings = get_settings_for_content_type(
+            getattr(instance, ct_attname, None)
+        )
+        if vote_settings is None:
+            return super(VotedItem, self).__get__(instance, instance_type)
+
+        manager = vote_settings.model._base_manager.using(instance._state.db)
+        try:
+            rel_obj = manager.get(pk=getattr(instance, self.fk_field))
+        except ObjectDoesNotExist:
+            rel_obj = None
+        setattr(instance, self.cache_attr, rel_obj)
+        return rel_obj
+
+    def __set__(self, instance, value):
+        field = self.model._meta.get_field(self.ct_field)
+        if value is None:
+            setattr(instance, field.get_attname(), None)
+            setattr(instance, self.fk_field, None)
+        else:
+            setattr(instance, field.get_attname(),
+                    get_content_type_id(value))
+            setattr(instance, self.fk_field, value._get_pk_val())
+        # Don't leave the old content type hanging around.
+        instance.__dict__.pop(field.get_cache_name(), None)
+        setattr(instance, self.cache_attr, value)
+
+
 VOTE_DIRECTIONS = (
     (+1,    '+1'),
     (-1,    '-1')
 )
 
 
+def vote_weight(direction, effective):
+    """
+    Returns the ``(upvotes, downvotes)`` that a single vote adds to its
+    item's counts.
+    """
+    if not effective:
+        return (0, 0)
+    elif direction == 1:
+        return (1, 0)
+    elif direction == -1:
+        return (0, 1)
+    else:
+        return (0, 0)
+
+
+def vote_change(old_state, new_state):
+    """
+    Returns how changing one vote changes its item's counts, as
+    ``(upvotes, downvotes, reasons)``, where `reasons` maps
+    ``(direction, reason)`` to the change in that reason's votes. The
+    states are ``(direction, reason, effective)`` tuples for the vote
+    before and after the change, or `None` if the vote didn't exist before
+    or doesn't exist any more.
+    """
+    upvotes = downvotes = 0
+    reasons = {}
+    for (state, sign) in ((old_state, -1), (new_state, +1)):
+        if state is None or not state[2]:
+            continue
+
+        direction, reason = state[0], state[1]
+        up, down = vote_weight(direction, True)
+        upvotes += sign * up
+        downvotes += sign * down
+        reasons[(direction, reason)] = \
+            reasons.get((direction, reason), 0) + sign
+    return upvotes, downvotes, reasons
+
+
 @python_2_unicode_compatible
 class VoteReason(models.Model):
     """
@@ -93,7 +205,8 @@ class AbstractVote(models.Model):
 
     (The precise item is left unspecified in this class.
     Subclasses should have a readable and writable "item" property,
-    and establish the "unique" constraint between user and item.)
+    and establish the "unique" constraint between user and item.
+    `make_vote_model` builds one with a foreign key.)
     """
     CLASSIFIER_LENGTH = 32
 
@@ -135,14 +248,30 @@ class AbstractVote(models.Model):
             return ("%s's %s to %s" %
                     (self.user, self.get_direction_display(), self.item))
 
+    def _lock_saved_state(self):
+        """
+        Locks this vote's row for the rest of the transaction, and returns
+        its ``(direction, reason, effective)`` as currently saved,
+        or `None` if it isn't saved.
+        """
+        if self.pk is None:
+            return None
+
+        saved = type(self)._default_manager.select_for_update() \
+                    .filter(pk=self.pk) \
+                    .values_list('direction', 'reason', 'effective')
+        return tuple(saved[0]) if saved else None
+
     def save(self, *args, **kwargs):
         new = self.id is None
         pre_vote.send(self.item, vote=self, new=new)
 
         with transaction.atomic():
+            old_state = self._lock_saved_state()
             super(AbstractVote, self).save(*args, **kwargs)
-            self.item.votes.update_scores()
-            self.item.save()
+            self.item.votes.record_vote_change(
+                old_state, (self.direction, self.reason, self.effective)
+            )
 
         post_vote.send(self.item, vote=self, new=new)
 
@@ -150,9 +279,9 @@ class AbstractVote(models.Model):
         pre_remove_vote.send(self.item, vote=self)
 
         with transaction.atomic():
+            old_state = self._lock_saved_state()
             super(AbstractVote, self).delete(*args, **kwargs)
-            self.item.votes.update_scores()
-            self.item.save()
+            self.item.votes.record_vote_change(old_state, None)
 
         post_remove_vote.send(self.item, vote=self)
 
@@ -168,7 +297,7 @@ class Vote(AbstractVote):
 
     content_type = models.ForeignKey(ContentType)
     object_id = models.PositiveIntegerField()
-    item = generic.GenericForeignKey('content_type', 'object_id')
+    item = VotedItem('content_type', 'object_id')
 
     class Meta:
         unique_together = ("user", "content_type", "object_id")
@@ -176,3 +305,152 @@ class Vote(AbstractVote):
             ("content_type", "object_id", "effective", "direction"),
         )
 
+
+def make_vote_model(model, name=None, db_table=None, related_name=None):
+    """
+    Builds a vote model just for `model`, with a real foreign key to it
+    instead of `Vote`'s generic one. Its votes get their own table and
+    indexes, the database can check that their items exist, and loading a
+    vote's item can use `select_related`. Assign it to a module-level name
+    in the same models module as `model`, and point `model`'s `Votable` at
+    it by name::
+
+        class Story(models.Model):
+            votes = Votable(vote_model='StoryVote', ...)
+
+        StoryVote = make_vote_model(Story)
+
+    The tallies are still kept in `VoteTally`. Bulk votes on `model` have
+    to go through the new model's manager (``StoryVote.objects.
+    bulk_add_votes``); `Vote`'s raises `ValueError` for them.
+
+    :param model:           The model the votes are on.
+    :param name:            The new model's name. Defaults to the model's
+                            name with ``Vote`` on the end.
+    :param db_table:        The name of the table to store the votes in,
+                            if Django's default won't do (say, because
+                            it's partitioned). Only the votes live there:
+                            the tallies still go through the shared
+                            `VoteTally` table.
+    :param related_name:    The name of the votes' reverse relation on
+                            `model`. (It can't be ``votes``, since that's
+                            the `Votable`.)
+    """
+    opts = model._meta
+    name = name or opts.object_name + 'Vote'
+
+    meta = {
+        'app_label': opts.app_label,
+        'unique_together': (("user", "item"),),
+        'index_together': (("item", "effective", "direction"),),
+        'verbose_name': "vote on %s" % opts.verbose_name,
+        'verbose_name_plural': "votes on %s" % opts.verbose_name_plural,
+    }
+    if db_table is not None:
+        meta['db_table'] = db_table
+
+    attrs = {
+        '__module__': model.__module__,
+        'Meta': type(str('Meta'), (object,), meta),
+        'objects': ItemVoteManager(),
+        'item': models.ForeignKey(model, related_name=related_name,
+                    verbose_name=_("item"),
+                    help_text=_("The item being voted on.")),
+    }
+    return type(str(name), (AbstractVote,), attrs)
+
+
+class VoteTally(models.Model):
+    """
+    The running totals of the effective votes on an item. These are kept up
+    to date by `AbstractVote`'s save and delete methods, so counting an
+    item's votes never has to aggregate over every vote.
+
+    Tallies are created the first time they're needed. If votes are changed
+    some other way, run the ``rebuild_vote_tallies`` management command.
+    """
+    objects = VoteTallyManager()
+
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    item = VotedItem('content_type', 'object_id')
+
+    upvotes     = models.PositiveIntegerField(_("upvotes"), default=0)
+    downvotes   = models.PositiveIntegerField(_("downvotes"), default=0)
+
+    class Meta:
+        unique_together = ("content_type", "object_id")
+
+        verbose_name = "vote tally"
+        verbose_name_plural = "vote tallies"
+
+    def get_reason_counts(self):
+        """
+        Returns a dict mapping ``(direction, reason)`` to the number of
+        effective votes for that reason.
+        """
+        return dict(((r.direction, r.reason), r.votes)
+                    for r in self.reason_tallies.all() if r.votes)
+
+
+class VoteReasonTally(models.Model):
+    """
+    The running total of the effective votes on an item for one particular
+    direction and reason. These belong to a `VoteTally`.
+    """
+    tally       = models.ForeignKey(VoteTally, related_name='reason_tallies')
+
+    direction   = models.SmallIntegerField(_("direction"),
+                    choices=VOTE_DIRECTIONS)
+    reason      = models.CharField(_("reason"),
+                    max_length=VoteReason.REASON_LENGTH, blank=True)
+
+    votes       = models.PositiveIntegerField(_("votes"), default=0)
+
+    class Meta:
+        unique_together = ("tally", "direction", "reason")
+
+        verbose_name = "vote reason tally"
+        verbose_name_plural = "vote reason tallies"
+
+
+class PendingVote(models.Model):
+    """
+    A vote (or the removal of one) that's waiting in a `VoteBuffer` to be
+    written. Keeping these in the database means they survive the process
+    that buffered them being killed -- any process's next flush writes
+    them.
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    item = VotedItem('content_type', 'object_id')
+
+    user        = models.ForeignKey(settings.AUTH_USER_MODEL,
+                    related_name='+',
+                    verbose_name=_("user"),
+                    help_text=_("The user who placed this vote."))
+
+    direction   = models.SmallIntegerField(_("direction"),
+                    help_text=_("+1 for upvote, -1 for downvote, or 0 to "
+                                "remove the user's vote."))
+    reason      = models.CharField(_("reason"),
+                    max_length=VoteReason.REASON_LENGTH, blank=True)
+
+    added       = models.DateTimeField(_("added at"), default=timezone.now)
+
+    claimed     = models.DateTimeField(_("claimed at"), null=True,
+                    blank=True,
+                    help_text=_("When a flush started writing this vote. "
+                                "Claims that are too old are assumed to "
+                                "have died with their process."))
+    claimed_by  = models.CharField(_("claimed by"), max_length=32,
+                    blank=True)
+    attempts    = models.PositiveSmallIntegerField(_("attempts"), default=0,
+                    help_text=_("How many times writing this vote has "
+                                "failed."))
+
+    class Meta:
+        ordering = ['id']
+
+        verbose_name = "pending vote"
+        verbose_name_plural = "pending votes"
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.ranking
+=================
+Formulas for turning vote counts into scores, for use in your models'
+`compute_score` methods.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import division, unicode_literals
+from math import sqrt
+
+from django.utils import timezone
+
+
+def hot_score(points, submit_date, gravity=1.8, now=None):
+    """
+    Hacker News-style "hotness": an item's points, divided by its age
+    (plus two hours) raised to the power of `gravity`. The score decays as
+    the item gets older, so it needs to be recalculated periodically.
+
+    :param points:      The item's points (usually upvotes minus downvotes).
+    :param submit_date: When the item was posted.
+    :param gravity:     How quickly the score decays. Higher values make
+                        old items sink faster.
+    :param now:         The time to measure the item's age at.
+                        Defaults to the current time.
+    """
+    if now is None:
+        now = timezone.now()
+    age_hours = max((now - submit_date).total_seconds() / 3600, 0)
+    return points / pow(age_hours + 2, gravity)
+
+
+def wilson_lower_bound(upvotes, downvotes, z=1.96):
+    """
+    The lower bound of the Wilson score confidence interval for the fraction
+    of votes that are upvotes. This ranks items by how confident we can be
+    that people like them, so an item with one upvote doesn't beat an item
+    with 90 upvotes and 10 downvotes. It doesn't decay over time.
+
+    :param upvotes:     The number of upvotes.
+    :param downvotes:   The number of downvotes.
+    :param z:           The z-score for the confidence level. The default,
+                        1.96, is for 95% confidence.
+    """
+    n = upvotes + downvotes
+    if n == 0:
+        return 0.0
+
+    phat = upvotes / n
+    return ((phat + z * z / (2 * n) -
+             z * sqrt((phat * (1 - phat) + z * z / (4 * n)) / n)) /
+            (1 + z * z / n))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.registry
+==================
+Finds votable models by their content type IDs and names, and content type
+IDs by model, without going through `ContentType`'s cache on every vote.
+
+Each `VoteSettings` looks up its model's content type the first time it's
+needed (not when it's created, so models can be imported before the
+content types table exists), and registers itself here.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import unicode_literals
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_syncdb
+
+_by_content_type = {}
+_by_name = {}
+_lock = threading.Lock()
+
+
+def model_name(model):
+    """
+    Returns a model's name as ``app_label.model``, like its content type's
+    natural key.
+    """
+    return '%s.%s' % (model._meta.app_label, model._meta.model_name)
+
+
+def register(vote_settings):
+    """
+    Records a `VoteSettings` under its content type ID. `VoteSettings` does
+    this itself.
+    """
+    with _lock:
+        _by_content_type[vote_settings.content_type_id] = vote_settings
+
+
+def clear():
+    """
+    Forgets every pinned content type ID, so they're looked up again the
+    next time they're needed. This happens whenever the database is synced,
+    since flushing it can renumber the content types.
+    """
+    with _lock:
+        for vote_settings in _by_content_type.values():
+            vote_settings._forget_content_type()
+        _by_content_type.clear()
+
+
+def _clear_on_syncdb(sender, **kwargs):
+    clear()
+
+post_syncdb.connect(_clear_on_syncdb, dispatch_uid='democracy.registry')
+
+
+def _vote_settings_of(model):
+    # Circular dependencies :-(
+    from .voting import VoteSettings
+
+    vote_settings = getattr(model, 'votes', None)
+    if isinstance(vote_settings, VoteSettings):
+        return vote_settings
+    return None
+
+
+def get_content_type_id(model):
+    """
+    Returns the ID of the content type for `model` (a class or instance).
+    For votable models, this is pinned on the model's `VoteSettings`, so it
+    costs an attribute lookup.
+    """
+    if not isinstance(model, type):
+        model = type(model)
+    # Deferred and proxy models share their concrete model's content type.
+    model = model._meta.concrete_model
+    vote_settings = _vote_settings_of(model)
+    if vote_settings is not None:
+        return vote_settings.content_type_id
+    return ContentType.objects.get_for_model(model).id
+
+
+def get_settings_for_content_type(content_type_id):
+    """
+    Returns the `VoteSettings` of the votable model with the given content
+    type ID, or `None` if there isn't one.
+    """
+    vote_settings = _by_content_type.get(content_type_id)
+    if vote_settings is None:
+        # It might not have been looked up yet.
+        from .voting import get_votable_models
+        for model in get_votable_models():
+            model.votes.content_type_id
+        vote_settings = _by_content_type.get(content_type_id)
+    return vote_settings
+
+
+def get_settings_for_name(name):
+    """
+    Returns the `VoteSettings` of the votable model named ``app_label.model``,
+    or `None` if there isn't one. This doesn't need the database at all.
+    """
+    if not _by_name:
+        from .voting import get_votable_models
+        with _lock:
+            for model in get_votable_models():
+                _by_name[model_name(model)] = model.votes
+    return _by_name.get(name.lower())
@@ -27,3 +27,25 @@ pre_remove_vote = django.dispatch.Signal(providing_args=["vote"])
 #: Dispatched after a Vote for the sender is removed from the database.
 post_remove_vote = django.dispatch.Signal(providing_args=["vote"])
 
+
+#: Dispatched once per model by `VoteManager.bulk_add_votes`, before a batch
+#: of votes is saved to the database. The sender is the model class, and
+#: `votes` is a list of the new and altered votes.
+#: Like `pre_vote`, this runs outside the atomic() block, so you can make
+#: votes ineffective here.
+pre_bulk_vote = django.dispatch.Signal(providing_args=["votes"])
+
+#: Dispatched once per model by `VoteManager.bulk_add_votes`, after a batch
+#: of votes is saved to the database. The sender is the model class, and
+#: `votes` is a list of the saved votes.
+post_bulk_vote = django.dispatch.Signal(providing_args=["votes"])
+
+
+#: Dispatched whenever an item's vote counts change, after its tally,
+#: counters and scores are updated (within the same transaction). The sender
+#: is the item's model class, `item` is the item, and `upvotes` and
+#: `downvotes` are how much its counts changed by (which may be negative).
+#: Use this to keep aggregates over many items up to date.
+vote_counts_changed = django.dispatch.Signal(
+    providing_args=["item", "upvotes", "downvotes"]
+)
@@ -12,10 +12,15 @@ from __future__ import unicode_literals
 from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
 
+from ...buffer import VoteBuffer
+from ...managers import VotableManager
+from ...models import make_vote_model
 from ...voting import Votable
 
 @python_2_unicode_compatible
 class Cheese(models.Model):
+    objects = VotableManager()
+
     variety = models.CharField(max_length=30, unique=True)
     optimistic_score = models.IntegerField(default=1)
     pessimistic_score = models.IntegerField(default=1)
@@ -42,3 +47,58 @@ class CatPicture(models.Model):
         # Make us seem more viral than we are
         return upvotes * 30
 
+
+@python_2_unicode_compatible
+class Sermon(models.Model):
+    title = models.CharField(max_length=64)
+    amens = models.IntegerField(default=0)
+    heresies = models.IntegerField(default=0)
+    standing = models.IntegerField(default=0)
+
+    votes = Votable(score='standing', counters=('amens', 'heresies'))
+
+    def compute_standing(self, upvotes, downvotes):
+        return upvotes - downvotes
+
+    def __str__(self):
+        return self.title
+
+
+hymn_buffer = VoteBuffer(max_delay=0)
+
+
+@python_2_unicode_compatible
+class Hymn(models.Model):
+    title = models.CharField(max_length=64)
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
+    popularity = models.IntegerField(default=0)
+
+    votes = Votable(score='popularity', counters=('upvotes', 'downvotes'),
+                    buffered=hymn_buffer)
+
+    def compute_popularity(self, upvotes, downvotes):
+        return upvotes - downvotes
+
+    def __str__(self):
+        return self.title
+
+
+@python_2_unicode_compatible
+class Psalm(models.Model):
+    title = models.CharField(max_length=64)
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
+    popularity = models.IntegerField(default=0)
+
+    votes = Votable(vote_model='PsalmVote', score='popularity',
+                    counters=('upvotes', 'downvotes'))
+
+    def compute_popularity(self, upvotes, downvotes):
+        return upvotes - downvotes
+
+    def __str__(self):
+        return self.title
+
+
+PsalmVote = make_vote_model(Psalm)
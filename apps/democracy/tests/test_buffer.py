@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.tests.test_buffer
+===========================
+These test the write-behind vote buffer.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from snaketest import SnakeTestMixin
+
+from ..buffer import VoteBuffer
+from ..signals import pre_vote, post_vote
+
+from .democracytest.models import Hymn, hymn_buffer
+
+
+class VoteBufferTests(TestCase, SnakeTestMixin):
+    fixtures = ['democracy_test_users']
+
+    def setUp(self):
+        self.calvin = User.objects.get(username='calvin')
+        self.wesley = User.objects.get(username='wesley')
+        self.hymn = Hymn.objects.create(title="A Mighty Fortress")
+
+    def tearDown(self):
+        hymn_buffer.flush()
+
+    def test_settings(self):
+        self.assert_is(Hymn.votes.buffer, hymn_buffer)
+        self.assert_equal(VoteBuffer(max_size=10).max_size, 10)
+
+    def test_buffered_votes(self):
+        Hymn.votes.content_type_id
+        # Each vote is just one INSERT into the pending votes.
+        with self.assert_num_queries(3):
+            vote = self.hymn.votes.add_vote(self.calvin, +1)
+            self.hymn.votes.add_vote(self.wesley, -1)
+            # Wesley changes his mind before anything is written.
+            self.hymn.votes.add_vote(self.wesley, +1)
+
+        self.assert_none(vote.pk)
+        self.assert_equal(len(hymn_buffer), 2)
+        self.assert_none(self.hymn.votes.get_user_vote(self.calvin))
+
+        hymn_buffer.flush()
+        self.assert_equal(len(hymn_buffer), 0)
+        self.assert_equal(self.hymn.votes.get_vote_counts(), (2, 0))
+        self.assert_fields_equal(Hymn.objects.get(pk=self.hymn.pk),
+                                 upvotes=2, downvotes=0, popularity=2)
+
+    def test_buffered_signals(self):
+        sent = []
+        def pre(sender, vote, new, **kwargs):
+            sent.append(('pre', vote.user.username, new))
+            # Calvin's votes don't count.
+            if vote.user == self.calvin:
+                vote.effective = False
+        def post(sender, vote, new, **kwargs):
+            sent.append(('post', vote.user.username, new))
+
+        pre_vote.connect(pre)
+        post_vote.connect(post)
+        try:
+            self.hymn.votes.add_vote(self.calvin, +1)
+            self.assert_equal(sent, [])
+            hymn_buffer.flush()
+        finally:
+            pre_vote.disconnect(pre)
+            post_vote.disconnect(post)
+
+        self.assert_equal(sent, [('pre', 'calvin', True),
+                                 ('post', 'calvin', True)])
+        self.assert_equal(self.hymn.votes.get_vote_counts(), (0, 0))
+        self.assert_false(self.hymn.votes.get_user_vote(self.calvin).effective)
+
+    def test_buffer_fills_up(self):
+        buffer = VoteBuffer(max_size=2, max_delay=0)
+        buffer.add(self.hymn, self.calvin, Hymn.votes.get_reason_object(+1))
+        self.assert_equal(len(buffer), 1)
+        buffer.add(self.hymn, self.wesley, Hymn.votes.get_reason_object(-1))
+        self.assert_equal(len(buffer), 0)
+        self.assert_equal(self.hymn.votes.get_vote_counts(), (1, 1))
+
+    def test_remove_buffered_vote(self):
+        self.hymn.votes.add_vote(self.calvin, +1)
+        self.hymn.votes.remove_vote(self.calvin)
+        self.assert_equal(len(hymn_buffer), 1)
+
+        hymn_buffer.flush()
+        self.assert_equal(len(hymn_buffer), 0)
+        self.assert_equal(self.hymn.votes.get_vote_counts(), (0, 0))
+
+    def test_remove_during_flush(self):
+        self.hymn.votes.add_vote(self.calvin, +1)
+        # A flush takes the vote, and then Calvin takes it back before
+        # it's written.
+        token = hymn_buffer._claim()
+        self.hymn.votes.remove_vote(self.calvin)
+        hymn_buffer._write(token)
+        self.assert_equal(self.hymn.votes.get_vote_counts(), (1, 0))
+
+        hymn_buffer.flush()
+        self.assert_equal(self.hymn.votes.get_vote_counts(), (0, 0))
+        self.assert_none(self.hymn.votes.get_user_vote(self.calvin))
+
+    def test_votes_survive_the_buffer(self):
+        self.hymn.votes.add_vote(self.calvin, +1)
+        # Say this process dies, and another one flushes.
+        VoteBuffer(max_delay=0).flush()
+        self.assert_equal(len(hymn_buffer), 0)
+        self.assert_equal(self.hymn.votes.get_vote_counts(), (1, 0))
+
+    def test_failed_votes_stay_pending(self):
+        sent = []
+        def pre(sender, vote, new, **kwargs):
+            sent.append('pre')
+            if len(sent) == 1:
+                raise RuntimeError("Not now")
+        def post(sender, vote, new, **kwargs):
+            sent.append('post')
+
+        pre_vote.connect(pre)
+        post_vote.connect(post)
+        try:
+            self.hymn.votes.add_vote(self.calvin, +1)
+            hymn_buffer.flush()
+            self.assert_equal(sent, ['pre'])
+            self.assert_equal(len(hymn_buffer), 1)
+            self.assert_none(self.hymn.votes.get_user_vote(self.calvin))
+
+            hymn_buffer.flush()
+        finally:
+            pre_vote.disconnect(pre)
+            post_vote.disconnect(post)
+
+        self.assert_equal(sent, ['pre', 'pre', 'post'])
+        self.assert_equal(len(hymn_buffer), 0)
+        self.assert_equal(self.hymn.votes.get_vote_counts(), (1, 0))
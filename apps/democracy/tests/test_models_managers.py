@@ -10,14 +10,16 @@ These test Democracy's models and the managers associated with them.
 from __future__ import unicode_literals
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db.models.query import QuerySet
 from django.test import SimpleTestCase, TestCase
 
 from snaketest import SnakeTestMixin
 
+from ..managers import REASON_VERSION_KEY
 from ..models import Vote, VoteReason
 
-from .democracytest.models import Cheese, CatPicture
+from .democracytest.models import Cheese, CatPicture, Psalm, PsalmVote
 
 
 class VoteModelTests(TestCase, SnakeTestMixin):
@@ -78,6 +80,82 @@ class VoteModelTests(TestCase, SnakeTestMixin):
         self.assert_instance(votes, QuerySet)
         self.assert_equal(len(votes), 0)
 
+    def test_vote_for_items(self):
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        brie = Cheese.objects.get(variety='Brie')
+
+        votes = Vote.objects.for_items(Cheese, [cheddar, brie.pk])
+        self.assert_instance(votes, QuerySet)
+        self.assert_equal(len(votes), 4)
+
+    def test_vote_get_vote_counts_bulk(self):
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        brie = Cheese.objects.get(variety='Brie')
+        gorgonzola = Cheese.objects.get(variety='Gorgonzola')
+        ContentType.objects.get_for_model(Cheese)
+
+        with self.assert_num_queries(1):
+            counts = Vote.objects.get_vote_counts_bulk(
+                Cheese, [cheddar, brie, gorgonzola]
+            )
+        self.assert_equal(counts, {cheddar.pk: (1, 1), brie.pk: (1, 0),
+                                   gorgonzola.pk: (0, 0)})
+
+        with self.assert_num_queries(0):
+            self.assert_equal(Vote.objects.get_vote_counts_bulk(Cheese, []), {})
+
+
+class ItemVoteModelTests(TestCase, SnakeTestMixin):
+    fixtures = ['democracy_test_users']
+
+    def test_model(self):
+        self.assert_is(Psalm.votes.vote_model, PsalmVote)
+        self.assert_equal(PsalmVote._meta.app_label, 'democracytest')
+        self.assert_equal(PsalmVote._meta.unique_together,
+                          (("user", "item"),))
+        self.assert_is(PsalmVote._meta.get_field('item').rel.to, Psalm)
+        with self.assert_raises(TypeError):
+            PsalmVote.objects.for_model(Cheese)
+
+    def test_voting(self):
+        calvin = User.objects.get(username='calvin')
+        wesley = User.objects.get(username='wesley')
+        psalm = Psalm.objects.create(title="Psalm 23")
+        other = Psalm.objects.create(title="Psalm 119")
+
+        psalm.votes.add_vote(calvin, +1)
+        psalm.votes.add_vote(wesley, -1)
+        psalm.votes.add_vote(wesley, +1)
+        self.assert_equal(PsalmVote.objects.count(), 2)
+        self.assert_equal(Vote.objects.count(), 0)
+        self.assert_fields_equal(psalm, upvotes=2, downvotes=0,
+                                 popularity=2)
+
+        vote = psalm.votes.get_user_vote(wesley)
+        self.assert_instance(vote, PsalmVote)
+        self.assert_fields_equal(vote, item=psalm, direction=1)
+        self.assert_equal(psalm.votes.get_vote_counts(), (2, 0))
+        self.assert_equal(
+            PsalmVote.objects.get_vote_counts_bulk(Psalm, [psalm, other]),
+            {psalm.pk: (2, 0), other.pk: (0, 0)}
+        )
+
+        saved = PsalmVote.objects.bulk_add_votes([
+            (other, calvin, -1, ''), (psalm, calvin, -1, '')
+        ])
+        self.assert_equal(len(saved), 2)
+        self.assert_equal(Psalm.votes.get_vote_counts_bulk([psalm, other]),
+                          {psalm.pk: (1, 1), other.pk: (0, 1)})
+        self.assert_equal(
+            set(Psalm.votes.get_user_votes([psalm, other], calvin)),
+            set([psalm.pk, other.pk])
+        )
+
+        psalm.votes.remove_vote(wesley)
+        self.assert_none(psalm.votes.get_user_vote(wesley))
+        self.assert_equal(list(psalm.psalmvote_set.all()),
+                          [psalm.votes.get_user_vote(calvin)])
+
 
 class VoteReasonModelTest(TestCase, SnakeTestMixin):
     def test_strings(self):
@@ -172,6 +250,48 @@ class VoteReasonModelTest(TestCase, SnakeTestMixin):
             reasons = VoteReason.objects.get_for_model(CatPicture)
         self.assert_equal(reasons, ())
 
+    def test_for_model_shared_cache(self):
+        ctype = ContentType.objects.get_for_model(Cheese)
+        reason = VoteReason.objects.create(direction=1, reason='Sharp',
+                                           content_type=ctype)
+        self.assert_equal(len(VoteReason.objects.get_for_model(Cheese)), 1)
+
+        # A process that hasn't seen them yet gets them from the cache.
+        VoteReason.objects._reason_cache.clear()
+        with self.assert_num_queries(0):
+            reasons = VoteReason.objects.get_for_model(Cheese)
+        self.assert_fields_equal(reasons[0], direction=1, reason='Sharp')
+        self.assert_is(Cheese.votes.get_reason_object(1, 'Sharp'), reasons[0])
+
+        # Pretend another process changed them.
+        VoteReason.objects.filter(pk=reason.pk).update(reason='Smoky')
+        cache.incr(REASON_VERSION_KEY)
+        with self.settings(DEMOCRACY_REASON_CACHE_INTERVAL=0):
+            reasons = VoteReason.objects.get_for_model(Cheese)
+        self.assert_fields_equal(reasons[0], direction=1, reason='Smoky')
+
+        reason.delete()
+
+    def test_for_model_missed_change(self):
+        ctype = ContentType.objects.get_for_model(Cheese)
+        reason = VoteReason.objects.create(direction=1, reason='Sharp',
+                                           content_type=ctype)
+        self.assert_equal(len(VoteReason.objects.get_for_model(Cheese)), 1)
+        VoteReason.objects.get_for_model(CatPicture)
+
+        # Another process changes the cheese reasons, and before this one
+        # notices, it changes a cat picture reason.
+        VoteReason.objects.filter(pk=reason.pk).update(reason='Smoky')
+        cache.incr(REASON_VERSION_KEY)
+        VoteReason.objects.create(
+            direction=1, reason='Funny',
+            content_type=ContentType.objects.get_for_model(CatPicture)
+        )
+        reasons = VoteReason.objects.get_for_model(Cheese)
+        self.assert_fields_equal(reasons[0], direction=1, reason='Smoky')
+
+        VoteReason.objects.all().delete()
+
     def test_for_model_random(self):
         with self.assert_raises(TypeError):
             VoteReason.objects.get_for_model(User)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.tests.test_ranking
+============================
+These test the score formulas in `democracy.ranking`.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import unicode_literals
+from datetime import timedelta
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from snaketest import SnakeTestMixin
+
+from ..ranking import hot_score, wilson_lower_bound
+
+
+class RankingTests(SimpleTestCase, SnakeTestMixin):
+    def test_hot_score(self):
+        now = timezone.now()
+        self.assert_almost_equal(hot_score(4, now, gravity=2, now=now), 1.0)
+        self.assert_almost_equal(
+            hot_score(4, now - timedelta(hours=2), gravity=2, now=now), 0.25
+        )
+        self.assert_equal(hot_score(0, now, now=now), 0)
+
+        # Older stories need more points to keep up.
+        old = hot_score(50, now - timedelta(hours=24), now=now)
+        new = hot_score(5, now - timedelta(hours=1), now=now)
+        self.assert_true(new > old)
+
+    def test_wilson_lower_bound(self):
+        self.assert_equal(wilson_lower_bound(0, 0), 0)
+        self.assert_true(wilson_lower_bound(90, 10) > wilson_lower_bound(1, 0))
+        self.assert_true(wilson_lower_bound(10, 0) > wilson_lower_bound(10, 5))
+        self.assert_true(0 < wilson_lower_bound(1, 1) < 0.5)
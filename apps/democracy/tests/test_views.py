@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.tests.test_views
+==========================
+These test the voting endpoint.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import unicode_literals
+import json
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+
+from snaketest import SnakeTestMixin
+
+from ..models import Vote
+
+from .democracytest.models import CatPicture, Cheese, Sermon
+
+
+class VoteViewTests(TestCase, SnakeTestMixin):
+    urls = 'democracy.urls'
+
+    def setUp(self):
+        User.objects.create_user('luther', 'luther@example.com', 'pass')
+        self.client.login(username='luther', password='pass')
+        self.sermon = Sermon.objects.create(title="95 Theses")
+        self.cheese = Cheese.objects.create(variety="Gouda")
+
+    def post_json(self, votes):
+        response = self.client.post('/vote/', json.dumps({'votes': votes}),
+                                    content_type='application/json')
+        return response.status_code, json.loads(response.content.decode())
+
+    def test_single_vote(self):
+        response = self.client.post('/vote/', {
+            'content_type': 'democracytest.sermon',
+            'object_id': self.sermon.pk, 'direction': 1,
+        })
+        self.assert_equal(json.loads(response.content.decode()), {
+            'tallies': {'democracytest.sermon': {'%d' % self.sermon.pk: [1, 0]}}
+        })
+
+        status, data = self.post_json([['democracytest.sermon',
+                                         self.sermon.pk, 0]])
+        self.assert_equal(data['tallies']['democracytest.sermon'],
+                          {'%d' % self.sermon.pk: [0, 0]})
+        self.assert_false(Vote.objects.exists())
+
+    def test_last_vote_wins(self):
+        status, data = self.post_json([
+            ['democracytest.sermon', self.sermon.pk, 1],
+            ['democracytest.sermon', self.sermon.pk, 0],
+        ])
+        self.assert_equal(status, 200)
+        self.assert_equal(data['tallies']['democracytest.sermon'],
+                          {'%d' % self.sermon.pk: [0, 0]})
+        self.assert_false(Vote.objects.exists())
+
+        status, data = self.post_json([
+            ['democracytest.sermon', self.sermon.pk, 0],
+            ['democracytest.sermon', self.sermon.pk, -1],
+            ['democracytest.cheese', self.cheese.pk, 1],
+        ])
+        self.assert_equal(data['tallies']['democracytest.sermon'],
+                          {'%d' % self.sermon.pk: [0, 1]})
+        self.assert_equal(Vote.objects.count(), 2)
+
+    def test_batch(self):
+        ctype = ContentType.objects.get_for_model(Cheese)
+        status, data = self.post_json([
+            ['democracytest.sermon', self.sermon.pk, -1],
+            {'content_type': ctype.pk, 'object_id': self.cheese.pk,
+             'direction': 1},
+        ])
+        self.assert_equal(status, 200)
+        self.assert_equal(data['tallies'], {
+            'democracytest.sermon': {'%d' % self.sermon.pk: [0, 1]},
+            'democracytest.cheese': {'%d' % self.cheese.pk: [1, 0]},
+        })
+        self.assert_equal(Vote.objects.count(), 2)
+
+    def test_invalid_batches_are_not_saved(self):
+        picture = CatPicture.objects.create(caption="Ceiling Cat")
+        status, data = self.post_json([
+            ['democracytest.sermon', self.sermon.pk, 1],
+            ['democracytest.catpicture', picture.pk, -1],
+        ])
+        self.assert_equal(status, 400)
+        self.assert_in('error', data)
+        self.assert_false(Vote.objects.exists())
+
+        status, data = self.post_json([['democracytest.sermon', 9999, 1]])
+        self.assert_equal(status, 404)
+        status, data = self.post_json([['auth.user', 1, 1]])
+        self.assert_equal(status, 400)
+
+        for reason in (5, ["Tasty"], {"reason": "Tasty"}):
+            status, data = self.post_json([
+                ['democracytest.sermon', self.sermon.pk, 1],
+                ['democracytest.cheese', self.cheese.pk, 1, reason],
+            ])
+            self.assert_equal(status, 400)
+        self.assert_false(Vote.objects.exists())
+
+        with self.settings(DEMOCRACY_VOTE_BATCH_SIZE=1):
+            status, data = self.post_json([
+                ['democracytest.sermon', self.sermon.pk, 1],
+                ['democracytest.cheese', self.cheese.pk, 1],
+            ])
+            self.assert_equal(status, 400)
+
+    def test_login_required(self):
+        self.client.logout()
+        status, data = self.post_json([['democracytest.sermon',
+                                         self.sermon.pk, 1]])
+        self.assert_equal(status, 403)
+        self.assert_equal(self.client.get('/vote/').status_code, 405)
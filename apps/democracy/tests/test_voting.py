@@ -9,17 +9,24 @@ These test the overall operation of Democracy
 :license:   MIT/X11, see package's LICENSE for details
 """
 from __future__ import unicode_literals
-from django.contrib.auth.models import User
+import copy
+import pickle
+
+from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
 from django.db.models.query import QuerySet
 from django.test import SimpleTestCase, TestCase
 
 from snaketest import SnakeTestMixin
 
-from ..models import Vote, VoteReason
-from ..voting import VoteSettings, ObjectVotes
+from .. import registry
+from ..models import Vote, VoteReason, VoteTally
+from ..signals import pre_bulk_vote, post_bulk_vote, vote_counts_changed
+from ..voting import Votable, VoteSettings, ObjectVotes
 
-from .democracytest.models import Cheese, CatPicture
+from .democracytest.models import Cheese, CatPicture, Psalm, PsalmVote, Sermon
 
 
 class DefaultSettingTests(TestCase, SnakeTestMixin):
@@ -73,6 +80,44 @@ class ObjectVotesTests(TestCase, SnakeTestMixin):
 
         self.assert_none(cheddar.votes.get_user_vote(calvin))
 
+    def test_accessor_is_cached(self):
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        self.assert_is(cheddar.votes, cheddar.votes)
+        self.assert_is(cheddar.votes.item, cheddar)
+
+        # Copies and unpickled instances get their own.
+        duplicate = copy.copy(cheddar)
+        self.assert_is(duplicate.votes.item, duplicate)
+        restored = pickle.loads(pickle.dumps(cheddar, pickle.HIGHEST_PROTOCOL))
+        self.assert_is(restored.votes.item, restored)
+        self.assert_is(restored.votes.settings, Cheese.votes)
+
+    def test_content_type_is_pinned(self):
+        wesley = User.objects.get(username='wesley')
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        ctype = ContentType.objects.get_for_model(Cheese)
+        self.assert_equal(Cheese.votes.content_type_id, ctype.id)
+        self.assert_is(registry.get_settings_for_content_type(ctype.id),
+                       Cheese.votes)
+        self.assert_is(registry.get_settings_for_name('democracytest.cheese'),
+                       Cheese.votes)
+        self.assert_none(registry.get_settings_for_name('auth.user'))
+
+        # The vote and its item are the only queries.
+        ContentType.objects.clear_cache()
+        with self.assertNumQueries(2):
+            vote = Vote.objects.get_user_vote(cheddar, wesley)
+            self.assert_equal(vote.item, cheddar)
+
+        # Creating a vote from the item costs nothing, and keeps the item.
+        ContentType.objects.clear_cache()
+        with self.assert_num_queries(0):
+            vote = Vote(item=cheddar, user=wesley, direction=1)
+            self.assert_is(vote.item, cheddar)
+        self.assert_equal(vote.content_type_id, ctype.id)
+        self.assert_equal(vote.object_id, cheddar.pk)
+        self.assert_none(Vote(item=None).item)
+
     def test_get_queryset(self):
         cheddar = Cheese.objects.get(variety='Cheddar')
         votes = cheddar.votes.get_queryset()
@@ -169,6 +214,53 @@ class ObjectVotesTests(TestCase, SnakeTestMixin):
         # It's surviving somehow....
         reason.delete()
 
+    def test_count_votes_bulk(self):
+        cheeses = list(Cheese.objects.order_by('pk'))
+
+        # The first time, the tallies have to be counted.
+        Cheese.votes.get_vote_counts_bulk(cheeses)
+        with self.assert_num_queries(1):
+            counts = Cheese.votes.get_vote_counts_bulk(cheeses)
+
+        for cheese in cheeses:
+            self.assert_equal(counts[cheese.pk], cheese.votes.get_vote_counts())
+
+    def test_get_user_votes(self):
+        wesley = User.objects.get(username='wesley')
+        cheeses = list(Cheese.objects.order_by('pk'))
+        cheddar, brie, gorgonzola = cheeses
+
+        with self.assert_num_queries(1):
+            votes = Cheese.votes.get_user_votes(cheeses, wesley)
+        self.assert_equal(sorted(votes.keys()), [cheddar.pk, brie.pk])
+        self.assert_instances(votes.values(), Vote)
+
+        # The votes already know their items.
+        with self.assert_num_queries(0):
+            self.assert_is(votes[cheddar.pk].item, cheddar)
+            self.assert_equal(votes[cheddar.pk].direction, -1)
+            self.assert_equal(votes[brie.pk].direction, 1)
+
+        with self.assert_num_queries(0):
+            self.assert_equal(
+                Cheese.votes.get_user_votes(cheeses, AnonymousUser()), {}
+            )
+
+    def test_with_user_votes(self):
+        calvin = User.objects.get(username='calvin')
+
+        with self.assert_num_queries(2):
+            cheeses = list(Cheese.objects.with_user_votes(calvin)
+                                         .order_by('pk'))
+            self.assert_none(cheeses[0].user_vote)
+            self.assert_equal(cheeses[1].user_vote.direction, 1)
+            self.assert_false(cheeses[1].user_vote.effective)
+            self.assert_none(cheeses[2].user_vote)
+
+        cheeses = Cheese.objects.filter(variety='Brie') \
+                                .with_user_votes(calvin, attr='my_vote')
+        self.assert_equal(cheeses[0].my_vote.direction, 1)
+
     def test_update_scores(self):
         cheddar = Cheese.objects.get(variety='Cheddar')
         cheddar.optimistic_score = 0
@@ -223,3 +315,234 @@ class ObjectVotesTests(TestCase, SnakeTestMixin):
         with self.assert_raises(ValueError):
             cheddar.votes.add_vote(calvin, +1, "Elect")
 
+
+class CounterTests(TestCase, SnakeTestMixin):
+    fixtures = ['democracy_test_users']
+
+    def test_counters_settings(self):
+        self.assert_equal(Sermon.votes.counters, ('amens', 'heresies'))
+        self.assert_equal(Cheese.votes.counters, ())
+
+        with self.assert_raises(ImproperlyConfigured):
+            Votable(counters=('amens',))
+        with self.assert_raises(ImproperlyConfigured):
+            Votable(counters=('amens', 'heresies'), downvotes_allowed=False)
+
+    def test_counters_follow_votes(self):
+        calvin = User.objects.get(username='calvin')
+        wesley = User.objects.get(username='wesley')
+        sermon = Sermon.objects.create(title="On Predestination")
+
+        sermon.votes.add_vote(calvin, +1)
+        sermon.votes.add_vote(wesley, -1)
+        self.assert_fields_equal(sermon, amens=1, heresies=1, standing=0)
+
+        # Wesley is persuaded.
+        sermon.votes.add_vote(wesley, +1)
+        self.assert_fields_equal(sermon, amens=2, heresies=0, standing=2)
+
+        sermon.votes.remove_vote(calvin)
+        self.assert_fields_equal(sermon, amens=1, heresies=0, standing=1)
+
+        saved = Sermon.objects.get(pk=sermon.pk)
+        self.assert_fields_equal(saved, amens=1, heresies=0, standing=1)
+        self.assert_equal(saved.votes.get_vote_counts(), (1, 0))
+
+    def test_counters_ineffective_votes(self):
+        calvin = User.objects.get(username='calvin')
+        sermon = Sermon.objects.create(title="On Free Will")
+
+        vote = sermon.votes.add_vote(calvin, -1)
+        self.assert_fields_equal(sermon, amens=0, heresies=1, standing=-1)
+
+        vote.effective = False
+        vote.save()
+        self.assert_fields_equal(vote.item, amens=0, heresies=0, standing=0)
+
+        vote.delete()
+        self.assert_fields_equal(
+            Sermon.objects.get(pk=sermon.pk), amens=0, heresies=0, standing=0
+        )
+
+    def test_vote_counts_changed(self):
+        calvin = User.objects.get(username='calvin')
+        wesley = User.objects.get(username='wesley')
+        sermon = Sermon.objects.create(title="On Assurance")
+
+        sent = []
+        def receiver(sender, item, upvotes, downvotes, **kwargs):
+            sent.append((item.pk, upvotes, downvotes))
+        vote_counts_changed.connect(receiver, sender=Sermon)
+        try:
+            vote = sermon.votes.add_vote(calvin, -1)
+            sermon.votes.add_vote(calvin, +1)
+            Vote.objects.bulk_add_votes([(sermon, wesley, +1, '')])
+            vote.item.votes.remove_vote(calvin)
+        finally:
+            vote_counts_changed.disconnect(receiver, sender=Sermon)
+
+        self.assert_equal(sent, [(sermon.pk, 0, 1), (sermon.pk, 1, -1),
+                                 (sermon.pk, 1, 0), (sermon.pk, -1, 0)])
+
+    def test_counters_do_not_overwrite_item(self):
+        calvin = User.objects.get(username='calvin')
+        sermon = Sermon.objects.create(title="On Grace")
+
+        # Only the counters and scores get written.
+        sermon.title = "Unsaved title"
+        sermon.votes.add_vote(calvin, +1)
+        self.assert_equal(Sermon.objects.get(pk=sermon.pk).title, "On Grace")
+
+
+class TallyTests(TestCase, SnakeTestMixin):
+    fixtures = ['democracy_test_users', 'democracy_test_cheese']
+
+    def test_tally_created_from_votes(self):
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        self.assert_false(VoteTally.objects.exists())
+
+        self.assert_equal(cheddar.votes.get_vote_counts(), (1, 1))
+        tally = VoteTally.objects.get()
+        self.assert_fields_equal(tally, item=cheddar, upvotes=1, downvotes=1)
+
+        with self.assert_num_queries(1):
+            self.assert_equal(cheddar.votes.get_vote_counts(), (1, 1))
+
+    def test_tally_follows_votes(self):
+        calvin = User.objects.get(username='calvin')
+        arminius = User.objects.get(username='arminius')
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        ctype = ContentType.objects.get_for_model(Cheese)
+        sharp = VoteReason.objects.create(content_type=ctype, direction=1,
+                                          reason='Sharp')
+        bland = VoteReason.objects.create(content_type=ctype, direction=-1,
+                                          reason='Bland')
+
+        cheddar.votes.get_tally()
+        cheddar.votes.add_vote(calvin, +1, 'Sharp')
+        self.assert_equal(cheddar.votes.get_vote_counts(), (2, 1))
+        self.assert_equal(cheddar.votes.get_reason_counts(),
+                          {(1, ''): 1, (1, 'Sharp'): 1, (-1, ''): 1})
+
+        cheddar.votes.add_vote(arminius, -1, 'Bland')
+        self.assert_equal(cheddar.votes.get_vote_counts(), (1, 2))
+        self.assert_equal(cheddar.votes.get_reason_counts(),
+                          {(1, 'Sharp'): 1, (-1, ''): 1, (-1, 'Bland'): 1})
+
+        vote = cheddar.votes.get_user_vote(calvin)
+        vote.effective = False
+        vote.save()
+        cheddar.votes.remove_vote(arminius)
+        self.assert_equal(cheddar.votes.get_vote_counts(), (0, 1))
+        self.assert_equal(cheddar.votes.get_reason_counts(), {(-1, ''): 1})
+
+        # The reasons survive otherwise.
+        sharp.delete()
+        bland.delete()
+
+    def test_rebuild_command(self):
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        brie = Cheese.objects.get(variety='Brie')
+        Cheese.votes.get_vote_counts_bulk([cheddar, brie])
+
+        # Votes that sneak past AbstractVote.save aren't tallied...
+        Vote.objects.for_item(cheddar).update(direction=1)
+        self.assert_equal(cheddar.votes.get_vote_counts(), (1, 1))
+
+        # ...until the tallies are rebuilt.
+        call_command('rebuild_vote_tallies', 'democracytest.Cheese',
+                     verbosity=0)
+        self.assert_equal(cheddar.votes.get_vote_counts(), (2, 0))
+        self.assert_equal(cheddar.votes.get_reason_counts(), {(1, ''): 2})
+        self.assert_equal(brie.votes.get_vote_counts(), (1, 0))
+
+
+class BulkVoteTests(TestCase, SnakeTestMixin):
+    fixtures = ['democracy_test_users', 'democracy_test_cheese']
+
+    def test_bulk_add_votes(self):
+        calvin = User.objects.get(username='calvin')
+        wesley = User.objects.get(username='wesley')
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        gorgonzola = Cheese.objects.get(variety='Gorgonzola')
+        sermon = Sermon.objects.create(title="On Cheese")
+
+        sent = []
+        def receiver(sender, votes, **kwargs):
+            sent.append((sender, len(votes)))
+        post_bulk_vote.connect(receiver)
+        try:
+            votes = Vote.objects.bulk_add_votes([
+                (cheddar, calvin, +1, ''),
+                (cheddar, wesley, "+1", ''),        # Changing his vote.
+                (gorgonzola, calvin, "-1", ''),
+                (gorgonzola, calvin, +1, ''),       # Changing his mind.
+                (sermon, wesley, "+1", ''),
+            ])
+        finally:
+            post_bulk_vote.disconnect(receiver)
+
+        self.assert_equal(len(votes), 4)
+        self.assert_true(all(vote.pk for vote in votes))
+        self.assert_equal(sorted(sent), sorted([(Cheese, 3), (Sermon, 1)]))
+
+        self.assert_equal(cheddar.votes.get_vote_counts(), (3, 0))
+        self.assert_fields_equal(cheddar, optimistic_score=7,
+                                 pessimistic_score=4)
+        self.assert_equal(gorgonzola.votes.get_vote_counts(), (1, 0))
+        self.assert_equal(cheddar.votes.get_user_vote(wesley).direction, 1)
+        self.assert_fields_equal(Sermon.objects.get(pk=sermon.pk),
+                                 amens=1, heresies=0, standing=1)
+
+    def test_bulk_add_votes_adjusts_tallies(self):
+        calvin = User.objects.get(username='calvin')
+        wesley = User.objects.get(username='wesley')
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        self.assert_equal(cheddar.votes.get_vote_counts(), (1, 1))
+
+        # The tally is adjusted by the change, not counted again.
+        VoteTally.objects.filter(object_id=cheddar.pk).update(upvotes=10)
+        Vote.objects.bulk_add_votes([(cheddar, calvin, +1, ''),
+                                     (cheddar, wesley, +1, '')])
+        self.assert_equal(cheddar.votes.get_vote_counts(), (12, 0))
+
+    def test_bulk_add_votes_wrong_model(self):
+        calvin = User.objects.get(username='calvin')
+        psalm = Psalm.objects.create(title="Psalm 23")
+
+        with self.assert_raises(ValueError):
+            Vote.objects.bulk_add_votes([(psalm, calvin, +1, '')])
+        self.assert_equal(Vote.objects.count(), 4)
+
+        cheddar = Cheese.objects.get(variety='Cheddar')
+        with self.assert_raises(ValueError):
+            PsalmVote.objects.bulk_add_votes([(psalm, calvin, +1, ''),
+                                              (cheddar, calvin, +1, '')])
+        self.assert_false(PsalmVote.objects.exists())
+
+    def test_bulk_add_votes_ineffective(self):
+        calvin = User.objects.get(username='calvin')
+        gorgonzola = Cheese.objects.get(variety='Gorgonzola')
+
+        def receiver(sender, votes, **kwargs):
+            for vote in votes:
+                vote.effective = False
+        pre_bulk_vote.connect(receiver)
+        try:
+            Vote.objects.bulk_add_votes([(gorgonzola, calvin, +1, '')])
+        finally:
+            pre_bulk_vote.disconnect(receiver)
+
+        self.assert_equal(gorgonzola.votes.get_vote_counts(), (0, 0))
+        self.assert_false(gorgonzola.votes.get_user_vote(calvin).effective)
+
+    def test_bulk_add_votes_invalid(self):
+        calvin = User.objects.get(username='calvin')
+        cheddar = Cheese.objects.get(variety='Cheddar')
+
+        with self.assert_raises(ValueError):
+            Vote.objects.bulk_add_votes([
+                (cheddar, calvin, +1, ''),
+                (cheddar, calvin, +1, 'Elect'),
+            ])
+        self.assert_none(cheddar.votes.get_user_vote(calvin))
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.urls
+==============
+A default URLConf, with the voting endpoint at ``vote/``.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.conf.urls import patterns
+from django.conf.urls import url
+
+from .views import vote
+
+urlpatterns = patterns("",
+    url(
+        regex=r"^vote/$",
+        view=vote,
+        name="democracy_vote"
+    ),
+)
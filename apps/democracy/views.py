@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+democracy.views
+===============
+An HTTP endpoint for voting, meant for AJAX.
+
+It takes one vote as ordinary form fields::
+
+    content_type=stories.story&object_id=15&direction=1&reason=
+
+or a batch of them as a JSON body (``application/json``), either as lists
+or as objects with the same keys as the form fields::
+
+    {"votes": [["stories.story", 15, 1, ""], ["comments.comment", 8, -1]]}
+
+A direction of ``0`` removes the user's vote. Content types can be given as
+``app_label.model`` or as IDs, and both they and the reasons are resolved
+from caches, so a vote costs a query to load its item and then only what
+saving the vote costs. The answer is the items' new vote counts::
+
+    {"tallies": {"stories.story": {"15": [4, 0]}}}
+
+Errors are answered with an ``error`` message and a 4xx status, and if
+any vote in a batch is invalid, none of them are saved. If a batch has more
+than one vote on an item, the last one wins, just as if they'd been sent
+one at a time.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   MIT/X11, see package's LICENSE for details
+"""
+from __future__ import unicode_literals
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import six
+from django.views.decorators.http import require_POST
+
+from .registry import (get_settings_for_content_type, get_settings_for_name,
+                       model_name)
+
+
+class VoteRequestError(ValueError):
+    """
+    Raised when a vote request doesn't make sense.
+    """
+    def __init__(self, message, status=400):
+        super(VoteRequestError, self).__init__(message)
+        self.status = status
+
+
+def _json_response(data, status=200):
+    return HttpResponse(json.dumps(data, separators=(',', ':')),
+                        status=status, content_type='application/json')
+
+
+def _read_entries(request):
+    if request.META.get('CONTENT_TYPE', '').startswith('application/json'):
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+        except ValueError:
+            raise VoteRequestError("Invalid JSON")
+        entries = data.get('votes') if isinstance(data, dict) else data
+        if not isinstance(entries, list):
+            raise VoteRequestError("Expected a list of votes")
+    else:
+        entries = [request.POST]
+
+    limit = getattr(settings, 'DEMOCRACY_VOTE_BATCH_SIZE', 50)
+    if not entries:
+        raise VoteRequestError("No votes given")
+    if len(entries) > limit:
+        raise VoteRequestError("No more than %d votes at once" % limit)
+
+    for entry in entries:
+        if isinstance(entry, (list, tuple)):
+            if not 3 <= len(entry) <= 4:
+                raise VoteRequestError("Votes need a content type, object "
+                                       "ID, direction and optional reason")
+            entry = list(entry) + [''] * (4 - len(entry))
+            yield tuple(entry)
+        elif hasattr(entry, 'get'):
+            yield (entry.get('content_type'), entry.get('object_id'),
+                   entry.get('direction'), entry.get('reason') or '')
+        else:
+            raise VoteRequestError("Invalid vote")
+
+
+def _get_model(content_type):
+    # Both of these come from the registry, so they don't need a query.
+    if isinstance(content_type, six.string_types) and '.' in content_type:
+        vote_settings = get_settings_for_name(content_type)
+    else:
+        try:
+            vote_settings = get_settings_for_content_type(int(content_type))
+        except (TypeError, ValueError):
+            vote_settings = None
+
+    if vote_settings is None:
+        raise VoteRequestError("%r can't be voted on" % (content_type,))
+    return model_name(vote_settings.model), vote_settings.model
+
+
+def _parse_votes(entries):
+    """
+    Returns ``(model, object ID, reason object or None)`` for each entry,
+    checking the reasons without touching the database.
+    """
+    votes = []
+    for (content_type, object_id, direction, reason) in entries:
+        name, model = _get_model(content_type)
+        try:
+            object_id = int(object_id)
+            direction = int(direction)
+        except (TypeError, ValueError):
+            raise VoteRequestError("Object IDs and directions must be "
+                                   "numbers")
+        if reason is None:
+            reason = ''
+        elif not isinstance(reason, six.string_types):
+            raise VoteRequestError("Reasons must be strings")
+
+        reason_obj = None
+        if direction != 0:
+            try:
+                reason_obj = model.votes.get_reason_object(direction, reason)
+            except ValueError:
+                reason_obj = None
+            if reason_obj is None:
+                raise VoteRequestError("%s %s is not a valid reason for %s" %
+                                       (direction, reason, name))
+        votes.append((name, model, object_id, reason_obj))
+    return votes
+
+
+def _load_items(votes):
+    """
+    Loads every item being voted on, with one query per model.
+    """
+    ids = {}
+    for (_, model, object_id, _) in votes:
+        ids.setdefault(model, set()).add(object_id)
+
+    items = {}
+    for (model, pks) in ids.items():
+        found = model._default_manager.in_bulk(list(pks))
+        if len(found) != len(pks):
+            raise VoteRequestError("No such %s" % model._meta.verbose_name,
+                                   status=404)
+        for (pk, item) in found.items():
+            items[(model, pk)] = item
+    return items
+
+
+def _save_votes(user, votes, items):
+    latest = {}
+    for (_, model, object_id, reason_obj) in votes:
+        latest[(model, object_id)] = reason_obj
+
+    with transaction.atomic():
+        _save_latest_votes(user, latest, items)
+
+
+def _save_latest_votes(user, latest, items):
+    if len(latest) == 1:
+        # One vote gets the usual per-vote signals.
+        ((model, object_id), reason_obj) = list(latest.items())[0]
+        item = items[(model, object_id)]
+        if reason_obj is None:
+            item.votes.remove_vote(user)
+        else:
+            item.votes.add_vote(user, reason_obj.direction, reason_obj.reason)
+        return
+
+    bulk = {}
+    for ((model, object_id), reason_obj) in latest.items():
+        item = items[(model, object_id)]
+        if reason_obj is None:
+            item.votes.remove_vote(user)
+        elif model.votes.buffer is not None:
+            item.votes.add_vote(user, reason_obj.direction, reason_obj.reason)
+        else:
+            bulk.setdefault(model.votes.vote_model, []).append(
+                (item, user, reason_obj.direction, reason_obj.reason)
+            )
+    for (vote_model, batch) in bulk.items():
+        vote_model.objects.bulk_add_votes(batch)
+
+
+def _get_tallies(votes, items):
+    tallies = {}
+    uncounted = {}
+    for (key, model, object_id, _) in votes:
+        item = items[(model, object_id)]
+        if model.votes.counters:
+            # The counters were updated on the item as the vote was saved.
+            upvotes, downvotes = item.votes.get_counter_values()
+            tallies.setdefault(key, {})['%d' % object_id] = [upvotes,
+                                                             downvotes]
+        else:
+            uncounted.setdefault((key, model), []).append(object_id)
+
+    for ((key, model), pks) in uncounted.items():
+        counts = model.votes.get_vote_counts_bulk(pks)
+        for (pk, (upvotes, downvotes)) in counts.items():
+            tallies.setdefault(key, {})['%d' % pk] = [upvotes, downvotes]
+    return tallies
+
+
+@require_POST
+def vote(request):
+    """
+    Places, changes or removes the logged-in user's votes. See the module
+    documentation for the format.
+    """
+    if not request.user.is_authenticated():
+        return _json_response({'error': "Log in to vote"}, status=403)
+
+    try:
+        votes = _parse_votes(_read_entries(request))
+        items = _load_items(votes)
+        _save_votes(request.user, votes, items)
+    except VoteRequestError as e:
+        return _json_response({'error': six.text_type(e)}, status=e.status)
+    return _json_response({'tallies': _get_tallies(votes, items)})
@@ -18,7 +18,18 @@ from django.dispatch import receiver
 from django.utils import six
 from django.utils import timezone
 
-from .models import VoteReason
+from . import registry
+from .buffer import get_default_buffer
+from .models import VoteReason, VoteTally, vote_change
+from .signals import vote_counts_changed
+
+
+def get_votable_models():
+    """
+    Returns a list of all the installed models that have a `Votable`.
+    """
+    return [model for model in models.get_models()
+            if isinstance(getattr(model, 'votes', None), VoteSettings)]
 
 
 class Votable(object):
@@ -29,8 +40,11 @@ class Votable(object):
 
     Pass all the parameters after `vote_model` as keyword arguments.
 
-    :param vote_model:          The name of the model to store votes as.
-                                This should inherit from `Vote`.
+    :param vote_model:          The model to store votes as, or its name
+                                (``"app_label.Model"``, or just ``"Model"``
+                                for one in the same app). This should
+                                inherit from `AbstractVote` -- see
+                                `make_vote_model`.
     :param downvotes_allowed:   Whether users should be able to downvote in
                                 addition to upvote.
     :param use_reason_model:    If `True`, the app's user can store voting
@@ -48,21 +62,34 @@ class Votable(object):
                                 when votes are committed to update the fields.
                                 They are guaranteed to be called in order.
     :param score:               You can use this if there's only one `score`.
+    :param buffered:            If `True`, votes are collected in memory
+                                and written in batches by the default
+                                `democracy.buffer.VoteBuffer`, instead of
+                                being written right away. (You can also pass
+                                your own `VoteBuffer`.)
+    :param counters:            A pair of ``(upvotes, downvotes)`` integer
+                                fields to keep running vote counts in.
+                                (If `downvotes_allowed` is `False`, just
+                                the upvotes field.) When these are set,
+                                votes adjust the counters with atomic
+                                ``UPDATE`` queries instead of recounting
+                                every vote, and the scores are computed from
+                                the counters.
     """
     def __init__(self, vote_model=None, downvotes_allowed=True,
                        use_reason_model=True, reasons=(),
-                       scores=(), score=None):
+                       scores=(), score=None, counters=(), buffered=False):
         self._settings_cache = {}
 
         # We can't actually *load* the Vote model yet,
         # it might not yet be defined!
         if vote_model is not None:
             try:
-                self._app_label, _self.model_name = vote_model.split(".")
+                self._app_label, self._model_name = vote_model.split(".")
             except ValueError:
                 # If we can't split, assume a model in current app
                 self._app_label = None
-                self._model_name = relation
+                self._model_name = vote_model
             except AttributeError:
                 # If it doesn't have a split it's actually a model class
                 self._app_label = vote_model._meta.app_label
@@ -102,26 +129,58 @@ class Votable(object):
         else:
             self.scores = tuple(scores)
 
+        self.counters = tuple(counters)
+        if self.counters and len(self.counters) != (2 if downvotes_allowed else 1):
+            raise ImproperlyConfigured("`counters` must name an upvotes field, "
+                                       "and a downvotes field if downvotes "
+                                       "are allowed")
+
+        self.buffered = buffered
+
+        #: Where each instance's `ObjectVotes` is cached.
+        self._instance_attr = '_votes_cache'
+
     def __get__(self, instance, owner):
-        if owner not in self._settings_cache:
-            # Build a VoteSettings
-            app_label = self._app_label or owner._meta.app_label
-            vote_model = get_model(app_label, self._model_name)
-            if vote_model is None:
-                raise ImproperlyConfigured("Vote model %s.%s not found" %
-                                           (app_label, self._model_name))
-
-            self._settings_cache[owner] = VoteSettings(
-                model=owner, vote_model=vote_model,
-                downvotes_allowed=self.downvotes_allowed,
-                scores=self.scores, default_reasons=self.default_reasons,
-                use_reason_model=self.use_reason_model
-            )
+        if instance is not None:
+            # This is hit for every vote, score and template lookup, so the
+            # accessor is built once per instance. (A copied instance shares
+            # its original's __dict__, hence the identity check.)
+            votes = instance.__dict__.get(self._instance_attr)
+            if votes is not None and votes.item is instance:
+                return votes
+
+        settings = self._settings_cache.get(owner)
+        if settings is None:
+            settings = self._settings_cache[owner] = self._build_settings(owner)
 
         if instance is None:
-            return self._settings_cache[owner]
+            return settings
+        votes = instance.__dict__[self._instance_attr] = \
+            ObjectVotes(instance, settings)
+        return votes
+
+    def _build_settings(self, owner):
+        if self.buffered is True:
+            buffer = get_default_buffer()
+        elif self.buffered is False:
+            buffer = None
         else:
-            return ObjectVotes(instance, self._settings_cache[owner])
+            buffer = self.buffered
+
+        # Build a VoteSettings
+        app_label = self._app_label or owner._meta.app_label
+        vote_model = get_model(app_label, self._model_name)
+        if vote_model is None:
+            raise ImproperlyConfigured("Vote model %s.%s not found" %
+                                       (app_label, self._model_name))
+
+        return VoteSettings(
+            model=owner, vote_model=vote_model,
+            downvotes_allowed=self.downvotes_allowed,
+            scores=self.scores, default_reasons=self.default_reasons,
+            use_reason_model=self.use_reason_model,
+            counters=self.counters, buffer=buffer
+        )
 
 
 class VoteSettings(object):
@@ -131,8 +190,14 @@ class VoteSettings(object):
 
     Don't create these yourself.
     """
+    __slots__ = ('model', 'vote_model', 'downvotes_allowed', 'scores',
+                 'default_reasons', 'use_reason_model', 'counters', 'buffer',
+                 'compute_methods', '_content_type_id', '_default_reasons',
+                 '_default_reason_table')
+
     def __init__(self, model, vote_model, downvotes_allowed, scores,
-                       default_reasons, use_reason_model):
+                       default_reasons, use_reason_model, counters=(),
+                       buffer=None):
         #: The model class itself.
         self.model = model
 
@@ -154,14 +219,56 @@ class VoteSettings(object):
         #: Whether to look up voting reasons in `VoteReason` or not.
         self.use_reason_model = use_reason_model
 
-        # Create some fake VoteReason objects.
-        ctype = ContentType.objects.get_for_model(model)
+        #: The fields that keep running ``(upvotes, downvotes)`` counts,
+        #: or an empty tuple if the scores are computed by counting votes.
+        self.counters = counters
+
+        #: The `VoteBuffer` that votes are collected in before they're
+        #: written, or `None` if they're written right away.
+        self.buffer = buffer
 
-        self._default_reasons = tuple(
-            VoteReason(content_type=ctype, direction=d, reason=r)
-            for (d, r) in default_reasons
+        #: ``(score, compute_score)`` pairs, with the unbound methods looked
+        #: up once here instead of on every vote.
+        self.compute_methods = tuple(
+            (attr, getattr(model, 'compute_' + attr)) for attr in scores
         )
 
+        # These need the content type, which is looked up when it's first
+        # needed, since the table might not exist yet.
+        self._forget_content_type()
+
+    def _forget_content_type(self):
+        self._content_type_id = None
+        self._default_reasons = None
+        self._default_reason_table = None
+
+    @property
+    def content_type_id(self):
+        """
+        The ID of the model's `ContentType`. It's looked up once, then
+        pinned here.
+        """
+        ctype_id = self._content_type_id
+        if ctype_id is None:
+            ctype = ContentType.objects.get_for_model(self.model)
+            ctype_id = self._content_type_id = ctype.id
+            registry.register(self)
+        return ctype_id
+
+    def _get_default_reasons(self):
+        if self._default_reasons is None:
+            # Create some fake VoteReason objects.
+            reasons = tuple(
+                VoteReason(content_type_id=self.content_type_id,
+                           direction=d, reason=r)
+                for (d, r) in self.default_reasons
+            )
+            self._default_reason_table = dict(
+                ((obj.direction, obj.reason), obj) for obj in reasons
+            )
+            self._default_reasons = reasons
+        return self._default_reasons
+
     @property
     def reasons(self):
         """
@@ -173,19 +280,95 @@ class VoteSettings(object):
 
             if reasons:
                 return reasons
-            else:
-                return self._default_reasons
-        else:
-            return self._default_reasons
+        return self._get_default_reasons()
+
+    def get_vote_counts_bulk(self, items):
+        """
+        Return a dict mapping the primary key of each item in `items` to a
+        tuple of ``(upvotes, downvotes)``, like `ObjectVotes.get_vote_counts`.
+        It reads every item's tally in one query, no matter how many items
+        there are, so use it when listing items. (Items that don't have a
+        tally yet get one, which takes a few more queries -- so this can
+        write to the database.)
+
+        :param items:   An iterable of instances of this model,
+                        or their primary keys.
+        """
+        return VoteTally.objects.get_vote_counts_bulk(self.model, items)
+
+    def get_reason_object(self, direction, reason=''):
+        """
+        Returns the reason object matching a `direction` and `reason`,
+        or `None` if there is none.
+
+        `direction` can be passed as a string. In addition, if `reason` is
+        blank and `direction` contains a space, the first word of `direction`
+        will be considered a string and the rest will be considered the
+        reason -- so ``"+1 Clever"`` is equivalent to ``(1, "Clever")``.
+        Therefore, you can use `VoteReason.description`.
+        """
+        if reason and reason.strip() == '':
+            raise ValueError("Blank reason")
+
+        if isinstance(direction, six.text_type):
+            if ' ' in direction and reason == '':
+                direction, reason = direction.split(' ', 1)
+                if reason.strip() == '':
+                    raise ValueError("Blank reason")
+
+            direction = int(direction, 10)
+
+        if direction != 1 and direction != -1:
+            raise ValueError("Only +1 or -1 can be directions")
+
+        if self.use_reason_model:
+            table = VoteReason.objects.get_table_for_model(self.model)
+            if table:
+                return table.get((direction, reason))
+
+        self._get_default_reasons()
+        return self._default_reason_table.get((direction, reason))
+
+    def get_user_votes(self, items, user):
+        """
+        Return a dict mapping the primary key of each item in `items` that
+        `user` has voted on to their vote, using a single query.
+        Anonymous users have never voted on anything, so this doesn't
+        bother querying for them.
+
+        :param items:   An iterable of instances of this model,
+                        or their primary keys.
+        :param user:    The user whose votes to look up.
+        """
+        if user is None or not user.is_authenticated():
+            return {}
+        return self.vote_model.objects.get_user_votes(self.model, items, user)
+
+    def attach_user_votes(self, items, user, attr='user_vote'):
+        """
+        Sets `attr` on each item in `items` to `user`'s vote on it,
+        or `None` if they haven't voted on it, so that templates can draw
+        voting arrows without any further queries.
+        (`VotableQuerySet.with_user_votes` does this for you.)
+
+        :param items:   A sequence of instances of this model.
+        :param user:    The user whose votes to look up.
+        :param attr:    The attribute to store the votes in.
+        """
+        votes = self.get_user_votes(items, user)
+        for item in items:
+            setattr(item, attr, votes.get(item.pk))
 
 
 class ObjectVotes(object):
     """
     This is the object that actually appears when you access the `votes`
-    property on an object. (Yay descriptors!)
+    property on an object. (Yay descriptors!) Each instance only gets one.
 
     Don't create these yourself.
     """
+    __slots__ = ('settings', 'item', 'vote_model', 'vote_objects')
+
     def __init__(self, item, settings):
         #: The `VoteSettings` object containing this object's settings.
         self.settings = settings
@@ -195,6 +378,11 @@ class ObjectVotes(object):
         self.vote_model = settings.vote_model
         self.vote_objects = settings.vote_model.objects
 
+    def __reduce__(self):
+        # Instances are pickled with their __dict__, where these are cached.
+        # The settings can't be pickled, but the descriptor can rebuild us.
+        return (getattr, (self.item, 'votes'))
+
     @property
     def reasons(self):
         """
@@ -208,7 +396,11 @@ class ObjectVotes(object):
         Returns the vote a particular user has made on this object,
         or `None` if they have yet to vote.
         """
-        return self.vote_objects.get_user_vote(self.item, user)
+        vote = self.vote_objects.get_user_vote(self.item, user)
+        if vote is not None:
+            # Save the vote a trip to the database to fetch its item.
+            vote.item = self.item
+        return vote
 
     def get_queryset(self):
         """
@@ -217,49 +409,33 @@ class ObjectVotes(object):
         """
         return self.vote_objects.for_item(self.item)
 
+    def get_tally(self):
+        """
+        Return the `VoteTally` for this object.
+        """
+        return VoteTally.objects.get_for_item(self.item)
+
     def get_vote_counts(self):
         """
         Return a tuple of ``(upvotes, downvotes)``. Both numbers are positive,
         and ineffective votes are not counted.
         """
-        directions = self.get_queryset() \
-            .filter(effective=True).values('direction') \
-            .annotate(votes=models.Count('direction'))
+        tally = self.get_tally()
+        return tally.upvotes, tally.downvotes
 
-        counts = dict((d['direction'], d['votes']) for d in directions)
-        # Just ignore anything that's not 1 or -1.
-        return counts.get(1, 0), counts.get(-1, 0)
+    def get_reason_counts(self):
+        """
+        Return a dict mapping ``(direction, reason)`` to the number of
+        effective votes for that reason.
+        """
+        return self.get_tally().get_reason_counts()
 
     def get_reason_object(self, direction, reason=''):
         """
         Returns the reason object matching a `direction` and `reason`,
-        or `None` if there is none.
-
-        `direction` can be passed as a string. In addition, if `reason` is
-        blank and `direction` contains a space, the first word of `direction`
-        will be considered a string and the rest will be considered the
-        reason -- so ``"+1 Clever"`` is equivalent to ``(1, "Clever")``.
-        Therefore, you can use `VoteReason.description`.
+        or `None` if there is none. (See `VoteSettings.get_reason_object`.)
         """
-        if reason and reason.strip() == '':
-            raise ValueError("Blank reason")
-
-        if isinstance(direction, six.text_type):
-            if ' ' in direction and reason == '':
-                direction, reason = direction.split(' ', 1)
-                if reason.strip() == '':
-                    raise ValueError("Blank reason")
-
-            direction = int(direction, 10)
-
-        if direction != 1 and direction != -1:
-            raise ValueError("Only +1 or -1 can be directions")
-
-        for obj in self.reasons:
-            if obj.direction == direction and obj.reason == reason:
-                return obj
-
-        return None
+        return self.settings.get_reason_object(direction, reason)
 
     def add_vote(self, user, direction, reason=''):
         """
@@ -269,6 +445,9 @@ class ObjectVotes(object):
         This uses `get_reason_object` to resolve `direction` and `reason`,
         so any format acceptable there is usable.
 
+        If the item's votes are buffered, the vote is only added to the
+        buffer, and the vote returned is an unsaved placeholder.
+
         :param user:        The user voting.
         :param direction:   The direction they're voting in -- +1 or -1.
         :param reason:      The voting reason.
@@ -281,6 +460,12 @@ class ObjectVotes(object):
             raise ValueError("%s %s is not a valid voting reason" %
                              (direction, reason))
 
+        if self.settings.buffer is not None:
+            return self.settings.buffer.add(self.item, user, reason_obj)
+        else:
+            return self._save_vote(user, reason_obj)
+
+    def _save_vote(self, user, reason_obj):
         # Should we just change an existing vote?
         vote = self.get_user_vote(user)
         if vote is None:
@@ -292,7 +477,7 @@ class ObjectVotes(object):
             # Update the vote. (Leave "effective" in place!)
             vote.direction = reason_obj.direction
             vote.reason = reason_obj.reason
-            vote.placed_at = timezone.now()
+            vote.vote_date = timezone.now()
 
         # Save the Vote instance.
         # The save() method automatically updates everything.
@@ -300,32 +485,134 @@ class ObjectVotes(object):
 
         # Because Django doesn't have an identity map, the Vote may query a
         # fresh copy as its `item`, and so our `item` will stay unchanged.
-        altered_item = vote.item
-        for score in self.settings.scores:
-            setattr(self.item, score, getattr(altered_item, score))
+        self._copy_scores(vote.item)
 
         return vote
 
     def remove_vote(self, user):
         """
-        Removes a user's vote for a particular item.
+        Removes a user's vote for a particular item. (If the item's votes
+        are buffered, this also throws away any vote still in the buffer.)
 
         :param user:        The user voting.
         """
+        if self.settings.buffer is not None:
+            self.settings.buffer.discard(self.item, user)
+
         # Is there a vote to remove?
         vote = self.get_user_vote(user)
         if vote is not None:
             # Okay, yes, there is.
             vote.delete()
 
-        # See above for why I'm doing this.
-        altered_item = vote.item
-        for score in self.settings.scores:
-            setattr(self.item, score, getattr(altered_item, score))
+            # See above for why I'm doing this.
+            self._copy_scores(vote.item)
+
+    def _copy_scores(self, altered_item):
+        if altered_item is self.item:
+            return
+
+        for attr in self.settings.counters + self.settings.scores:
+            setattr(self.item, attr, getattr(altered_item, attr))
+
+    def get_counter_values(self):
+        """
+        Return a tuple of ``(upvotes, downvotes)`` from the item's counter
+        fields, without querying the database. Only use this if the
+        `Votable` has `counters`.
+        """
+        counters = self.settings.counters
+        upvotes = getattr(self.item, counters[0])
+        downvotes = getattr(self.item, counters[1]) if len(counters) > 1 else 0
+        return upvotes, downvotes
+
+    def record_vote_change(self, old_state, new_state):
+        """
+        Updates the item's tally, counters and scores after one of its votes
+        is changed. The states are ``(direction, reason, effective)`` tuples
+        for the vote before and after the change, or `None` if the vote
+        didn't exist before or doesn't exist any more.
+
+        You should never need to call this yourself, as `AbstractVote`'s save
+        and delete methods invoke this automatically. But if you do, call it
+        within an `atomic` block, after saving the vote.
+        """
+        upvotes, downvotes, reasons = vote_change(old_state, new_state)
+        if not (upvotes or downvotes or any(reasons.values())):
+            # Nothing that gets counted has changed.
+            return
+
+        counts = VoteTally.objects.apply_change(self.item, upvotes,
+                                                downvotes, reasons)
+        if self.settings.counters:
+            self.apply_vote_change(upvotes, downvotes)
+        else:
+            self._save_scores(self._compute_scores(*counts))
+
+        if upvotes or downvotes:
+            vote_counts_changed.send(self.settings.model, item=self.item,
+                                     upvotes=upvotes, downvotes=downvotes)
+
+    def set_vote_counts(self, upvotes, downvotes):
+        """
+        Sets the item's counters (if it has any) to the given vote counts,
+        then recalculates its scores. The counters and scores are saved with
+        a single ``UPDATE`` query.
+
+        This is used when votes are added in bulk. Call it within an
+        `atomic` block.
+
+        It returns a dict of the item's new scores.
+        """
+        changes = dict(zip(self.settings.counters, (upvotes, downvotes)))
+        for attr, value in changes.items():
+            setattr(self.item, attr, value)
+
+        changes.update(self._compute_scores(upvotes, downvotes))
+        self._save_scores(changes)
+        return changes
+
+    def apply_vote_change(self, upvotes, downvotes):
+        """
+        Adds `upvotes` and `downvotes` (which may be negative) to the item's
+        counter fields, then recalculates its scores from the new counts.
+
+        Only the counter and score columns are written, using ``UPDATE``
+        queries, so concurrent votes on the item can't overwrite each other.
+        Only use this if the `Votable` has `counters`.
+
+        You should never need to call this yourself, as `AbstractVote`'s save
+        and delete methods invoke this automatically. But if you do, call it
+        within an `atomic` block.
+
+        It returns a dict of the item's new scores.
+        """
+        counters = self.settings.counters
+        rows = self.settings.model._default_manager.filter(pk=self.item.pk)
+
+        changes = {counters[0]: models.F(counters[0]) + upvotes}
+        if len(counters) > 1:
+            changes[counters[1]] = models.F(counters[1]) + downvotes
+        rows.update(**changes)
+
+        # The UPDATE locked the row until the transaction ends,
+        # so these are the final counts.
+        for attr, value in zip(counters, rows.values_list(*counters)[0]):
+            setattr(self.item, attr, value)
+
+        new_scores = self.update_scores()
+        self._save_scores(new_scores)
+        return new_scores
+
+    def _save_scores(self, new_scores):
+        if new_scores:
+            self.settings.model._default_manager.filter(pk=self.item.pk) \
+                .update(**new_scores)
 
     def update_scores(self):
         """
         Recalculates the scores of the item, based on the current vote counts.
+        (If the `Votable` has `counters`, the counts are read from them.)
         Does not save the item.
 
         You should never need to call this yourself, as `AbstractVote`'s save
@@ -334,22 +621,26 @@ class ObjectVotes(object):
 
         It returns a dict of the item's new scores.
         """
-        votes = self.item.votes
-        upvotes, downvotes = votes.get_vote_counts()
+        if self.settings.counters:
+            upvotes, downvotes = self.get_counter_values()
+        else:
+            upvotes, downvotes = self.get_vote_counts()
+        return self._compute_scores(upvotes, downvotes)
+
+    def _compute_scores(self, upvotes, downvotes):
         new_scores = {}
+        item = self.item
 
         if self.settings.downvotes_allowed:
             # Call object.compute_score(upvotes, downvotes) for each score.
-            for attr in self.settings.scores:
-                compute_method = getattr(self.item, 'compute_' + attr)
-                score = new_scores[attr] = compute_method(upvotes, downvotes)
-                setattr(self.item, attr, score)
+            for (attr, compute_method) in self.settings.compute_methods:
+                score = new_scores[attr] = compute_method(item, upvotes,
+                                                          downvotes)
+                setattr(item, attr, score)
         else:
             # Call object.compute_score(upvotes) for each score.
-            for attr in self.settings.scores:
-                compute_method = getattr(self.item, 'compute_' + attr)
-                score = new_scores[attr] = compute_method(upvotes)
-                setattr(self.item, attr, score)
+            for (attr, compute_method) in self.settings.compute_methods:
+                score = new_scores[attr] = compute_method(item, upvotes)
+                setattr(item, attr, score)
 
         return new_scores
-
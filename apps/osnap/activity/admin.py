@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.activity.admin
+====================
+Configuration for the Django admin interface.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.contrib import admin
+
+from .models import Activity
+
+class ActivityAdmin(admin.ModelAdmin):
+    date_hierarchy = 'created'
+    list_display = ('created', 'user', 'kind', 'title', 'visible')
+    list_filter = ('kind', 'visible')
+    raw_id_fields = ('user',)
+
+
+admin.site.register(Activity, ActivityAdmin)
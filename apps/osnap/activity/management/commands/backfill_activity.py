@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.activity.management.commands.backfill_activity
+====================================================
+Rebuilds the activity table from the stories, comments and votes already
+in the database.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from ...models import Activity
+
+
+class Command(NoArgsCommand):
+    help = ("Rebuilds every user's recent activity from their stories, "
+            "comments and votes.")
+
+    def handle_noargs(self, **options):
+        with transaction.atomic():
+            count = Activity.objects.backfill()
+        if int(options.get('verbosity', 1)) >= 1:
+            self.stdout.write("Recorded %d activity rows" % count)
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.activity.managers
+=======================
+Recording activity, and reading it back a page at a time.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models import Q
+from django.utils.text import Truncator
+
+from democracy.registry import (get_content_type_id,
+                                get_settings_for_content_type)
+from osnap import pagecache
+from osnap.stories.pagination import KeysetPage, decode_cursor, encode_cursor
+
+def _vote_target(vote):
+    """
+    Returns the ``(content_type_id, object_id)`` of a vote's item, without
+    loading the item.
+    """
+    if hasattr(vote, 'content_type_id'):
+        return (vote.content_type_id, vote.object_id)
+    # Votes from a per-model table have a plain foreign key instead.
+    item_model = type(vote)._meta.get_field('item').rel.to
+    return (get_content_type_id(item_model), vote.item_id)
+
+
+def _invalidate_profiles(user_ids):
+    usernames = get_user_model().objects.filter(pk__in=set(user_ids)) \
+                                .values_list('username', flat=True)
+    pagecache.invalidate(*['user:%s' % username for username in usernames])
+
+
+class ActivityManager(models.Manager):
+    def describe(self, target):
+        """
+        Returns the fields an activity row copies from `target`, which is
+        a story or a comment.
+        """
+        from osnap.comments.models import Comment
+
+        if isinstance(target, Comment):
+            story = target.story
+            return {
+                'title': story.title,
+                'url': target.get_absolute_url(),
+                'excerpt': Truncator(target.text).chars(200),
+                'visible': story.published and target.published,
+            }
+        return {
+            'title': target.title,
+            'url': target.get_absolute_url(),
+            'excerpt': '',
+            'visible': target.published,
+        }
+
+    def _load_targets(self, keys):
+        """
+        Loads the stories and comments with `keys` (``(content_type_id,
+        object_id)`` pairs), with one query per model. Comments come with
+        their stories, so describing them doesn't cost another query.
+        """
+        from osnap.comments.models import Comment
+
+        ids_by_type = {}
+        for (ctype_id, object_id) in keys:
+            ids_by_type.setdefault(ctype_id, set()).add(object_id)
+
+        targets = {}
+        for (ctype_id, object_ids) in ids_by_type.items():
+            model = get_settings_for_content_type(ctype_id).model
+            queryset = model._default_manager.all()
+            if model is Comment:
+                queryset = queryset.select_related('story')
+            for (pk, target) in queryset.in_bulk(list(object_ids)).items():
+                targets[ctype_id, pk] = target
+        return targets
+
+    def for_target(self, target):
+        ctype = ContentType.objects.get_for_model(target)
+        return self.filter(content_type=ctype, object_id=target.pk)
+
+    def record(self, user, kind, target, created=None, direction=None):
+        """
+        Adds an activity row for `user` doing something to `target`.
+        """
+        fields = self.describe(target)
+        if created is not None:
+            fields['created'] = created
+        activity = self.create(user=user, kind=kind, target=target,
+                               direction=direction, **fields)
+        pagecache.invalidate('user:%s' % user.username)
+        return activity
+
+    def record_votes(self, votes):
+        """
+        Records `votes` on stories and comments, replacing the rows for
+        the same users' earlier votes on the same items. Ineffective votes,
+        and votes by users who don't show their votes (`public_votes`), are
+        left out.
+
+        However many votes there are, this costs one query for the users,
+        and a few for each kind of item.
+        """
+        latest = {}
+        for vote in votes:
+            latest[(vote.user_id,) + _vote_target(vote)] = vote
+        if not latest:
+            return
+
+        # Changed votes replace the old ones rather than piling up.
+        by_type = {}
+        for (user_id, ctype_id, object_id) in latest:
+            (user_ids, object_ids) = by_type.setdefault(ctype_id,
+                                                        (set(), set()))
+            user_ids.add(user_id)
+            object_ids.add(object_id)
+        replaced = []
+        for (ctype_id, (user_ids, object_ids)) in by_type.items():
+            rows = self.filter(kind=self.model.VOTE, content_type=ctype_id,
+                               object_id__in=object_ids, user__in=user_ids) \
+                       .values_list('pk', 'user', 'object_id')
+            replaced.extend(pk for (pk, user_id, object_id) in rows
+                            if (user_id, ctype_id, object_id) in latest)
+        if replaced:
+            self.filter(pk__in=replaced).delete()
+
+        public = dict(get_user_model().objects.filter(
+            pk__in=set(key[0] for key in latest), public_votes=True
+        ).values_list('pk', 'username'))
+        recorded = [(key, vote) for (key, vote) in latest.items()
+                    if vote.effective and key[0] in public]
+        targets = self._load_targets(key[1:] for (key, _) in recorded)
+
+        rows = []
+        for ((user_id, ctype_id, object_id), vote) in recorded:
+            target = targets.get((ctype_id, object_id))
+            if target is None:
+                continue
+            rows.append(self.model(user_id=user_id, kind=self.model.VOTE,
+                                   content_type_id=ctype_id,
+                                   object_id=object_id,
+                                   created=vote.vote_date,
+                                   direction=vote.direction,
+                                   **self.describe(target)))
+        self.bulk_create(rows)
+        pagecache.invalidate(*set('user:%s' % public[key[0]]
+                                  for (key, _) in recorded))
+
+    def forget_vote(self, vote):
+        (ctype_id, object_id) = _vote_target(vote)
+        self.filter(kind=self.model.VOTE, user=vote.user_id,
+                    content_type=ctype_id, object_id=object_id).delete()
+        _invalidate_profiles([vote.user_id])
+
+    def forget_target(self, target):
+        """
+        Removes the activity on a story or comment that's being deleted.
+        """
+        rows = self.for_target(target)
+        user_ids = list(rows.values_list('user', flat=True))
+        rows.delete()
+        _invalidate_profiles(user_ids)
+
+    def update_target(self, target):
+        """
+        Copies a story or comment's title, excerpt and visibility onto its
+        activity rows again, after it's edited. A story's changes are
+        copied to the rows for comments on it too.
+        """
+        from osnap.comments.models import Comment
+        from osnap.stories.models import Story
+
+        rows = self.for_target(target)
+        user_ids = set(rows.values_list('user', flat=True))
+        rows.update(**self.describe(target))
+
+        if isinstance(target, Story):
+            ctype = ContentType.objects.get_for_model(Comment)
+            comments = Comment.objects.filter(story=target)
+            rows = self.filter(content_type=ctype,
+                               object_id__in=comments.values('pk'))
+            user_ids.update(rows.values_list('user', flat=True))
+            rows.update(title=target.title)
+            rows.filter(object_id__in=comments.filter(published=True)
+                                              .values('pk')) \
+                .update(visible=target.published)
+
+        _invalidate_profiles(user_ids)
+
+    def timeline(self, user, after=None, count=None, votes=False):
+        """
+        Returns a page of `user`'s visible activity, newest first, as a
+        `KeysetPage` (with only a `next_cursor`). This is one range scan on
+        the ``(user, created, id)`` index.
+
+        :param after:   The `next_cursor` of the previous page, if any.
+        :param count:   How many rows to show. Defaults to the
+                        `OSNAP_ACTIVITY_PER_PAGE` setting, or 20.
+        :param votes:   Whether to include votes.
+        :raises ValueError: If `after` isn't a valid cursor.
+        """
+        if count is None:
+            count = getattr(settings, 'OSNAP_ACTIVITY_PER_PAGE', 20)
+
+        rows = self.filter(user=user, visible=True)
+        if not votes:
+            rows = rows.exclude(kind=self.model.VOTE)
+        if after:
+            created, pk = decode_cursor(after,
+                                        self.model._meta.get_field('created'))
+            rows = rows.filter(Q(created__lt=created) |
+                               Q(created=created, pk__lt=pk))
+
+        rows = list(rows.order_by('-created', '-id')[:count + 1])
+        next_cursor = None
+        if len(rows) > count:
+            rows = rows[:count]
+            next_cursor = encode_cursor(rows[-1].created, rows[-1].pk)
+        return KeysetPage(rows, next_cursor, None)
+
+    def backfill(self):
+        """
+        Rebuilds everyone's activity from their stories, comments and votes.
+        Run this once, after installing the app on a site with history.
+        (Cached profiles will catch up when they expire.)
+
+        :return: How many rows were recorded.
+        """
+        from osnap.comments.models import Comment
+        from osnap.stories.models import Story
+
+        self.all().delete()
+        count = 0
+        stories = Story.objects.exclude(submitter=None)
+        for story in stories.iterator():
+            self.create(user_id=story.submitter_id, kind=self.model.STORY,
+                        target=story, created=story.submit_date,
+                        **self.describe(story))
+            count += 1
+
+        comments = Comment.objects.exclude(author=None) \
+                          .select_related('story')
+        for comment in comments.iterator():
+            self.create(user_id=comment.author_id, kind=self.model.COMMENT,
+                        target=comment, created=comment.post_date,
+                        **self.describe(comment))
+            count += 1
+
+        for model in (Story, Comment):
+            votes = model.votes.vote_model.objects.for_model(model) \
+                         .filter(effective=True, user__public_votes=True)
+            for vote in votes.iterator():
+                if vote.item is None:
+                    continue
+                self.create(user_id=vote.user_id, kind=self.model.VOTE,
+                            target=vote.item, created=vote.vote_date,
+                            direction=vote.direction,
+                            **self.describe(vote.item))
+                count += 1
+        return count
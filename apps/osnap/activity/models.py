@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.activity.models
+=====================
+Each user's recent activity -- stories, comments and votes -- copied into
+one table as it happens, so a profile can list it with a single range scan
+instead of searching every table for the user's rows.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.contrib.contenttypes import generic
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.translation import ugettext_lazy as _
+
+from democracy.signals import post_bulk_vote, post_remove_vote, post_vote
+from osnap.comments.models import Comment
+from osnap.stories.models import Story
+
+from .managers import ActivityManager
+
+@python_2_unicode_compatible
+class Activity(models.Model):
+    """
+    Something a user did. Everything needed to list it is copied onto the
+    row when it's recorded, so listing a user's activity never touches the
+    stories or comments tables.
+    """
+    STORY = 'story'
+    COMMENT = 'comment'
+    VOTE = 'vote'
+    KINDS = (
+        (STORY, _("submitted a story")),
+        (COMMENT, _("commented")),
+        (VOTE, _("voted")),
+    )
+
+    objects = ActivityManager()
+
+    user        = models.ForeignKey(settings.AUTH_USER_MODEL,
+                    verbose_name=_("user"), related_name="activity")
+    kind        = models.CharField(_("kind"), max_length=10, choices=KINDS)
+    created     = models.DateTimeField(_("happened at"), default=timezone.now)
+
+    content_type = models.ForeignKey(ContentType)
+    object_id   = models.PositiveIntegerField()
+    target      = generic.GenericForeignKey('content_type', 'object_id')
+
+    title       = models.CharField(_("title"), max_length=127,
+                    help_text=_("The title of the story this was on."))
+    url         = models.CharField(_("URL"), max_length=200,
+                    help_text=_("Where to link to the story or comment."))
+    excerpt     = models.CharField(_("excerpt"), max_length=200, blank=True,
+                    help_text=_("The start of the comment, for comments."))
+    direction   = models.SmallIntegerField(_("direction"),
+                    blank=True, null=True,
+                    help_text=_("+1 or -1, for votes."))
+
+    visible     = models.BooleanField(_("visible"), default=True,
+                    help_text=_("Whether the story or comment is still "
+                                "published."))
+
+    class Meta:
+        verbose_name = _("activity")
+        verbose_name_plural = _("activity")
+
+        get_latest_by = "created"
+        ordering = ('-created', '-id')
+        index_together = [('user', 'created', 'id'),
+                          ('content_type', 'object_id')]
+
+    def __str__(self):
+        return "%s %s: %s" % (self.user_id, self.get_kind_display(),
+                              self.title)
+
+
+@receiver(post_save, sender=Story)
+def record_story(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created and instance.submitter_id:
+        Activity.objects.record(instance.submitter, Activity.STORY, instance,
+                                created=instance.submit_date)
+    elif not created:
+        Activity.objects.update_target(instance)
+
+
+@receiver(post_save, sender=Comment)
+def record_comment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created and instance.author_id:
+        Activity.objects.record(instance.author, Activity.COMMENT, instance,
+                                created=instance.post_date)
+    elif not created:
+        Activity.objects.update_target(instance)
+
+
+@receiver(post_delete, sender=Story)
+@receiver(post_delete, sender=Comment)
+def forget_target(sender, instance, **kwargs):
+    Activity.objects.forget_target(instance)
+
+
+@receiver(post_vote)
+def record_vote(sender, vote, **kwargs):
+    # The sender is the item being voted on.
+    if isinstance(sender, (Story, Comment)):
+        Activity.objects.record_votes([vote])
+
+
+@receiver(post_remove_vote)
+def forget_vote(sender, vote, **kwargs):
+    if isinstance(sender, (Story, Comment)):
+        Activity.objects.forget_vote(vote)
+
+
+@receiver(post_bulk_vote, sender=Story)
+@receiver(post_bulk_vote, sender=Comment)
+def record_bulk_votes(sender, votes, **kwargs):
+    Activity.objects.record_votes(votes)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.activity.tests.test_models
+================================
+These test recording and listing users' activity.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.test import TestCase
+
+from snaketest import SnakeTestMixin
+
+from osnap.comments.models import Comment
+from osnap.people.models import User
+from osnap.stories.models import Story
+from ..models import Activity
+
+class ActivityTests(TestCase, SnakeTestMixin):
+    def setUp(self):
+        self.user = User.objects.create(username='busy',
+                                        email='busy@example.com')
+        self.story = Story.objects.create(title="Mine", text="Hi",
+                                          submitter=self.user)
+
+    def kinds(self, **kwargs):
+        page = Activity.objects.timeline(self.user, **kwargs)
+        return [(entry.kind, entry.title) for entry in page]
+
+    def test_records_activity(self):
+        self.user.public_votes = True
+        self.user.save()
+        Comment.objects.create(story=self.story, author=self.user,
+                               text="First")
+        self.story.votes.add_vote(self.user, +1)
+
+        with self.assert_num_queries(1):
+            self.assert_equal(self.kinds(votes=True), [
+                ('vote', "Mine"), ('comment', "Mine"), ('story', "Mine")
+            ])
+        self.assert_equal(self.kinds(), [('comment', "Mine"),
+                                         ('story', "Mine")])
+
+        # Changing a vote replaces it, and removing it removes it.
+        self.story.votes.add_vote(self.user, -1)
+        vote = Activity.objects.get(kind=Activity.VOTE)
+        self.assert_equal(vote.direction, -1)
+        self.story.votes.remove_vote(self.user)
+        self.assert_false(Activity.objects.filter(kind=Activity.VOTE)
+                                          .exists())
+
+    def test_private_votes_not_recorded(self):
+        self.story.votes.add_vote(self.user, +1)
+        self.assert_false(Activity.objects.filter(kind=Activity.VOTE)
+                                          .exists())
+
+    def test_record_votes_in_bulk(self):
+        self.user.public_votes = True
+        self.user.save()
+        other = User.objects.create(username='other', public_votes=True,
+                                    email='other@example.com')
+        comments = [Comment.objects.create(story=self.story, text="Hi")
+                    for i in range(3)]
+        Vote = Comment.votes.vote_model
+        votes = [Vote(item=comment, user=user, direction=+1, effective=True)
+                 for comment in comments for user in (self.user, other)]
+        votes.append(Vote(item=self.story, user=other, direction=-1,
+                          effective=True))
+
+        # One for the users, two for each kind of item (finding rows to
+        # replace, and loading the items), and one insert.
+        with self.assert_num_queries(6):
+            Activity.objects.record_votes(votes)
+        self.assert_equal(Activity.objects.filter(kind=Activity.VOTE)
+                                          .count(), 7)
+
+        votes[0].direction = -1
+        Activity.objects.record_votes(votes[:1])
+        self.assert_equal(
+            Activity.objects.get(kind=Activity.VOTE, user=self.user,
+                                 object_id=comments[0].pk).direction, -1
+        )
+        self.assert_equal(Activity.objects.filter(kind=Activity.VOTE)
+                                          .count(), 7)
+
+    def test_edits_are_copied(self):
+        Comment.objects.create(story=self.story, author=self.user,
+                               text="First")
+        self.story.title = "Renamed"
+        self.story.published = False
+        self.story.save()
+        self.assert_equal(self.kinds(), [])
+        self.assert_equal(set(Activity.objects.values_list('title',
+                                                           flat=True)),
+                          set(["Renamed"]))
+
+        self.story.delete()
+        self.assert_false(Activity.objects.exists())
+
+    def test_pagination(self):
+        for i in range(4):
+            Story.objects.create(title="Story %d" % i, text="Hi",
+                                 submitter=self.user)
+        page = Activity.objects.timeline(self.user, count=3)
+        self.assert_equal([e.title for e in page],
+                          ["Story 3", "Story 2", "Story 1"])
+
+        page = Activity.objects.timeline(self.user, count=3,
+                                         after=page.next_cursor)
+        self.assert_equal([e.title for e in page], ["Story 0", "Mine"])
+        self.assert_false(page.has_next())
+
+    def test_profile(self):
+        self.story.votes.add_vote(self.user, +1)
+        response = self.client.get('/~busy/')
+        self.assertContains(response, "Submitted")
+        self.assertNotContains(response, "Voted up")
+
+        self.user.public_votes = True
+        self.user.save()
+        self.story.votes.remove_vote(self.user)
+        self.story.votes.add_vote(self.user, +1)
+        self.assertContains(self.client.get('/~busy/'), "Voted up")
+        self.assert_equal(self.client.get('/~busy/?after=junk')
+                              .status_code, 404)
+
+    def test_backfill(self):
+        Comment.objects.create(story=self.story, author=self.user,
+                               text="First")
+        Activity.objects.all().delete()
+        self.assert_equal(Activity.objects.backfill(), 2)
+        self.assert_equal(self.kinds(), [('comment', "Mine"),
+                                         ('story', "Mine")])
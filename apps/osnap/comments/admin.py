@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.admin
+====================
+Configuration for the Django admin interface.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.contrib import admin
+
+from .models import Comment
+
+class CommentAdmin(admin.ModelAdmin):
+    date_hierarchy = 'post_date'
+    list_display = ('post_date', '__str__', 'story', 'author', 'published')
+    list_filter = ('published',)
+    raw_id_fields = ('story', 'parent', 'author')
+
+
+admin.site.register(Comment, CommentAdmin)
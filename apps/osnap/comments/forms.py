@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.forms
+====================
+Forms for posting comments.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django import forms
+from django.utils.translation import ugettext_lazy as _
+
+from .models import Comment
+
+class CommentForm(forms.ModelForm):
+    """
+    Posts a comment on a story, or a reply to the comment in `parent`.
+    The view fills in the story and author.
+    """
+    parent = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    class Meta:
+        model = Comment
+        fields = ['text']
+
+    def __init__(self, *args, **kwargs):
+        self.story = kwargs.pop('story')
+        super(CommentForm, self).__init__(*args, **kwargs)
+
+    def clean_parent(self):
+        parent_id = self.cleaned_data.get('parent')
+        if not parent_id:
+            return None
+        try:
+            return Comment.objects.get(pk=parent_id, story=self.story)
+        except Comment.DoesNotExist:
+            raise forms.ValidationError(
+                _("That comment doesn't exist."), code='invalid_parent'
+            )
+
+    def clean(self):
+        # The model's own validation (which checks the depth) runs after
+        # this, so it needs to know where the comment goes.
+        cleaned_data = super(CommentForm, self).clean()
+        self.instance.story = self.story
+        self.instance.parent = cleaned_data.get('parent')
+        return cleaned_data
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.fragments
+========================
+Caches the rendered HTML of each comment *along with its replies*, so a
+big thread is mostly served from a handful of cached subtrees.
+
+Like story fragments, each comment has a version in the cache that's part
+of its fragments' keys. A reply or a vote changes what its comment's
+subtree looks like, and what every ancestor's subtree looks like, so it
+bumps all of their versions -- which are easy to find, since they're all
+in the comment's path. Everything beside that branch stays cached.
+Versions are only bumped once the change is committed, and they have to be
+read before the comments are loaded (`CommentManager.thread_page` does
+this), so old rows are never cached under a new version.
+
+Cached fragments are the same for everyone: anything about the viewer
+(their votes, reply forms) has to go outside them.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from osnap.transactions import on_commit
+from .tree import SEGMENT_LENGTH
+
+#: The template that's rendered and cached for each comment.
+FRAGMENT_TEMPLATE = "osnap/comments/comment.html"
+
+VERSION_KEY = "osnap:comment:%s:version"
+FRAGMENT_KEY = "osnap:comment:%s:v%s:d%s:subtree"
+STATS_KEY = "osnap:comments:story:%s:%s"
+
+
+def _new_version():
+    # See osnap.stories.fragments._new_version.
+    return int(time.time() * 1000)
+
+
+def ancestor_ids(path):
+    """
+    Returns the IDs of the comment with `path` and all its ancestors.
+    """
+    return [int(path[i:i + SEGMENT_LENGTH], 36)
+            for i in range(0, len(path), SEGMENT_LENGTH)]
+
+
+def bump_comment_versions(paths):
+    """
+    Invalidates the cached subtrees of the comments with `paths`, and
+    their ancestors, once the current transaction commits.
+    """
+    ids = set()
+    for path in paths:
+        ids.update(ancestor_ids(path))
+    on_commit(lambda: _bump(ids))
+
+
+def _bump(ids):
+    for pk in ids:
+        key = VERSION_KEY % pk
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def get_comment_versions(comment_ids):
+    """
+    Returns a dict mapping each comment ID to its current version, with one
+    cache lookup.
+    """
+    keys = dict((VERSION_KEY % pk, pk) for pk in comment_ids)
+    found = cache.get_many(list(keys))
+    versions = dict((keys[key], version) for (key, version) in found.items())
+
+    for (key, pk) in keys.items():
+        if pk not in versions:
+            version = _new_version()
+            # If another process just set one, use theirs.
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[pk] = version
+    return versions
+
+
+def _record_stats(story_id, hits, misses):
+    for (name, count) in (('hits', hits), ('misses', misses)):
+        if not count:
+            continue
+        key = STATS_KEY % (story_id, name)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            if not cache.add(key, count, None):
+                cache.incr(key, count)
+
+
+def get_thread_stats(story_id):
+    """
+    Returns how many comment subtrees on a story's pages have been served
+    from the cache, and how many had to be rendered, as a ``(hits,
+    misses)`` tuple. These are counted since the cache last forgot them.
+    """
+    found = cache.get_many([STATS_KEY % (story_id, 'hits'),
+                            STATS_KEY % (story_id, 'misses')])
+    return (found.get(STATS_KEY % (story_id, 'hits'), 0),
+            found.get(STATS_KEY % (story_id, 'misses'), 0))
+
+
+def render_thread(comments, max_depth, versions):
+    """
+    Returns the HTML for `comments` (top-level comments, with `children`
+    filled in by `osnap.comments.tree.build_tree`) and their replies, using
+    cached subtrees wherever possible.
+
+    The cache is checked one level at a time, and only below comments that
+    weren't found, so a thread costs one cache lookup per level that has
+    changed, and one to store what was rendered.
+
+    :param comments:    The comments to render.
+    :param max_depth:   The depth of the deepest replies that were loaded.
+                        It's part of the cache keys, since it decides
+                        where the "continue this thread" links go.
+    :param versions:    The comments' versions, from `get_comment_versions`,
+                        read *before* the comments were loaded. Comments
+                        that aren't in it (because they were posted in
+                        between) are rendered, but not cached.
+    """
+    comments = list(comments)
+    if not comments:
+        return mark_safe('')
+
+    def key_for(comment):
+        if comment.pk not in versions:
+            return None
+        return FRAGMENT_KEY % (comment.pk, versions[comment.pk], max_depth)
+
+    html = {}
+    hits = 0
+    misses = []
+    level = comments
+    while level:
+        keys = [key_for(c) for c in level]
+        found = cache.get_many([key for key in keys if key is not None])
+        next_level = []
+        for (comment, key) in zip(level, keys):
+            cached = found.get(key)
+            if cached is None:
+                misses.append(comment)
+                next_level.extend(comment.children)
+            else:
+                html[comment.pk] = cached
+                hits += 1
+        level = next_level
+
+    # Every comment comes after its parent in misses, so going backwards
+    # renders replies before the comments they're nested in.
+    rendered = {}
+    for comment in reversed(misses):
+        replies = ''.join(html[child.pk] for child in comment.children)
+        html[comment.pk] = render_to_string(
+            FRAGMENT_TEMPLATE, {'comment': comment,
+                                'replies': mark_safe(replies)}
+        )
+        if key_for(comment) is not None:
+            rendered[key_for(comment)] = html[comment.pk]
+
+    if rendered:
+        timeout = getattr(settings, 'OSNAP_FRAGMENT_CACHE_TIMEOUT',
+                          60 * 60 * 24)
+        cache.set_many(rendered, timeout)
+    _record_stats(comments[0].story_id, hits, len(misses))
+    return mark_safe(''.join(html[c.pk] for c in comments))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.management.commands.comment_cache_stats
+======================================================
+Reports how well the comment subtree cache is doing on each thread.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import division, unicode_literals
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...fragments import get_thread_stats
+from ...models import Comment
+
+
+class Command(BaseCommand):
+    args = "[story_id ...]"
+    help = ("Shows the subtree cache hits and misses for the given stories' "
+            "comment threads, or for the most recently commented stories.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--limit', type='int', dest='limit', default=20,
+            help="How many recently commented stories to show, if no "
+                 "stories are given."),
+    )
+
+    def handle(self, *story_ids, **options):
+        try:
+            story_ids = [int(story_id) for story_id in story_ids]
+        except ValueError:
+            raise CommandError("Story IDs must be numbers.")
+
+        if not story_ids:
+            recent = Comment.objects.order_by('-post_date') \
+                            .values_list('story', flat=True)
+            for story_id in recent.iterator():
+                if story_id not in story_ids:
+                    story_ids.append(story_id)
+                    if len(story_ids) >= options['limit']:
+                        break
+
+        for story_id in story_ids:
+            hits, misses = get_thread_stats(story_id)
+            total = hits + misses
+            self.stdout.write("Story %d: %d hits, %d misses (%s)" % (
+                story_id, hits, misses,
+                "%.1f%% hit rate" % (hits / total * 100) if total
+                else "not rendered"
+            ))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.managers
+=======================
+Managers for loading comment threads.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+
+from democracy.managers import VotableManager, VotableQuerySet
+
+from .fragments import get_comment_versions
+from .tree import build_tree, subtree_range
+
+class ThreadPage(object):
+    """
+    A page of top-level comments and their replies, from
+    `CommentManager.thread_page`.
+
+    :param comments:    The comments, sorted by path.
+    :param next_after:  The `after` value for the next page, or `None` if
+                        this is the last page.
+    :param max_depth:   The depth of the deepest replies that were loaded.
+    :param versions:    The comments' fragment versions, read before the
+                        comments were loaded.
+    """
+    def __init__(self, comments, next_after, max_depth, versions=None):
+        comments = list(comments)
+        #: The top-level comments, with their `children` filled in.
+        self.comments = build_tree(comments)
+        self.next_after = next_after
+        self.max_depth = max_depth
+        self.versions = versions or {}
+
+        #: The viewer's votes, by comment ID, if the comments were loaded
+        #: with their `user_vote`\s. These are kept out of the comments'
+        #: cached HTML, since it's the same for everyone.
+        self.user_votes = dict((c.pk, c.user_vote.direction)
+                               for c in comments
+                               if getattr(c, 'user_vote', None))
+
+    @property
+    def upvoted(self):
+        return sorted(pk for (pk, d) in self.user_votes.items() if d > 0)
+
+    @property
+    def downvoted(self):
+        return sorted(pk for (pk, d) in self.user_votes.items() if d < 0)
+
+    def __iter__(self):
+        return iter(self.comments)
+
+    def __len__(self):
+        return len(self.comments)
+
+    def has_next(self):
+        return self.next_after is not None
+
+
+class CommentQuerySet(VotableQuerySet):
+    def in_thread_order(self):
+        return self.select_related('author').order_by('path')
+
+    def for_story(self, story):
+        """
+        Returns every comment on `story`, in thread order.
+        """
+        return self.filter(story=story).in_thread_order()
+
+    def subtree(self, comment, depth=None):
+        """
+        Returns `comment` and all its replies, in thread order.
+
+        :param depth:   If given, only replies up to this many levels below
+                        `comment` are included.
+        """
+        qs = self.filter(story__pk=comment.story_id,
+                         path__range=subtree_range(comment.path))
+        if depth is not None:
+            qs = qs.filter(depth__lte=comment.depth + depth)
+        return qs.in_thread_order()
+
+
+class CommentManager(VotableManager):
+    def get_queryset(self):
+        return CommentQuerySet(self.model, using=self._db)
+
+    def for_story(self, story):
+        return self.get_queryset().for_story(story)
+
+    def subtree(self, comment, depth=None):
+        return self.get_queryset().subtree(comment, depth)
+
+    def thread_page(self, story, after=None, threads=None, depth=None,
+                    user=None):
+        """
+        Loads a page of `story`'s top-level comments and their replies, as a
+        tree, in three queries (one for the page's top-level comments, one
+        for the IDs of everything under them, and one for the comments
+        themselves). Huge threads are broken up this way, and replies too
+        deep to show can be left for `subtree` to load.
+
+        The comments' fragment versions are read from the cache between the
+        last two queries: a version read after the comments could already
+        be bumped for a change the comments don't have.
+
+        :param after:   The path of the last top-level comment on the
+                        previous page, or `None` for the first page.
+        :param threads: How many top-level comments to show. Defaults to the
+                        `OSNAP_COMMENT_THREADS_PER_PAGE` setting, or 50.
+        :param depth:   How many levels of replies to load. Defaults to the
+                        `OSNAP_COMMENT_DEPTH` setting, or 8.
+        :param user:    If given, each comment's `user_vote` is set to this
+                        user's vote on it (at the cost of one more query).
+        :return:        A `ThreadPage`.
+        """
+        if threads is None:
+            threads = getattr(settings, 'OSNAP_COMMENT_THREADS_PER_PAGE', 50)
+        if depth is None:
+            depth = getattr(settings, 'OSNAP_COMMENT_DEPTH', 8)
+
+        roots = self.filter(story=story, depth=0)
+        if after:
+            roots = roots.filter(path__gt=after)
+        paths = list(roots.order_by('path')
+                          .values_list('path', flat=True)[:threads + 1])
+        if not paths:
+            return ThreadPage([], None, depth)
+
+        next_after = paths[threads - 1] if len(paths) > threads else None
+        paths = paths[:threads]
+
+        comments = self.filter(story=story,
+                               path__range=subtree_range(paths[0], paths[-1]),
+                               depth__lte=depth)
+        versions = get_comment_versions(comments.values_list('pk', flat=True))
+        comments = comments.in_thread_order()
+        if user is not None:
+            comments = comments.with_user_votes(user)
+        return ThreadPage(comments, next_after, depth, versions)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'Comment'
+        db.create_table(u'comments_comment', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('story', self.gf('django.db.models.fields.related.ForeignKey')(related_name=u'comments', to=orm['stories.Story'])),
+            ('parent', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name=u'replies', null=True, to=orm['comments.Comment'])),
+            ('author', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['people.User'], null=True, on_delete=models.SET_NULL, blank=True)),
+            ('text', self.gf('django.db.models.fields.TextField')()),
+            ('text_html', self.gf('django.db.models.fields.TextField')(blank=True)),
+            ('post_date', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+            ('published', self.gf('django.db.models.fields.BooleanField')(default=True)),
+            ('path', self.gf('django.db.models.fields.CharField')(max_length=255, blank=True)),
+            ('depth', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('reply_count', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('upvotes', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('downvotes', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('score', self.gf('django.db.models.fields.IntegerField')(default=0)),
+        ))
+        db.send_create_signal(u'comments', ['Comment'])
+
+        # Adding index on 'Comment', fields ['story', 'path']
+        db.create_index(u'comments_comment', ['story_id', 'path'])
+
+        # Adding index on 'Comment', fields ['story', 'depth', 'path']
+        db.create_index(u'comments_comment', ['story_id', 'depth', 'path'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'Comment', fields ['story', 'depth', 'path']
+        db.delete_index(u'comments_comment', ['story_id', 'depth', 'path'])
+
+        # Removing index on 'Comment', fields ['story', 'path']
+        db.delete_index(u'comments_comment', ['story_id', 'path'])
+
+        # Deleting model 'Comment'
+        db.delete_table(u'comments_comment')
+
+
+    models = {
+        u'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        u'auth.permission': {
+            'Meta': {'ordering': "(u'content_type__app_label', u'content_type__model', u'codename')", 'unique_together': "((u'content_type', u'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        u'comments.comment': {
+            'Meta': {'ordering': "(u'path',)", 'object_name': 'Comment', 'index_together': "[(u'story', u'path'), (u'story', u'depth', u'path')]"},
+            'author': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['people.User']", 'null': 'True', 'on_delete': 'models.SET_NULL', 'blank': 'True'}),
+            'depth': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'downvotes': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'parent': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "u'replies'", 'null': 'True', 'to': u"orm['comments.Comment']"}),
+            'path': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'post_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'published': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'reply_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'score': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'story': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "u'comments'", 'to': u"orm['stories.Story']"}),
+            'text': ('django.db.models.fields.TextField', [], {}),
+            'text_html': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'upvotes': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'people.user': {
+            'Meta': {'object_name': 'User'},
+            'biography': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'biography_html': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'unique': 'True', 'max_length': '75'}),
+            'full_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'gravatar_email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'related_name': "u'user_set'", 'blank': 'True', 'to': u"orm['auth.Group']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'related_name': "u'user_set'", 'blank': 'True', 'to': u"orm['auth.Permission']"}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        u'stories.story': {
+            'Meta': {'ordering': "(u'-submit_date',)", 'object_name': 'Story', 'index_together': "[(u'rank', u'id'), (u'submit_date', u'id'), (u'domain', u'submit_date', u'id'), (u'url_hash', u'submit_date')]"},
+            'canonical_url': ('django.db.models.fields.CharField', [], {'max_length': '200', 'blank': 'True'}),
+            'confidence': ('django.db.models.fields.FloatField', [], {'default': '0'}),
+            'domain': ('django.db.models.fields.CharField', [], {'max_length': '200', 'blank': 'True'}),
+            'downvotes': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'published': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'rank': ('django.db.models.fields.FloatField', [], {'default': '0'}),
+            'submit_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'submitter': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['people.User']", 'null': 'True', 'on_delete': 'models.SET_NULL', 'blank': 'True'}),
+            'text': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'text_html': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '127'}),
+            'upvotes': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'url': ('django.db.models.fields.URLField', [], {'max_length': '200', 'blank': 'True'}),
+            'url_hash': ('django.db.models.fields.CharField', [], {'max_length': '40', 'blank': 'True'})
+        }
+    }
+
+    complete_apps = ['comments']
\ No newline at end of file
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.models
+=====================
+Comments on stories, which are threaded and can be voted on.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.text import Truncator
+from django.utils.translation import ugettext_lazy as _
+
+from democracy.signals import post_bulk_vote, post_remove_vote, post_vote
+from democracy.voting import Votable
+from osnap import pagecache
+from osnap.markup import update_rendered_field
+from osnap.stories.models import Story, story_changed
+
+from .fragments import bump_comment_versions
+from .managers import CommentManager
+from .tree import PATH_LENGTH, SEGMENT_LENGTH, path_segment
+
+
+def max_depth():
+    """
+    Returns the deepest a reply can be, from `OSNAP_COMMENT_MAX_DEPTH`.
+    """
+    deepest = PATH_LENGTH // SEGMENT_LENGTH - 1
+    return min(getattr(settings, 'OSNAP_COMMENT_MAX_DEPTH', 40), deepest)
+
+
+@python_2_unicode_compatible
+class Comment(models.Model):
+    """
+    A comment on a story, or a reply to another comment.
+
+    Every comment stores its *path* -- its ancestors' IDs and its own,
+    one after another -- so a story's whole thread comes out of one query
+    ordered by path, and `osnap.comments.tree.build_tree` can put it
+    together in a single pass.
+    """
+    objects = CommentManager()
+
+    story       = models.ForeignKey(Story, verbose_name=_("story"),
+                    related_name="comments")
+    parent      = models.ForeignKey('self', verbose_name=_("parent"),
+                    blank=True, null=True, related_name="replies",
+                    help_text=_("The comment this replies to, if any."))
+
+    author      = models.ForeignKey(settings.AUTH_USER_MODEL,
+                    verbose_name=_("author"),
+                    blank=True, null=True, on_delete=models.SET_NULL)
+
+    text        = models.TextField(_("text"),
+                    help_text=_("The comment, in Markdown."))
+    text_html   = models.TextField(_("text (HTML)"), blank=True,
+                    editable=False,
+                    help_text=_("The text, rendered from Markdown."))
+
+    post_date   = models.DateTimeField(_("posted at"), default=timezone.now)
+
+    published   = models.BooleanField(_("published"), default=True,
+                    help_text=_("Uncheck, and the comment's text is hidden. "
+                                "Its replies are still shown."))
+
+    path        = models.CharField(_("path"), max_length=PATH_LENGTH,
+                    blank=True, editable=False,
+                    help_text=_("The IDs of the comment's ancestors and "
+                                "itself, for loading threads in order."))
+    depth       = models.PositiveIntegerField(_("depth"), default=0,
+                    editable=False,
+                    help_text=_("How many comments up the top of the "
+                                "thread is."))
+    reply_count = models.PositiveIntegerField(_("reply count"), default=0,
+                    editable=False,
+                    help_text=_("How many direct replies the comment has."))
+
+    upvotes     = models.PositiveIntegerField(_("upvotes"), default=0,
+                    editable=False)
+    downvotes   = models.PositiveIntegerField(_("downvotes"), default=0,
+                    editable=False)
+    score       = models.IntegerField(_("score"), default=0, editable=False)
+
+    votes       = Votable(scores=('score',),
+                          counters=('upvotes', 'downvotes'))
+
+    class Meta:
+        verbose_name = _("comment")
+        verbose_name_plural = _("comments")
+
+        get_latest_by = "post_date"
+        ordering = ('path',)
+        index_together = [('story', 'path'), ('story', 'depth', 'path')]
+
+    def __str__(self):
+        return Truncator(self.text).words(8)
+
+    def compute_score(self, upvotes, downvotes):
+        return upvotes - downvotes
+
+    def clean(self):
+        if self.parent_id is not None:
+            if self.parent.story_id != self.story_id:
+                raise ValidationError(
+                    _("A reply must be on the same story as its parent."),
+                    code='wrong_story'
+                )
+            if self.parent.depth >= max_depth():
+                raise ValidationError(
+                    _("This thread is too deep to reply to."),
+                    code='too_deep'
+                )
+
+    def _edited_fields(self):
+        # The vote counters and scores, the reply count, and the comment's
+        # place in the thread are all kept up to date by UPDATE queries, so
+        # saving an edit shouldn't write the (possibly stale) values it has
+        # in memory over them.
+        kept = Comment.votes.counters + Comment.votes.scores + \
+               ('reply_count', 'path', 'depth')
+        return [f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in kept]
+
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = update_rendered_field(
+            self, 'text', kwargs.get('update_fields')
+        )
+        if self.pk is not None:
+            if (kwargs['update_fields'] is None and
+                    Comment.objects.filter(pk=self.pk).exists()):
+                kwargs['update_fields'] = self._edited_fields()
+            super(Comment, self).save(*args, **kwargs)
+            return
+
+        # The path needs the ID, which we don't have until it's inserted.
+        parent_path = self.parent.path if self.parent_id else ''
+        self.depth = self.parent.depth + 1 if self.parent_id else 0
+        with transaction.atomic():
+            super(Comment, self).save(*args, **kwargs)
+            self.path = parent_path + path_segment(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+            if self.parent_id:
+                Comment.objects.filter(pk=self.parent_id) \
+                       .update(reply_count=F('reply_count') + 1)
+
+    def get_absolute_url(self):
+        from django.core.urlresolvers import reverse
+        return reverse('osnap_comment_thread',
+                       kwargs={'id': self.story_id, 'comment_id': self.pk})
+
+
+@receiver(post_delete, sender=Comment)
+def remove_reply(sender, instance, **kwargs):
+    if instance.parent_id:
+        Comment.objects.filter(pk=instance.parent_id,
+                               reply_count__gt=0) \
+               .update(reply_count=F('reply_count') - 1)
+
+
+def comments_changed(story_id, paths):
+    """
+    Invalidates the cached subtrees of the comments with `paths` (and their
+    ancestors), and the story's page.
+    """
+    bump_comment_versions(paths)
+    story_changed(story_id)
+
+
+def comment_votes_changed(story_id, paths):
+    """
+    Like `comments_changed`, but for votes, which only change the comments'
+    scores. The story's own fragment and the story lists don't show those,
+    so only the story's page is invalidated.
+    """
+    bump_comment_versions(paths)
+    pagecache.invalidate('story:%s' % story_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_saved_comment(sender, instance, **kwargs):
+    # A new comment doesn't have its path yet, but it's only cached inside
+    # its parent's subtree anyway.
+    path = instance.path
+    if not path and instance.parent_id:
+        path = instance.parent.path
+    comments_changed(instance.story_id, [path] if path else [])
+
+
+@receiver(post_vote)
+@receiver(post_remove_vote)
+def invalidate_voted_comment(sender, vote, **kwargs):
+    # The sender is the item being voted on.
+    if isinstance(sender, Comment):
+        comment_votes_changed(sender.story_id, [sender.path])
+
+
+@receiver(post_bulk_vote, sender=Comment)
+def invalidate_bulk_voted_comments(sender, votes, **kwargs):
+    comment_ids = set(vote.object_id for vote in votes)
+    paths = {}
+    rows = Comment.objects.filter(pk__in=comment_ids) \
+                  .values_list('story', 'path')
+    for (story_id, path) in rows:
+        paths.setdefault(story_id, []).append(path)
+    for (story_id, story_paths) in paths.items():
+        comment_votes_changed(story_id, story_paths)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.templatetags.comment_tags
+========================================
+Template tags for displaying comments.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django import template
+
+from ..fragments import render_thread as _render_thread
+
+register = template.Library()
+
+
+@register.simple_tag
+def render_thread(thread):
+    """
+    Renders the comments in a `ThreadPage`, mostly from the cache. Use it
+    like::
+
+        <ol class="comment-list">{% render_thread thread %}</ol>
+    """
+    return _render_thread(thread.comments, thread.max_depth, thread.versions)
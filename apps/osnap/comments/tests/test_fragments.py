@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.tests.test_fragments
+===================================
+These test the cached comment subtrees.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from snaketest import SnakeTestMixin
+
+from osnap.people.models import User
+from osnap.stories.models import Story
+from ..fragments import (FRAGMENT_KEY, ancestor_ids, get_comment_versions,
+                         get_thread_stats, render_thread)
+from ..models import Comment
+
+class CommentFragmentTests(TransactionTestCase, SnakeTestMixin):
+    # Versions are bumped when transactions commit, and TestCase never
+    # commits.
+    def setUp(self):
+        cache.clear()
+        self.voter = User.objects.create(username='voter',
+                                         email='voter@example.com')
+        self.story = Story.objects.create(title="Discuss", text="Hi")
+        self.first = self.comment("First")
+        self.reply = self.comment("Reply", self.first)
+        self.second = self.comment("Second")
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(story=self.story, parent=parent,
+                                      text=text)
+
+    def render(self):
+        page = Comment.objects.thread_page(self.story)
+        return render_thread(page.comments, page.max_depth, page.versions)
+
+    def versions(self):
+        return get_comment_versions([self.first.pk, self.reply.pk,
+                                     self.second.pk])
+
+    def test_ancestor_ids(self):
+        self.assert_equal(ancestor_ids(self.reply.path),
+                          [self.first.pk, self.reply.pk])
+
+    def test_subtrees_are_cached(self):
+        html = self.render()
+        self.assert_in("Reply", html)
+        self.assert_equal(get_thread_stats(self.story.pk), (0, 3))
+
+        key = FRAGMENT_KEY % (self.second.pk, self.versions()[self.second.pk],
+                              8)
+        cache.set(key, "<li>From the cache</li>")
+        self.assert_in("From the cache", self.render())
+        # Both top-level subtrees were found, so nothing below was checked.
+        self.assert_equal(get_thread_stats(self.story.pk), (2, 3))
+
+    def test_unversioned_comments_not_cached(self):
+        page = Comment.objects.thread_page(self.story)
+        del page.versions[self.reply.pk]
+        self.assert_in("Reply", render_thread(page.comments, page.max_depth,
+                                              page.versions))
+        self.assert_equal(get_thread_stats(self.story.pk), (0, 3))
+
+        key = FRAGMENT_KEY % (self.reply.pk, self.versions()[self.reply.pk],
+                              8)
+        self.assert_none(cache.get(key))
+
+    def test_votes_invalidate_branch(self):
+        self.render()
+        before = self.versions()
+        self.reply.votes.add_vote(self.voter, +1)
+        after = self.versions()
+
+        self.assert_not_equal(after[self.reply.pk], before[self.reply.pk])
+        self.assert_not_equal(after[self.first.pk], before[self.first.pk])
+        self.assert_equal(after[self.second.pk], before[self.second.pk])
+
+        self.assert_in("1 point", self.render())
+        # The second thread and nothing else was still cached.
+        self.assert_equal(get_thread_stats(self.story.pk), (1, 5))
+
+    def test_replies_invalidate_parents(self):
+        self.render()
+        self.comment("Nested", self.reply)
+        self.assert_in("Nested", self.render())
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.tests.test_models
+================================
+These test storing and loading comment threads.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.core.exceptions import ValidationError
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+
+from snaketest import SnakeTestMixin
+
+from osnap.pagecache import get_tag_version
+from osnap.people.models import User
+from osnap.stories.fragments import get_story_versions
+from osnap.stories.models import Story
+from ..fragments import get_comment_versions
+from ..models import Comment
+
+class CommentThreadTests(TransactionTestCase, SnakeTestMixin):
+    # Caches are invalidated when transactions commit, and TestCase never
+    # commits.
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com',
+                                               'pass')
+        self.story = Story.objects.create(title="Discuss", text="Hi")
+
+    def comment(self, parent=None, text="Hello"):
+        return Comment.objects.create(story=self.story, parent=parent,
+                                      author=self.author, text=text)
+
+    def test_paths(self):
+        top = self.comment(text="*Top*")
+        reply = self.comment(top)
+        self.assert_equal(reply.path[:len(top.path)], top.path)
+        self.assert_equal(reply.depth, 1)
+        self.assert_equal(Comment.objects.get(pk=top.pk).reply_count, 1)
+        self.assert_equal(top.text_html, "<p><em>Top</em></p>")
+
+        reply.delete()
+        self.assert_equal(Comment.objects.get(pk=top.pk).reply_count, 0)
+
+    def test_save_keeps_counts(self):
+        top = self.comment()
+        stale = Comment.objects.get(pk=top.pk)
+        self.comment(top)
+        top.votes.add_vote(self.author, +1)
+
+        stale.text = "Edited"
+        stale.save()
+        self.assert_fields_equal(Comment.objects.get(pk=top.pk),
+                                 text_html="<p>Edited</p>", upvotes=1,
+                                 score=1, reply_count=1, path=top.path)
+
+    def test_thread_in_order(self):
+        first = self.comment()
+        second = self.comment()
+        reply = self.comment(first)
+        nested = self.comment(reply)
+
+        with self.assert_num_queries(1):
+            comments = list(Comment.objects.for_story(self.story))
+        self.assert_equal(comments, [first, reply, nested, second])
+
+        self.assert_equal(list(Comment.objects.subtree(first)),
+                          [first, reply, nested])
+        self.assert_equal(list(Comment.objects.subtree(first, 1)),
+                          [first, reply])
+
+    def test_thread_pages(self):
+        roots = [self.comment() for i in range(3)]
+        replies = [self.comment(root) for root in roots]
+
+        with self.assert_num_queries(3):
+            page = Comment.objects.thread_page(self.story, threads=2)
+            self.assert_equal(list(page), roots[:2])
+            self.assert_equal(page.comments[1].children, [replies[1]])
+        self.assert_true(page.has_next())
+
+        page = Comment.objects.thread_page(self.story, threads=2,
+                                           after=page.next_after)
+        self.assert_equal(list(page), roots[2:])
+        self.assert_false(page.has_next())
+
+        page = Comment.objects.thread_page(self.story, depth=0)
+        self.assert_equal(page.comments[0].children, [])
+
+    @override_settings(OSNAP_COMMENT_MAX_DEPTH=1)
+    def test_max_depth(self):
+        reply = self.comment(self.comment())
+        too_deep = Comment(story=self.story, parent=reply, text="Hi")
+        with self.assert_raises(ValidationError):
+            too_deep.full_clean()
+
+    def test_changes_invalidate_story(self):
+        version = get_story_versions([self.story.pk])[self.story.pk]
+        self.comment()
+        self.assert_not_equal(
+            get_story_versions([self.story.pk])[self.story.pk], version
+        )
+
+    def test_votes_only_invalidate_thread(self):
+        comment = self.comment()
+        story_version = get_story_versions([self.story.pk])[self.story.pk]
+        comment_version = get_comment_versions([comment.pk])[comment.pk]
+        list_version = get_tag_version('stories')
+        page_version = get_tag_version('story:%s' % self.story.pk)
+
+        comment.votes.add_vote(self.author, +1)
+        self.assert_equal(Comment.objects.get(pk=comment.pk).score, 1)
+        self.assert_not_equal(get_comment_versions([comment.pk])[comment.pk],
+                              comment_version)
+        self.assert_not_equal(get_tag_version('story:%s' % self.story.pk),
+                              page_version)
+
+        # The story's fragment and the lists don't show comment scores.
+        self.assert_equal(get_story_versions([self.story.pk])[self.story.pk],
+                          story_version)
+        self.assert_equal(get_tag_version('stories'), list_version)
+
+
+class CommentViewTests(TransactionTestCase, SnakeTestMixin):
+    # The thread's cached fragments are only invalidated on commit.
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com',
+                                               'pass')
+        self.story = Story.objects.create(title="Discuss", text="Hi")
+        self.post_url = '/stories/%d/comments/post/' % self.story.pk
+
+    def test_post_and_reply(self):
+        self.client.login(username='author', password='pass')
+        response = self.client.post(self.post_url, {'text': "First!"})
+        comment = Comment.objects.get()
+        self.assertRedirects(response, '%s#comment-%d' % (
+            self.story.get_absolute_url(), comment.pk
+        ))
+
+        self.client.post(self.post_url, {'text': "Reply", 'parent': comment.pk})
+        reply = Comment.objects.get(parent=comment)
+        self.assert_equal(reply.author, self.author)
+
+        response = self.client.get(self.story.get_absolute_url())
+        self.assertContains(response, "First!")
+        self.assertContains(response, "Reply")
+
+        response = self.client.get(reply.get_absolute_url())
+        self.assertContains(response, "Reply")
+        self.assertNotContains(response, "First!")
+
+        response = self.client.get(self.post_url, {'parent': reply.pk})
+        self.assertContains(response, 'value="%d"' % reply.pk)
+
+    def test_anonymous_cannot_post(self):
+        response = self.client.post(self.post_url, {'text': "Hi"})
+        self.assert_equal(response.status_code, 302)
+        self.assert_false(Comment.objects.exists())
+        self.assertNotContains(self.client.get(self.story.get_absolute_url()),
+                               'comment-form')
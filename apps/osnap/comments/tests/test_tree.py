@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.tests.test_tree
+==============================
+These test the path and tree helpers.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.utils import unittest
+
+from snaketest import SnakeTestMixin
+
+from ..tree import build_tree, path_segment
+
+class FakeComment(object):
+    def __init__(self, pk, parent_id=None):
+        self.pk = pk
+        self.parent_id = parent_id
+
+
+class TreeTests(unittest.TestCase, SnakeTestMixin):
+    def test_path_segment(self):
+        self.assert_equal(path_segment(1), '000001')
+        self.assert_equal(path_segment(36), '000010')
+        # Fixed width keeps string order the same as numeric order.
+        self.assert_true(path_segment(35) < path_segment(36))
+        with self.assert_raises(ValueError):
+            path_segment(36 ** 6)
+
+    def test_build_tree(self):
+        comments = [FakeComment(1), FakeComment(2, 1), FakeComment(4, 2),
+                    FakeComment(3, 1), FakeComment(5)]
+        roots = build_tree(comments)
+        self.assert_equal([c.pk for c in roots], [1, 5])
+        self.assert_equal([c.pk for c in roots[0].children], [2, 3])
+        self.assert_equal([c.pk for c in roots[0].children[0].children], [4])
+
+    def test_orphans_are_roots(self):
+        roots = build_tree([FakeComment(2, 1), FakeComment(3, 2)])
+        self.assert_equal([c.pk for c in roots], [2])
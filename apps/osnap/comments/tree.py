@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.tree
+===================
+Helpers for the materialized paths that comment threads are stored with.
+
+Each comment's `path` is its parent's path, plus its own ID as a
+fixed-width base 36 number. So sorting comments by path puts every comment
+right after its parent (and its older siblings' replies), and a comment's
+whole subtree is a single range of paths.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+
+#: How many characters each comment adds to the path.
+SEGMENT_LENGTH = 6
+
+#: The longest a path can be. This allows for 42 levels of comments.
+PATH_LENGTH = 255
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def path_segment(pk):
+    """
+    Returns the path segment for a comment ID.
+    """
+    digits = []
+    while pk:
+        pk, digit = divmod(pk, 36)
+        digits.append(DIGITS[digit])
+    segment = ''.join(reversed(digits)).rjust(SEGMENT_LENGTH, '0')
+    if len(segment) > SEGMENT_LENGTH:
+        raise ValueError("Comment ID too large for its path")
+    return segment
+
+
+def subtree_range(first, last=None):
+    """
+    Returns the lowest and highest paths in the subtrees of `first` through
+    `last` (which default to `first`), for a ``path__range`` lookup. This
+    only uses digits and letters, so it works under any database collation.
+    """
+    last = last or first
+    return (first, last + DIGITS[-1] * (PATH_LENGTH - len(last)))
+
+
+def build_tree(comments):
+    """
+    Arranges `comments`, which must be sorted by path, into a tree in one
+    pass. Each comment gets a `children` list, and the top-level comments
+    are returned. Comments whose parents aren't in `comments` are treated
+    as top-level, so this works on subtrees and depth-limited threads too.
+    """
+    by_id = {}
+    roots = []
+    for comment in comments:
+        comment.children = []
+        by_id[comment.pk] = comment
+
+        parent = by_id.get(comment.parent_id)
+        if parent is None:
+            roots.append(comment)
+        else:
+            parent.children.append(comment)
+    return roots
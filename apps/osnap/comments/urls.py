@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.urls
+===================
+A default URLConf. Comments live under their stories' URLs.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.conf.urls import patterns
+from django.conf.urls import url
+
+from .views import CommentThreadView, PostCommentView
+
+urlpatterns = patterns("",
+    url(
+        regex=r"^stories/(?P<id>\d+)/comments/post/$",
+        view=PostCommentView.as_view(),
+        name="osnap_comment_post"
+    ),
+    url(
+        regex=r"^stories/(?P<id>\d+)/comments/(?P<comment_id>\d+)/$",
+        view=CommentThreadView.as_view(),
+        name="osnap_comment_thread"
+    ),
+)
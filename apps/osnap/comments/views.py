@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.comments.views
+====================
+Views for posting comments and reading deep threads.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseRedirect
+from django.shortcuts import get_object_or_404
+from django.views.generic import DetailView
+from django.views.generic.edit import CreateView
+
+from osnap.pagecache import cache_anonymous_page
+from osnap.stories.models import Story
+from osnap.stories.utils import decorated_view
+
+from .forms import CommentForm
+from .fragments import get_comment_versions
+from .models import Comment
+from .managers import ThreadPage
+
+@decorated_view(login_required)
+class PostCommentView(CreateView):
+    """
+    Posts a comment or reply. The form for top-level comments is on the
+    story page, so this only renders its own page for replies (whose forms
+    would otherwise be in the cached comments), or when there's something
+    wrong with the comment.
+    """
+    model = Comment
+    form_class = CommentForm
+
+    template_name = "osnap/comments/post.html"
+
+    def dispatch(self, request, *args, **kwargs):
+        self.story = get_object_or_404(Story, pk=kwargs['id'], published=True)
+        return super(PostCommentView, self).dispatch(request, *args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super(PostCommentView, self).get_form_kwargs()
+        kwargs['story'] = self.story
+        return kwargs
+
+    def get_parent(self):
+        data = self.request.POST if self.request.method == 'POST' \
+               else self.request.GET
+        parent_id = data.get('parent', '')
+        if not parent_id.isdigit():
+            return None
+        return Comment.objects.filter(pk=parent_id, story=self.story) \
+                      .select_related('author').first()
+
+    def get_context_data(self, **kwargs):
+        context = super(PostCommentView, self).get_context_data(**kwargs)
+        context['story'] = self.story
+        context['parent'] = self.get_parent()
+        return context
+
+    def form_valid(self, form):
+        comment = form.save(commit=False)
+        comment.author = self.request.user
+        comment.save()
+        return HttpResponseRedirect("%s#comment-%d" % (
+            self.story.get_absolute_url(), comment.pk
+        ))
+
+
+@decorated_view(cache_anonymous_page('story:{id}'))
+class CommentThreadView(DetailView):
+    """
+    Shows a comment and its replies, for following threads too deep (or
+    too big) to show on the story's page.
+    """
+    model = Comment
+    queryset = Comment.objects.filter(story__published=True) \
+                      .select_related('story')
+
+    pk_url_kwarg = 'comment_id'
+
+    template_name = "osnap/comments/thread.html"
+    context_object_name = "comment"
+
+    def get_queryset(self):
+        queryset = super(CommentThreadView, self).get_queryset()
+        return queryset.filter(story__pk=self.kwargs['id'])
+
+    def get_context_data(self, **kwargs):
+        context = super(CommentThreadView, self).get_context_data(**kwargs)
+        depth = getattr(settings, 'OSNAP_COMMENT_DEPTH', 8)
+        comments = Comment.objects.subtree(self.object, depth)
+        # See CommentManager.thread_page for why these are read first.
+        versions = get_comment_versions(comments.values_list('pk', flat=True))
+        comments = comments.with_user_votes(self.request.user)
+        context['story'] = self.object.story
+        context['thread'] = ThreadPage(comments, None,
+                                       self.object.depth + depth, versions)
+        return context
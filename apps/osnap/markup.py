@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.markup
+============
+Turns the Markdown users write into HTML that's safe to show other users.
+
+Rendering happens when the text is saved, and the HTML is stored next to
+it, so displaying it costs nothing.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+import markdown
+
+
+def render_markdown(text):
+    """
+    Renders `text` as Markdown. Any raw HTML in it is escaped, and links
+    with unsafe schemes (like ``javascript:``) are blanked out.
+
+    :param text: The Markdown to render.
+    :return:     The HTML, or an empty string if there's no text.
+    """
+    if not text:
+        return ''
+    return markdown.markdown(text, safe_mode='escape',
+                             enable_attributes=False, output_format='html5')
+
+
+def update_rendered_field(instance, source, update_fields=None):
+    """
+    Renders `instance`'s `source` field into its ``<source>_html`` field.
+    Call this from `save`, passing its `update_fields`: if that's given
+    and doesn't include `source`, nothing is rendered, and otherwise the
+    HTML field is added to it.
+
+    :return: The `update_fields` to pass on to `save`.
+    """
+    if update_fields is not None:
+        if source not in update_fields:
+            return update_fields
+        update_fields = list(update_fields) + [source + '_html']
+
+    setattr(instance, source + '_html',
+            render_markdown(getattr(instance, source)))
+    return update_fields
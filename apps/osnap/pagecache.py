@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.pagecache
+===============
+A whole-page cache for visitors who aren't logged in, who all see the same
+pages anyway, and ETags so that clients can skip downloading pages they
+already have.
+
+Cached pages belong to *tags* (like ``stories`` or ``story:15``), and
+`invalidate` marks every page with a tag as stale. Stale pages are still
+served while one worker -- whichever gets the lock first -- renders a
+fresh copy, so a busy page that expires doesn't send every worker to the
+database at once. Tags are only invalidated once the change has been
+committed, so the fresh copy can't be rendered from the old rows.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode
+
+from osnap.transactions import on_commit
+
+TAG_KEY = "osnap:pagecache:tag:%s"
+PAGE_KEY = "osnap:pagecache:page:%s"
+LOCK_KEY = "osnap:pagecache:lock:%s"
+
+#: The query parameters pages can depend on, unless the view says otherwise.
+#: Any others are left out of the cache key, so made-up query strings can't
+#: fill the cache with copies of the same page.
+DEFAULT_PARAMS = ('after', 'before')
+
+
+def _setting(name, default):
+    return getattr(settings, 'OSNAP_PAGE_CACHE_' + name, default)
+
+
+def invalidate(*tags):
+    """
+    Marks every cached page with any of `tags` as stale, once the current
+    transaction commits. They'll still be served until someone renders a
+    fresh copy.
+    """
+    on_commit(lambda: _bump_tags(tags))
+
+
+def _bump_tags(tags):
+    for tag in tags:
+        key = TAG_KEY % tag
+        try:
+            cache.incr(key)
+        except ValueError:
+            # It's not in the cache, so any version is new.
+            cache.set(key, _new_version(), None)
+
+
+def _new_version():
+    # Starting from the clock keeps a tag whose version was evicted from
+    # matching pages cached under the old version.
+    return int(time.time() * 1000)
+
+
+def _get_versions(found, tag_keys):
+    versions = []
+    for key in tag_keys:
+        version = found.get(key)
+        if version is None:
+            version = _new_version()
+            # If another worker just set one, use theirs.
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions.append(version)
+    return versions
+
+
+def get_tag_version(tag):
+    """
+    Returns the current version of a tag, which changes whenever the tag is
+    invalidated. It's handy for building ETags.
+    """
+    key = TAG_KEY % tag
+    return _get_versions(cache.get_many([key]), [key])[0]
+
+
+def page_etag(request, *parts):
+    """
+    Builds an ETag from `parts`, which should be cheap values that change
+    whenever the page does. The viewer and their language are mixed in too,
+    since the page looks different to each user.
+
+    It returns `None` (meaning "no ETag") if the viewer has messages
+    waiting, since those are only shown once.
+    """
+    if len(get_messages(request)):
+        return None
+
+    language = getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE)
+    viewer = request.user.pk if request.user.is_authenticated() else ''
+    parts = (language, viewer) + parts
+    return hashlib.md5(force_bytes('|'.join('%s' % p for p in parts))) \
+                  .hexdigest()
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if not _setting('ENABLED', True):
+        return False
+    if request.user.is_authenticated():
+        return False
+    # Messages are shown on the next page, and only to that visitor.
+    return not len(get_messages(request))
+
+
+def _is_cacheable_response(response):
+    return (response.status_code == 200 and not response.cookies
+            and not response.has_header('Vary')
+            and not getattr(response, 'streaming', False))
+
+
+def _page_key(request, params=DEFAULT_PARAMS):
+    query = sorted((name, value) for name in params
+                   for value in request.GET.getlist(name))
+    url = "%s://%s%s?%s" % ('https' if request.is_secure() else 'http',
+                            request.get_host(), request.path,
+                            urlencode(query))
+    language = getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE)
+    digest = hashlib.md5(force_bytes("%s|%s" % (language, url))).hexdigest()
+    return PAGE_KEY % digest
+
+
+def _render_and_store(view, request, args, kwargs, key, versions):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+
+    if _is_cacheable_response(response):
+        fresh_for = _setting('TIMEOUT', 60)
+        stale_for = _setting('STALE_TIMEOUT', 600)
+        entry = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'expires': time.time() + fresh_for,
+            'versions': versions,
+        }
+        cache.set(key, entry, fresh_for + stale_for)
+    return response
+
+
+def _response_from(entry):
+    return HttpResponse(entry['content'], content_type=entry['content_type'])
+
+
+def _wait_for_page(key, lock):
+    # Poll until the worker with the lock stores the page, or gives up.
+    deadline = time.time() + _setting('LOCK_WAIT', 5)
+    while time.time() < deadline:
+        time.sleep(0.05)
+        found = cache.get_many([key, lock])
+        if key in found:
+            return found[key]
+        elif lock not in found:
+            break
+    return None
+
+
+def cache_anonymous_page(*tags, **options):
+    """
+    Decorates a view so that its pages are cached for visitors who aren't
+    logged in. Each tag is a string that can use the view's keyword
+    arguments, like ``'story:{id}'``.
+
+    Pages are served from the cache for `OSNAP_PAGE_CACHE_TIMEOUT` seconds
+    (or until one of their tags is invalidated), then kept around for
+    `OSNAP_PAGE_CACHE_STALE_TIMEOUT` more, so the stale copy can be served
+    while one worker renders a new one. If there's no copy at all, the
+    other workers wait up to `OSNAP_PAGE_CACHE_LOCK_WAIT` seconds for it.
+    Pages that set cookies, vary, or aren't 200s are never cached. Don't
+    use it on pages with forms, since their CSRF tokens would be cached too.
+
+    :param params:  The query parameters the view looks at, which are part
+                    of the cache key. (Keyword-only.) Defaults to
+                    `DEFAULT_PARAMS`.
+    """
+    params = options.pop('params', DEFAULT_PARAMS)
+    if options:
+        raise TypeError("Unexpected arguments: %s" % ', '.join(options))
+
+    def decorator(view):
+        @wraps(view)
+        def cached_view(request, *args, **kwargs):
+            if not _is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            page_tags = [tag.format(**kwargs) for tag in tags]
+            key = _page_key(request, params)
+            tag_keys = [TAG_KEY % tag for tag in page_tags]
+            found = cache.get_many([key] + tag_keys)
+            entry = found.get(key)
+            versions = _get_versions(found, tag_keys)
+
+            if (entry is not None and entry['expires'] > time.time() and
+                    entry['versions'] == versions):
+                return _response_from(entry)
+
+            # Either it's stale or it isn't there, so someone needs to
+            # render it -- but only one someone at a time.
+            lock = LOCK_KEY % key
+            if not cache.add(lock, 1, _setting('LOCK_TIMEOUT', 30)):
+                if entry is None:
+                    entry = _wait_for_page(key, lock)
+                if entry is not None:
+                    return _response_from(entry)
+                # It's taking too long, or it couldn't be cached, so
+                # there's nothing to do but render it ourselves.
+                return view(request, *args, **kwargs)
+
+            try:
+                return _render_and_store(view, request, args, kwargs, key,
+                                         versions)
+            finally:
+                cache.delete(lock)
+        return cached_view
+    return decorator
@@ -10,12 +10,18 @@ A custom user model, which includes the limited social functions of OSNAP.
 from __future__ import unicode_literals
 
 from django.db import models
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
 from django.contrib.auth.models import (AbstractBaseUser, PermissionsMixin,
                                         UserManager)
 from django.core import validators
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
+from osnap import pagecache
+from osnap.markup import update_rendered_field
+
 class User(AbstractBaseUser, PermissionsMixin):
     """
     A variant of user with additional profile data, which ignores first name
@@ -54,7 +60,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     biography   = models.TextField(_('biography'), blank=True,
                     help_text=_("Additional text about yourself. This is a "
                                 "good place to link to your home page or "
-                                "projects you work on."))
+                                "projects you work on. You can use "
+                                "Markdown."))
+    biography_html = models.TextField(_('biography (HTML)'), blank=True,
+                    editable=False,
+                    help_text=_("The biography, rendered from Markdown."))
 
     gravatar_email = models.EmailField(_('Gravatar email address'), blank=True,
                     help_text=_("This email will be used to look up your "
@@ -62,6 +72,10 @@ class User(AbstractBaseUser, PermissionsMixin):
                                 "to be the same as your normal email, and "
                                 "it will not be displayed publicly."))
 
+    public_votes = models.BooleanField(_('public votes'), default=False,
+                    help_text=_("Check this to list your votes in the "
+                                "recent activity on your profile."))
+
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email']
 
@@ -69,6 +83,12 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name = _('user')
         verbose_name_plural = _('users')
 
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = update_rendered_field(
+            self, 'biography', kwargs.get('update_fields')
+        )
+        super(User, self).save(*args, **kwargs)
+
     def get_full_name(self):
         """
         Returns a full name for this user.
@@ -81,3 +101,58 @@ class User(AbstractBaseUser, PermissionsMixin):
         """
         return self.username
 
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_profile(sender, instance, **kwargs):
+    pagecache.invalidate('user:%s' % instance.username)
+
+
+def bylines_changed(user_id):
+    """
+    Invalidates the cached fragments of every story and comment a user has
+    posted, since they show the user's name.
+    """
+    from osnap.comments.models import Comment, comments_changed
+    from osnap.stories.models import Story, story_changed
+
+    story_ids = set(Story.objects.filter(submitter=user_id)
+                                 .values_list('pk', flat=True))
+    paths = {}
+    rows = Comment.objects.filter(author=user_id).values_list('story', 'path')
+    for (story_id, path) in rows:
+        paths.setdefault(story_id, []).append(path)
+
+    for (story_id, story_paths) in paths.items():
+        comments_changed(story_id, story_paths)
+    for story_id in story_ids.difference(paths):
+        story_changed(story_id)
+
+
+@receiver(pre_save, sender=User)
+def check_for_rename(sender, instance, update_fields=None, raw=False,
+                     **kwargs):
+    instance._renamed = False
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        # Logging in saves the user, but only `last_login`.
+        return
+    old = User.objects.filter(pk=instance.pk) \
+              .values_list('username', flat=True).first()
+    instance._renamed = old is not None and old != instance.username
+    if instance._renamed:
+        pagecache.invalidate('user:%s' % old)
+
+
+@receiver(post_save, sender=User)
+def invalidate_renamed_bylines(sender, instance, **kwargs):
+    if getattr(instance, '_renamed', False):
+        bylines_changed(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def invalidate_deleted_bylines(sender, instance, **kwargs):
+    # This has to find them before they're set to NULL. (Deleting happens
+    # in a transaction, so they're only invalidated once it's done.)
+    bylines_changed(instance.pk)
@@ -8,7 +8,7 @@ These test custom Python code in our models.
 :license:   GNU GPL version 2 or later, see LICENSE for details
 """
 from __future__ import unicode_literals
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
 
 from snaketest import SnakeTestMixin
 
@@ -35,3 +35,22 @@ class UserModelTests(SimpleTestCase, SnakeTestMixin):
         self.assertEquals(user.get_short_name(), 'loner')
         self.assertEquals(user.get_full_name(),  'Lone Ranger')
 
+
+class UserMarkdownTests(TestCase, SnakeTestMixin):
+    def test_biography_rendered_on_save(self):
+        user = User(username='writer', email='writer@example.com',
+                    biography="I *write*. <script>alert(1)</script>")
+        user.save()
+        self.assert_in("<em>write</em>", user.biography_html)
+        self.assert_in("&lt;script&gt;", user.biography_html)
+        self.assert_not_in("<script>", user.biography_html)
+
+        # Saves that don't touch the biography don't render it.
+        user.biography = "Changed"
+        user.save(update_fields=['full_name'])
+        self.assert_in("<em>write</em>",
+                       User.objects.get(pk=user.pk).biography_html)
+
+        user.save(update_fields=['biography'])
+        self.assert_equal(User.objects.get(pk=user.pk).biography_html,
+                          "<p>Changed</p>")
@@ -13,15 +13,30 @@ from django.contrib.auth import login
 from django.contrib.sites.models import get_current_site
 from django.core.mail import send_mail
 from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
+from django.http import Http404
 from django.shortcuts import render, redirect
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
+from django.views.decorators.http import condition
 from django.views.generic import DetailView
 from django.views.generic.edit import CreateView
 
+from osnap.activity.models import Activity
+from osnap.pagecache import cache_anonymous_page, get_tag_version, page_etag
+from osnap.stories.utils import decorated_view
+
 from .forms import RegistrationForm
 from .models import User
 
+def profile_etag(request, username):
+    # Profiles only change when their users are saved, which bumps the tag,
+    # so this doesn't need the database at all.
+    return page_etag(request, 'profile', username,
+                     get_tag_version('user:%s' % username))
+
+
+@decorated_view(condition(etag_func=profile_etag))
+@decorated_view(cache_anonymous_page('user:{username}'))
 class ProfileView(DetailView):
     model = User
 
@@ -31,6 +46,17 @@ class ProfileView(DetailView):
     template_name = 'osnap/people/profile.html'
     context_object_name = 'subject'
 
+    def get_context_data(self, **kwargs):
+        context = super(ProfileView, self).get_context_data(**kwargs)
+        try:
+            context['activity'] = Activity.objects.timeline(
+                self.object, after=self.request.GET.get('after'),
+                votes=self.object.public_votes
+            )
+        except ValueError:
+            raise Http404(_("Invalid page cursor."))
+        return context
+
 
 class RegisterView(CreateView):
     model = User
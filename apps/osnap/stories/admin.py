@@ -10,7 +10,7 @@ Configuration for the Django admin interface.
 from __future__ import unicode_literals
 from django.contrib import admin
 
-from .models import Story
+from .models import Domain, Story
 
 class StoryAdmin(admin.ModelAdmin):
     date_hierarchy = 'submit_date'
@@ -18,5 +18,12 @@ class StoryAdmin(admin.ModelAdmin):
     list_display_links = ('title',)
 
 
+class DomainAdmin(admin.ModelAdmin):
+    list_display = ('name', 'story_count', 'total_points')
+    readonly_fields = ('story_count', 'total_points')
+    search_fields = ('name',)
+
+
 admin.site.register(Story, StoryAdmin)
+admin.site.register(Domain, DomainAdmin)
 
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.bloom
+===================
+Bloom filters, which can say for certain that they've *never* seen
+something, using far less memory than remembering everything. We use them
+to skip the database when checking whether a link is a duplicate, since
+almost none of them are.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import division, unicode_literals
+import calendar
+import hashlib
+import math
+import struct
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+
+
+class BloomFilter(object):
+    """
+    A plain Bloom filter, sized for `capacity` keys at a false positive rate
+    of `error_rate`. Keys can be added, but not removed.
+
+    :param capacity:    How many keys the filter is expected to hold.
+    :param error_rate:  The false positive rate it should have once it holds
+                        `capacity` keys.
+    """
+    def __init__(self, capacity, error_rate):
+        capacity = max(int(capacity), 1)
+        num_bits = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        #: The number of bits in the filter.
+        self.num_bits = max(int(math.ceil(num_bits)), 8)
+        #: The number of bits set for each key.
+        self.num_hashes = max(int(round(self.num_bits / capacity *
+                                        math.log(2))), 1)
+        #: The number of keys added so far.
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions out of two 64-bit hashes.
+        digest = hashlib.md5(force_bytes(key)).digest()
+        h1, h2 = struct.unpack(b'<QQ', digest)
+        return [(h1 + i * h2) % self.num_bits
+                for i in range(self.num_hashes)]
+
+    def add(self, key):
+        added = False
+        for pos in self._positions(key):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not self._bits[byte] & bit:
+                self._bits[byte] |= bit
+                added = True
+        # Adding a key again doesn't fill the filter up any further.
+        if added:
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(key))
+
+    @property
+    def memory_size(self):
+        """
+        The size of the bit array, in bytes.
+        """
+        return len(self._bits)
+
+    @property
+    def false_positive_rate(self):
+        """
+        The estimated chance that a key that was never added is reported
+        as present, given how many keys have been added.
+        """
+        k, m = self.num_hashes, self.num_bits
+        return (1 - math.exp(-k * self.count / m)) ** k
+
+
+class RollingBloomFilter(object):
+    """
+    A Bloom filter that forgets keys once they're older than `window`.
+    It's a ring of `buckets` plain filters, each covering a slice of the
+    window, and old ones are thrown away as time passes. (So keys are
+    actually kept for somewhere between `window` and one slice longer.)
+    It's safe to share between threads.
+
+    :param window:      How long to remember keys, as a `timedelta`.
+    :param capacity:    How many keys are expected to be added per window.
+    :param error_rate:  The overall false positive rate to aim for.
+    :param buckets:     How many slices to divide the window into.
+    """
+    def __init__(self, window, capacity, error_rate, buckets=6):
+        self.window = window
+        self.buckets = buckets
+        self.bucket_seconds = max(window.total_seconds() / buckets, 1)
+        # Lookups check every live bucket, so their error rates add up.
+        self._bucket_capacity = max(capacity // buckets, 1)
+        self._bucket_error_rate = error_rate / (buckets + 1)
+
+        self._lock = threading.Lock()
+        self._filters = {}
+
+    def _bucket_for(self, when):
+        timestamp = calendar.timegm(when.utctimetuple())
+        return int(timestamp // self.bucket_seconds)
+
+    def _expire(self, now):
+        oldest = self._bucket_for(now) - self.buckets
+        for bucket in list(self._filters):
+            if bucket < oldest:
+                del self._filters[bucket]
+
+    def add(self, key, when=None):
+        """
+        Adds a key to the filter.
+
+        :param key:     The key to add.
+        :param when:    When the key was seen, which determines when it's
+                        forgotten. Defaults to now.
+        """
+        now = timezone.now()
+        when = when or now
+        if when < now - self.window:
+            return
+
+        bucket = self._bucket_for(when)
+        with self._lock:
+            self._expire(now)
+            bloom = self._filters.get(bucket)
+            if bloom is None:
+                bloom = self._filters[bucket] = BloomFilter(
+                    self._bucket_capacity, self._bucket_error_rate
+                )
+            bloom.add(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            self._expire(timezone.now())
+            return any(key in bloom for bloom in self._filters.values())
+
+    @property
+    def memory_size(self):
+        """
+        The total size of the live buckets' bit arrays, in bytes.
+        """
+        with self._lock:
+            return sum(bloom.memory_size for bloom in self._filters.values())
+
+    @property
+    def false_positive_rate(self):
+        """
+        The estimated chance that a key that wasn't added in the window is
+        reported as present.
+        """
+        with self._lock:
+            miss = 1.0
+            for bloom in self._filters.values():
+                miss *= 1 - bloom.false_positive_rate
+            return 1 - miss
+
+
+class RecentLinkFilter(RollingBloomFilter):
+    """
+    Remembers the URL hashes of stories submitted in the last
+    `OSNAP_DUPLICATE_FILTER_HOURS`, so `StoryManager.find_duplicate_link`
+    can skip the database for links that definitely haven't been seen.
+
+    Stories saved in this process are added straight away. Stories saved by
+    other processes are picked up by a query for recently submitted stories
+    at most once every `sync_interval` seconds, so there's a window of that
+    long where a duplicate submitted to another process can be missed.
+    Each query goes `overlap` seconds further back than the last one
+    reached, since a story's submit date is set before its transaction
+    commits -- so stories committed out of order are still picked up, as
+    long as they take less than `overlap` seconds to commit.
+
+    :param hours:           How many hours back to remember links.
+    :param capacity:        How many links are expected per window.
+                            Defaults to `OSNAP_DUPLICATE_PREFILTER_CAPACITY`,
+                            or 10000.
+    :param error_rate:      The false positive rate to aim for. Defaults to
+                            `OSNAP_DUPLICATE_PREFILTER_ERROR_RATE`, or 0.001.
+    :param sync_interval:   How many seconds to wait between checks for other
+                            processes' stories. Defaults to
+                            `OSNAP_DUPLICATE_PREFILTER_SYNC`, or 5.
+    :param overlap:         How many seconds each check overlaps the last.
+                            Defaults to `OSNAP_DUPLICATE_PREFILTER_OVERLAP`,
+                            or 300.
+    """
+    def __init__(self, hours, capacity=None, error_rate=None,
+                 sync_interval=None, overlap=None):
+        if capacity is None:
+            capacity = getattr(settings, 'OSNAP_DUPLICATE_PREFILTER_CAPACITY',
+                               10000)
+        if error_rate is None:
+            error_rate = getattr(settings,
+                                 'OSNAP_DUPLICATE_PREFILTER_ERROR_RATE', 0.001)
+        if sync_interval is None:
+            sync_interval = getattr(settings, 'OSNAP_DUPLICATE_PREFILTER_SYNC',
+                                    5)
+        if overlap is None:
+            overlap = getattr(settings, 'OSNAP_DUPLICATE_PREFILTER_OVERLAP',
+                              300)
+
+        super(RecentLinkFilter, self).__init__(timedelta(hours=hours),
+                                               capacity, error_rate)
+        self.hours = hours
+        self.sync_interval = sync_interval
+        self.overlap = timedelta(seconds=overlap)
+        self._synced_until = None
+        self._last_sync = None
+        self._sync_lock = threading.Lock()
+
+    def sync(self, force=False):
+        """
+        Adds any stories submitted since the last sync (give or take
+        `overlap`), or the first time, every story in the window, to the
+        filter.
+        """
+        from .models import Story
+
+        now = time.time()
+        with self._sync_lock:
+            if (not force and self._last_sync is not None and
+                    now - self._last_sync < self.sync_interval):
+                return
+            self._last_sync = now
+
+            # Going by primary key would skip stories whose transactions
+            # commit out of order, so this goes by a window of submit dates
+            # that overlaps the last one.
+            started = timezone.now()
+            since = started - self.window
+            if self._synced_until is not None:
+                since = max(since, self._synced_until - self.overlap)
+
+            rows = Story.objects.exclude(url_hash='') \
+                        .filter(submit_date__gte=since) \
+                        .values_list('url_hash', 'submit_date')
+            for (url_hash, submit_date) in rows.iterator():
+                self.add(url_hash, submit_date)
+            self._synced_until = started
+
+    def might_contain(self, url_hash):
+        """
+        Returns `False` if no story with this URL hash was submitted in the
+        window, and `True` if one might have been.
+        """
+        self.sync()
+        return url_hash in self
+
+
+_recent_links = None
+_recent_links_lock = threading.Lock()
+
+
+def get_recent_link_filter():
+    """
+    Returns this process's `RecentLinkFilter`, creating it the first time,
+    or `None` if duplicate filtering or the pre-filter are turned off
+    (with `OSNAP_DUPLICATE_FILTER_HOURS` or `OSNAP_DUPLICATE_PREFILTER`).
+    """
+    global _recent_links
+    hours = getattr(settings, 'OSNAP_DUPLICATE_FILTER_HOURS', 0)
+    if not hours or not getattr(settings, 'OSNAP_DUPLICATE_PREFILTER', True):
+        return None
+
+    with _recent_links_lock:
+        if _recent_links is None or _recent_links.hours != hours:
+            _recent_links = RecentLinkFilter(hours)
+        return _recent_links
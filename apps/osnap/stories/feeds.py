@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.feeds
+===================
+RSS and Atom feeds of the story listings.
+
+Feeds are streamed out a story at a time as they're read from the database,
+and the finished document is cached until a newer story is submitted, so
+the readers polling a feed every few minutes mostly cost one small query.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+import calendar
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import (Http404, HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
+from django.shortcuts import get_object_or_404
+from django.utils import feedgenerator, timezone
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.text import Truncator
+from django.utils.translation import ugettext as _, ugettext_lazy
+from django.views.generic import View
+
+from .models import Domain, Story
+
+FEED_KEY = "osnap:feed:%s:%s:%s:%s"
+
+FEED_TYPES = {
+    'rss': feedgenerator.Rss201rev2Feed,
+    'atom': feedgenerator.Atom1Feed,
+}
+
+
+class StoryFeedView(View):
+    """
+    The base for views that serve a feed of published stories. Subclasses
+    set `title` and `order_by`, and can override `get_queryset` to narrow
+    things down and `get_link` to point at the matching page.
+
+    A cached feed is used until a newer story is submitted, or for
+    `OSNAP_FEED_CACHE_TIMEOUT` seconds -- so feeds sorted by something
+    other than submit date, like the front page, can be that far behind.
+
+    The feed format comes from the `format` URL keyword argument, which
+    should be ``rss`` or ``atom``.
+    """
+    title = None
+    order_by = ('-submit_date', '-pk')
+
+    def get_queryset(self):
+        return Story.objects.filter(published=True)
+
+    def get_title(self):
+        return _("Turtle Crossing: %s") % self.title
+
+    def get_link(self):
+        """
+        Returns the URL of the page that lists the same stories as this
+        feed. By default, it's the front page.
+        """
+        from django.core.urlresolvers import reverse
+        return reverse('osnap_front_page')
+
+    def get_cache_name(self):
+        """
+        Returns a name for this feed that's unique among all the feeds.
+        """
+        return type(self).__name__
+
+    def get(self, request, format, **kwargs):
+        if format not in FEED_TYPES:
+            raise Http404
+        feed_type = FEED_TYPES[format]
+
+        # This is the only query a cached feed costs.
+        newest = list(self.get_queryset().order_by('-submit_date', '-pk')
+                                         .values_list('pk', flat=True)[:1])
+        # Links in the feed are absolute, so each site gets its own copy.
+        origin = "%s://%s" % ('https' if request.is_secure() else 'http',
+                              request.get_host())
+        key = FEED_KEY % (self.get_cache_name(), origin, format,
+                          newest[0] if newest else 0)
+
+        cached = cache.get(key)
+        if cached is None:
+            generated = calendar.timegm(timezone.now().utctimetuple())
+            response = StreamingHttpResponse(
+                self._stream(feed_type, key, generated),
+                content_type=feed_type.mime_type
+            )
+            response['Last-Modified'] = http_date(generated)
+            return response
+
+        content, generated = cached
+        since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+        )
+        if since is not None and generated <= since:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=feed_type.mime_type)
+        response['Last-Modified'] = http_date(generated)
+        return response
+
+    def _stream(self, feed_type, key, generated):
+        feed = feed_type(title=self.get_title(),
+                         link=self.request.build_absolute_uri(self.get_link()),
+                         description=self.get_title(),
+                         feed_url=self.request.build_absolute_uri())
+        out = BytesIO()
+        handler = feedgenerator.SimplerXMLGenerator(out,
+                                                    settings.DEFAULT_CHARSET)
+        chunks = []
+
+        def flush():
+            chunk = out.getvalue()
+            out.seek(0)
+            out.truncate()
+            chunks.append(chunk)
+            return chunk
+
+        # The feed classes only know how to write a whole feed at once, so
+        # this is their write method, taken apart to go one item at a time.
+        rss = isinstance(feed, feedgenerator.RssFeed)
+        handler.startDocument()
+        if rss:
+            handler.startElement("rss", feed.rss_attributes())
+            handler.startElement("channel", feed.root_attributes())
+        else:
+            handler.startElement("feed", feed.root_attributes())
+        feed.add_root_elements(handler)
+        yield flush()
+
+        stories = self.get_queryset().select_related('submitter') \
+                      .order_by(*self.order_by)
+        limit = getattr(settings, 'OSNAP_FEED_ITEMS', 30)
+        for story in stories[:limit].iterator():
+            feed.items = []
+            self._add_item(feed, story)
+            feed.write_items(handler)
+            yield flush()
+
+        if rss:
+            feed.endChannelElement(handler)
+            handler.endElement("rss")
+        else:
+            handler.endElement("feed")
+        yield flush()
+
+        timeout = getattr(settings, 'OSNAP_FEED_CACHE_TIMEOUT', 60 * 5)
+        cache.set(key, (b''.join(chunks), generated), timeout)
+
+    def _add_item(self, feed, story):
+        permalink = self.request.build_absolute_uri(story.get_absolute_url())
+        feed.add_item(
+            title=story.title,
+            link=story.url or permalink,
+            description=Truncator(story.text_html).words(100, html=True),
+            unique_id=permalink,
+            pubdate=story.submit_date,
+            author_name=(story.submitter.username if story.submitter
+                         else None),
+            comments=permalink,
+        )
+
+
+class FrontPageFeed(StoryFeedView):
+    title = ugettext_lazy("Front Page")
+    order_by = ('-rank', '-pk')
+
+
+class NewStoriesFeed(StoryFeedView):
+    title = ugettext_lazy("New Stories")
+
+    def get_link(self):
+        from django.core.urlresolvers import reverse
+        return reverse('osnap_new_stories')
+
+
+class DomainStoriesFeed(StoryFeedView):
+    def dispatch(self, request, *args, **kwargs):
+        self.domain = get_object_or_404(Domain, name=kwargs['domain'])
+        return super(DomainStoriesFeed, self).dispatch(request, *args,
+                                                       **kwargs)
+
+    def get_queryset(self):
+        queryset = super(DomainStoriesFeed, self).get_queryset()
+        return queryset.filter(domain=self.domain.name)
+
+    def get_title(self):
+        return _("Turtle Crossing: Stories from %s") % self.domain.name
+
+    def get_link(self):
+        return self.domain.get_absolute_url()
+
+    def get_cache_name(self):
+        return 'domain:%s' % self.domain.name
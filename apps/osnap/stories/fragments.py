@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.fragments
+=======================
+Caches the rendered HTML for each story in a list, so list pages are mostly
+stitched together from the cache instead of being rendered from scratch.
+
+Each story has a version number in the cache, which is part of its
+fragments' keys. Anything that changes what a fragment shows (saving the
+story, or voting on it) bumps the version, so stale fragments are never
+read again and just fall out of the cache. Versions are only bumped once
+the change is committed, so nothing can cache the old story under the new
+version.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from osnap.transactions import on_commit
+
+#: The template that's rendered and cached for each story.
+FRAGMENT_TEMPLATE = "osnap/stories/story-fragment.html"
+
+VERSION_KEY = "osnap:story:%s:version"
+FRAGMENT_KEY = "osnap:story:%s:v%s:info"
+
+
+def _new_version():
+    # If a version is evicted, starting over at 1 could bring back
+    # fragments from before the eviction, so start from the clock instead.
+    return int(time.time() * 1000)
+
+
+def bump_story_version(story_id):
+    """
+    Invalidates the cached fragments for a story, once the current
+    transaction commits.
+    """
+    on_commit(lambda: _bump(VERSION_KEY % story_id))
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # It's not in the cache, so any version is new.
+        cache.set(key, _new_version(), None)
+
+
+def get_story_versions(story_ids):
+    """
+    Returns a dict mapping each story ID to its current version, with one
+    cache lookup.
+    """
+    keys = dict((VERSION_KEY % pk, pk) for pk in story_ids)
+    found = cache.get_many(list(keys))
+    versions = dict((keys[key], version) for (key, version) in found.items())
+
+    for (key, pk) in keys.items():
+        if pk not in versions:
+            version = _new_version()
+            # If another process just set one, use theirs.
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[pk] = version
+    return versions
+
+
+def get_story_fragments(stories):
+    """
+    Returns a list of ``(story, html)`` pairs for `stories`, rendering and
+    caching the fragments that aren't cached already. That's two cache
+    lookups for the whole list, plus one to store any new fragments.
+
+    :param stories: The stories to get fragments for.
+    """
+    stories = list(stories)
+    if not stories:
+        return []
+
+    versions = get_story_versions(story.pk for story in stories)
+    keys = [FRAGMENT_KEY % (story.pk, versions[story.pk])
+            for story in stories]
+    found = cache.get_many(keys)
+
+    missing = {}
+    pairs = []
+    for (story, key) in zip(stories, keys):
+        html = found.get(key)
+        if html is None:
+            html = missing[key] = render_to_string(FRAGMENT_TEMPLATE,
+                                                   {'story': story})
+        pairs.append((story, mark_safe(html)))
+
+    if missing:
+        timeout = getattr(settings, 'OSNAP_FRAGMENT_CACHE_TIMEOUT',
+                          60 * 60 * 24)
+        cache.set_many(missing, timeout)
+    return pairs
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.management.commands.backfill_url_hashes
+=====================================================
+Fills in the canonical URLs, URL hashes and domains of stories submitted
+before they were stored, and recounts the domain stats.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from ...models import Story
+
+
+class Command(NoArgsCommand):
+    help = ("Fills in the canonical URL, URL hash and domain of every link "
+            "story that doesn't have them, then recounts the domain stats.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size',
+            default=500,
+            help="How many stories to update per transaction."),
+    )
+
+    def handle_noargs(self, **options):
+        count = Story.objects.backfill_url_hashes(options['batch_size'])
+        if int(options.get('verbosity', 1)) >= 1:
+            self.stdout.write("Backfilled the link fields of %d stories"
+                              % count)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.management.commands.refresh_story_ranks
+=====================================================
+Recalculates the ranks of recent stories. Run this from cron every few
+minutes.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from ...models import Story
+
+
+class Command(NoArgsCommand):
+    help = ("Recalculates the ranks of the stories submitted within the "
+            "ranking horizon.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--hours', type='int', dest='hours', default=None,
+            help="How many hours back to refresh stories. Defaults to the "
+                 "OSNAP_RANKING_HORIZON_HOURS setting."),
+    )
+
+    def handle_noargs(self, **options):
+        count = Story.objects.refresh_ranks(hours=options['hours'])
+        if int(options.get('verbosity', 1)) >= 1:
+            self.stdout.write("Refreshed the ranks of %d stories" % count)
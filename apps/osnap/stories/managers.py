@@ -11,14 +11,44 @@ from __future__ import unicode_literals
 from datetime import timedelta
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.utils import timezone
 
-class StoryManager(models.Manager):
+from democracy.managers import VotableManager, VotableQuerySet
+
+from .bloom import get_recent_link_filter
+from .utils import hash_url
+
+
+class StoryQuerySet(VotableQuerySet):
+    def for_listing(self, user):
+        """
+        Returns a new `QuerySet` that loads everything a story list needs in
+        a fixed number of queries, no matter how many stories there are:
+        the stories and their submitters in one, and `user`'s votes on them
+        (as `story.user_vote`) in one more. The vote counts are already on
+        the story rows.
+
+        :param user:    The user viewing the list. (Anonymous users are
+                        fine, and don't cost the extra query.)
+        """
+        return self.select_related('submitter').with_user_votes(user)
+
+
+class StoryManager(VotableManager):
+    def get_queryset(self):
+        return StoryQuerySet(self.model, using=self._db)
+
+    def for_listing(self, user):
+        return self.get_queryset().for_listing(user)
+
     def find_duplicate_link(self, story_draft, hours=None):
         """
-        Searches the database for stories with the same URL
-        (though the logic may be refined in the future) submitted recently.
+        Searches the database for stories submitted recently that link to the
+        same page, even if the URL is written slightly differently (see
+        `osnap.stories.utils.canonicalize_url`). This is one lookup on the
+        ``(url_hash, submit_date)`` index, and it's skipped entirely when the
+        in-process `RecentLinkFilter` knows the link is new.
 
         This is not intended to protect against users hitting Submit twice,
         but against multiple users submitting the same link simultaneously.
@@ -32,14 +62,18 @@ class StoryManager(models.Manager):
         :return: The earliest duplicate of the story within the hours setting.
         """
         if story_draft.url:
-            qs = self.filter(url=story_draft.url)
-
             if hours is None:
                 hours = getattr(settings, 'OSNAP_DUPLICATE_FILTER_HOURS', 0)
 
             if hours:
+                url_hash = hash_url(story_draft.url)
+                recent_links = get_recent_link_filter()
+                if (recent_links is not None and hours <= recent_links.hours
+                        and not recent_links.might_contain(url_hash)):
+                    return None
+
                 cutoff = timezone.now() - timedelta(hours=hours)
-                dupes = self.filter(url=story_draft.url,
+                dupes = self.filter(url_hash=url_hash,
                                     submit_date__gte=cutoff) \
                             .order_by('submit_date')[:1]
 
@@ -48,3 +82,136 @@ class StoryManager(models.Manager):
 
         return None
 
+    def backfill_url_hashes(self, batch_size=500):
+        """
+        Fills in `canonical_url`, `url_hash` and `domain` for link stories
+        that don't have them yet, like the ones submitted before they
+        existed, then rebuilds the `Domain` stats. This is run by the
+        ``backfill_url_hashes`` management command. (Processes that have
+        already loaded their `RecentLinkFilter` won't notice the backfilled
+        stories, so run it before starting the site.)
+
+        :param batch_size:  How many stories to update per transaction.
+        :return:            The number of stories updated.
+        """
+        count = 0
+        last_pk = 0
+        while True:
+            batch = list(self.filter(models.Q(url_hash='') |
+                                     models.Q(domain=''), pk__gt=last_pk)
+                             .exclude(url='')
+                             .order_by('pk')
+                             .only('id', 'url')[:batch_size])
+            if not batch:
+                break
+
+            with transaction.atomic():
+                for story in batch:
+                    story.update_link_fields()
+                    self.filter(pk=story.pk).update(
+                        canonical_url=story.canonical_url,
+                        url_hash=story.url_hash,
+                        domain=story.domain
+                    )
+            count += len(batch)
+            last_pk = batch[-1].pk
+
+        # Circular dependencies :-(
+        from .models import Domain
+        Domain.objects.rebuild()
+        return count
+
+    def refresh_ranks(self, hours=None, batch_size=500):
+        """
+        Recalculates the rank of every story submitted recently, since the
+        ranks decay over time. Stories that have gotten too old to make the
+        front page have their rank set to 0 once, and are left alone after
+        that, so this doesn't get slower as the site gets older. This is
+        meant to be run every few minutes, by the ``refresh_story_ranks``
+        management command.
+
+        Each batch is committed on its own, so votes aren't held up behind
+        the whole horizon. A story whose counts change after its batch is
+        read is skipped, since the vote that changed them already updated
+        its rank.
+
+        :param hours:       The number of hours back to refresh stories.
+                            If `None`, the `OSNAP_RANKING_HORIZON_HOURS`
+                            setting is consulted.
+        :param batch_size:  How many stories to update per transaction.
+        :return:            The number of stories refreshed.
+        """
+        if hours is None:
+            hours = getattr(settings, 'OSNAP_RANKING_HORIZON_HOURS', 72)
+
+        now = timezone.now()
+        cutoff = now - timedelta(hours=hours)
+
+        count = 0
+        last_pk = 0
+        while True:
+            batch = list(self.filter(submit_date__gte=cutoff, pk__gt=last_pk)
+                             .order_by('pk')
+                             .only('id', 'submit_date', 'upvotes',
+                                   'downvotes')[:batch_size])
+            if not batch:
+                break
+
+            with transaction.atomic():
+                for story in batch:
+                    rank = story.compute_rank(story.upvotes, story.downvotes,
+                                              now)
+                    count += self.filter(pk=story.pk, upvotes=story.upvotes,
+                                         downvotes=story.downvotes) \
+                                 .update(rank=rank)
+            last_pk = batch[-1].pk
+
+        # Otherwise, their last rank would stay put while everything
+        # newer decays past it.
+        count += self.filter(submit_date__lt=cutoff) \
+                     .exclude(rank=0).update(rank=0)
+        return count
+
+
+class DomainManager(models.Manager):
+    def adjust(self, name, stories, points):
+        """
+        Adds `stories` and `points` (which may be negative) to a domain's
+        stats, creating its row if needed. Call this within an `atomic`
+        block.
+        """
+        if not (stories or points):
+            return
+
+        rows = self.filter(name=name)
+        changes = {'story_count': models.F('story_count') + stories,
+                   'total_points': models.F('total_points') + points}
+        if not rows.update(**changes):
+            try:
+                with transaction.atomic():
+                    self.create(name=name, story_count=stories,
+                                total_points=points)
+            except IntegrityError:
+                # Somebody else created it first.
+                rows.update(**changes)
+
+    def rebuild(self):
+        """
+        Throws away every domain's stats and counts them again from the
+        stories.
+        """
+        # Circular dependencies :-(
+        from .models import Story
+
+        totals = Story.objects.filter(published=True).exclude(domain='') \
+                      .values('domain') \
+                      .annotate(stories=models.Count('id'),
+                                up=models.Sum('upvotes'),
+                                down=models.Sum('downvotes'))
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create([
+                self.model(name=row['domain'], story_count=row['stories'],
+                           total_points=row['up'] - row['down'])
+                for row in totals
+            ])
@@ -8,16 +8,29 @@ Database models! These are fairly simple.
 :license:   GNU GPL version 2 or later, see LICENSE for details
 """
 from __future__ import unicode_literals
-from urlparse import urlparse
+from datetime import timedelta
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 
-from .managers import StoryManager
+from democracy.ranking import hot_score, wilson_lower_bound
+from democracy.signals import (post_bulk_vote, post_remove_vote, post_vote,
+                               vote_counts_changed)
+from democracy.voting import Votable
+from osnap import pagecache
+from osnap.markup import update_rendered_field
+
+from .bloom import get_recent_link_filter
+from .fragments import bump_story_version
+from .managers import DomainManager, StoryManager
+from .utils import URL_HASH_LENGTH, canonicalize_url, domain_of, hash_url
+
 
 @python_2_unicode_compatible
 class Story(models.Model):
@@ -33,9 +46,25 @@ class Story(models.Model):
                     help_text=_("The URL of an article to discuss. "
                                 "Mutually exclusive with Text."))
 
+    canonical_url = models.CharField(_("canonical URL"), max_length=200,
+                    blank=True, editable=False,
+                    help_text=_("The URL with the unimportant parts "
+                                "stripped off, for finding duplicates."))
+    url_hash    = models.CharField(_("URL hash"), max_length=URL_HASH_LENGTH,
+                    blank=True, editable=False,
+                    help_text=_("A hash of the canonical URL, which is "
+                                "indexed."))
+    domain      = models.CharField(_("domain"), max_length=200,
+                    blank=True, editable=False,
+                    help_text=_("The domain the URL points to, without "
+                                "any \"www.\"."))
+
     text        = models.TextField(_("text"), blank=True,
-                    help_text=_("The post's content, for standalone posts. "
-                                "Mutually exclusive with URL."))
+                    help_text=_("The post's content, for standalone posts, "
+                                "in Markdown. Mutually exclusive with URL."))
+    text_html   = models.TextField(_("text (HTML)"), blank=True,
+                    editable=False,
+                    help_text=_("The text, rendered from Markdown."))
 
     submit_date = models.DateTimeField(_("submitted at"), default=timezone.now)
 
@@ -47,19 +76,54 @@ class Story(models.Model):
                     help_text=_("Uncheck, and the story disappears from "
                                 "the site."))
 
+    upvotes     = models.PositiveIntegerField(_("upvotes"), default=0,
+                    editable=False)
+    downvotes   = models.PositiveIntegerField(_("downvotes"), default=0,
+                    editable=False)
+
+    rank        = models.FloatField(_("rank"), default=0, editable=False,
+                    help_text=_("How \"hot\" the story is. This decays as "
+                                "the story gets older, and is recalculated "
+                                "periodically."))
+    confidence  = models.FloatField(_("confidence"), default=0,
+                    editable=False,
+                    help_text=_("The lower bound of the Wilson score "
+                                "interval for the story's upvote ratio."))
+
+    votes       = Votable(scores=('rank', 'confidence'),
+                          counters=('upvotes', 'downvotes'))
+
     class Meta:
         verbose_name = _("story")
         verbose_name_plural = _("stories")
 
         get_latest_by = "submit_date"
         ordering = ('-submit_date',)
+        # These back the keyset pagination on the story listings.
+        index_together = [('rank', 'id'), ('submit_date', 'id'),
+                          ('domain', 'submit_date', 'id'),
+                          ('url_hash', 'submit_date')]
 
     def __str__(self):
         return self.title
 
     @property
-    def domain(self):
-        return urlparse(self.url).netloc if self.url else ''
+    def points(self):
+        return self.upvotes - self.downvotes
+
+    def compute_rank(self, upvotes, downvotes, now=None):
+        # Stories past the horizon aren't refreshed any more, so they drop
+        # out of the ranking entirely instead of keeping a stale rank.
+        now = now or timezone.now()
+        hours = getattr(settings, 'OSNAP_RANKING_HORIZON_HOURS', 72)
+        if self.submit_date < now - timedelta(hours=hours):
+            return 0
+        gravity = getattr(settings, 'OSNAP_RANKING_GRAVITY', 1.8)
+        return hot_score(upvotes - downvotes, self.submit_date,
+                         gravity=gravity, now=now)
+
+    def compute_confidence(self, upvotes, downvotes):
+        return wilson_lower_bound(upvotes, downvotes)
 
     def clean(self):
         # This means, "if there are both or neither."
@@ -75,7 +139,160 @@ class Story(models.Model):
                 code='both_types'
             )
 
+    def update_link_fields(self):
+        """
+        Fills in `canonical_url`, `url_hash` and `domain` from `url`.
+        (`save` calls this, so you only need it if you're bypassing `save`.)
+        """
+        if self.url:
+            # It's only for looking at (duplicates are found by the hash),
+            # so a long one can just be cut off.
+            max_length = self._meta.get_field('canonical_url').max_length
+            self.canonical_url = canonicalize_url(self.url)[:max_length]
+            self.url_hash = hash_url(self.url)
+            self.domain = domain_of(self.url)
+        else:
+            self.canonical_url = self.url_hash = self.domain = ''
+
+    def _domain_stats(self, domain, published, points):
+        # What this story adds to its domain's stats.
+        if domain and published:
+            return {domain: (1, points)}
+        return {}
+
+    def _non_vote_fields(self):
+        # The vote counters and scores are kept up to date by UPDATE queries
+        # as votes come in, so saving the story shouldn't write whatever
+        # (possibly stale) values it has in memory over them.
+        vote_fields = Story.votes.counters + Story.votes.scores
+        return [f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in vote_fields]
+
+    def save(self, *args, **kwargs):
+        self.update_link_fields()
+        kwargs['update_fields'] = update_rendered_field(
+            self, 'text', kwargs.get('update_fields')
+        )
+
+        with transaction.atomic():
+            old_stats = {}
+            if self.pk is not None:
+                # Lock the row, so a vote can't change its points between
+                # reading them here and adjusting the domain's stats.
+                old = Story.objects.select_for_update().filter(pk=self.pk) \
+                           .values_list('domain', 'published',
+                                        'upvotes', 'downvotes').first()
+                if old is not None:
+                    old_stats = self._domain_stats(old[0], old[1],
+                                                   old[2] - old[3])
+                    if kwargs.get('update_fields') is None:
+                        kwargs['update_fields'] = self._non_vote_fields()
+                    if 'upvotes' not in kwargs['update_fields']:
+                        # So the counts stay as they are in the database.
+                        self.upvotes, self.downvotes = old[2], old[3]
+
+            super(Story, self).save(*args, **kwargs)
+
+            new_stats = self._domain_stats(self.domain, self.published,
+                                           self.points)
+            for domain in set(old_stats) | set(new_stats):
+                old_count, old_points = old_stats.get(domain, (0, 0))
+                new_count, new_points = new_stats.get(domain, (0, 0))
+                Domain.objects.adjust(domain, new_count - old_count,
+                                      new_points - old_points)
+
+        recent_links = get_recent_link_filter()
+        if self.url_hash and recent_links is not None:
+            recent_links.add(self.url_hash, self.submit_date)
+
     def get_absolute_url(self):
         from django.core.urlresolvers import reverse
         return reverse('osnap_story_detail', kwargs={'id': self.id})
 
+
+@python_2_unicode_compatible
+class Domain(models.Model):
+    """
+    Statistics about the published stories linking to a domain. These are
+    kept up to date as stories are saved, deleted and voted on, so they
+    never have to be counted.
+    """
+    objects = DomainManager()
+
+    name        = models.CharField(_("name"), max_length=200, unique=True)
+
+    story_count = models.IntegerField(_("story count"), default=0,
+                    help_text=_("How many published stories link here."))
+    total_points = models.IntegerField(_("total points"), default=0,
+                    help_text=_("The sum of those stories' points."))
+
+    class Meta:
+        verbose_name = _("domain")
+        verbose_name_plural = _("domains")
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def average_points(self):
+        if not self.story_count:
+            return 0.0
+        return self.total_points / float(self.story_count)
+
+    def get_absolute_url(self):
+        from django.core.urlresolvers import reverse
+        return reverse('osnap_domain_stories', kwargs={'domain': self.name})
+
+
+@receiver(pre_delete, sender=Story)
+def lock_deleted_story(sender, instance, **kwargs):
+    # Votes are counted with UPDATE queries, so the instance being deleted
+    # may not have the latest counts. (Deleting happens in a transaction,
+    # so the lock is held until the row is gone.)
+    row = Story.objects.select_for_update().filter(pk=instance.pk) \
+               .values_list('domain', 'published', 'upvotes', 'downvotes') \
+               .first()
+    if row is not None:
+        (instance.domain, instance.published,
+         instance.upvotes, instance.downvotes) = row
+
+
+@receiver(post_delete, sender=Story)
+def remove_story_from_domain(sender, instance, **kwargs):
+    if instance.domain and instance.published:
+        Domain.objects.adjust(instance.domain, -1, -instance.points)
+
+
+@receiver(vote_counts_changed, sender=Story)
+def update_domain_points(sender, item, upvotes, downvotes, **kwargs):
+    if item.domain and item.published:
+        Domain.objects.adjust(item.domain, 0, upvotes - downvotes)
+
+
+def story_changed(story_id):
+    """
+    Invalidates everything cached about a story: its fragments, its page,
+    and the story listings.
+    """
+    bump_story_version(story_id)
+    pagecache.invalidate('stories', 'story:%s' % story_id)
+
+
+@receiver(post_save, sender=Story)
+@receiver(post_delete, sender=Story)
+def invalidate_saved_story(sender, instance, **kwargs):
+    story_changed(instance.pk)
+
+
+@receiver(post_vote)
+@receiver(post_remove_vote)
+def invalidate_voted_story(sender, vote, **kwargs):
+    # The sender is the item being voted on.
+    if isinstance(sender, Story):
+        story_changed(sender.pk)
+
+
+@receiver(post_bulk_vote, sender=Story)
+def invalidate_bulk_voted_stories(sender, votes, **kwargs):
+    for story_id in set(vote.object_id for vote in votes):
+        story_changed(story_id)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.pagination
+========================
+Keyset (or "cursor") pagination. Instead of counting rows with ``OFFSET``,
+each page picks up where the last one left off, using an index -- so page
+1000 costs as little as page 1, however big the table is.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+from django.utils.encoding import force_bytes, force_text
+from django.utils.translation import ugettext as _
+
+
+def encode_cursor(value, pk):
+    """
+    Turns a sort value and a primary key into an opaque, URL-safe token.
+    """
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    else:
+        value = repr(value)
+    token = urlsafe_b64encode(force_bytes("%s~%d" % (value, pk)))
+    return force_text(token.rstrip(b'='))
+
+
+def decode_cursor(token, field):
+    """
+    Turns a token from `encode_cursor` back into a sort value (converted by
+    `field`) and a primary key.
+
+    :raises ValueError: If the token is invalid.
+    """
+    try:
+        token = force_bytes(token)
+        raw = force_text(urlsafe_b64decode(token + b'=' * (-len(token) % 4)))
+        value, pk = raw.rsplit('~', 1)
+        value = field.to_python(value)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError, ValidationError):
+        raise ValueError("Invalid cursor")
+
+    if value is None:
+        raise ValueError("Invalid cursor")
+    return value, pk
+
+
+class KeysetPage(object):
+    """
+    One page of results from `KeysetPaginationMixin`. It's used in templates
+    as the `page_obj`.
+    """
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        #: The objects on the page.
+        self.object_list = object_list
+        #: The token for the next page, or `None` if this is the last page.
+        self.next_cursor = next_cursor
+        #: The token for the previous page, or `None` if this is the first.
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin(object):
+    """
+    Replaces `ListView`'s page-number pagination with keyset pagination.
+    The list is sorted by `keyset_field` then primary key, both descending,
+    so there should be an index on ``(keyset_field, id)``.
+
+    Pages after the first are selected with ``?after=<cursor>`` or
+    ``?before=<cursor>``, and the cursors are available in templates as
+    ``page_obj.next_cursor`` and ``page_obj.previous_cursor``.
+    (``osnap/stories/pager.html`` renders the links.)
+
+    If `paginate_by` isn't set, pages hold `OSNAP_STORIES_PER_PAGE` objects.
+    """
+    keyset_field = None
+    paginate_by = None
+
+    def get_paginate_by(self, queryset):
+        if self.paginate_by is not None:
+            return self.paginate_by
+        return getattr(settings, 'OSNAP_STORIES_PER_PAGE', 30)
+
+    def get_queryset(self):
+        queryset = super(KeysetPaginationMixin, self).get_queryset()
+        return queryset.order_by('-' + self.keyset_field, '-pk')
+
+    def _get_cursor(self, name):
+        token = self.request.GET.get(name)
+        if not token:
+            return None
+
+        field = self.model._meta.get_field(self.keyset_field)
+        try:
+            return decode_cursor(token, field)
+        except ValueError:
+            raise Http404(_("Invalid page cursor."))
+
+    def paginate_queryset(self, queryset, page_size):
+        key = self.keyset_field
+        after = self._get_cursor('after')
+        before = self._get_cursor('before')
+
+        if before is not None:
+            # Walk backwards from the cursor, then flip the results around.
+            value, pk = before
+            queryset = queryset.filter(
+                Q(**{key + '__gt': value}) | Q(**{key: value, 'pk__gt': pk})
+            ).order_by(key, 'pk')
+            objects = list(queryset[:page_size + 1])
+            more_before = len(objects) > page_size
+            objects = objects[:page_size][::-1]
+            more_after = True
+        else:
+            if after is not None:
+                value, pk = after
+                queryset = queryset.filter(
+                    Q(**{key + '__lt': value}) | Q(**{key: value, 'pk__lt': pk})
+                )
+            objects = list(queryset[:page_size + 1])
+            more_after = len(objects) > page_size
+            objects = objects[:page_size]
+            more_before = after is not None
+
+        if objects:
+            first, last = objects[0], objects[-1]
+            next_cursor = (encode_cursor(getattr(last, key), last.pk)
+                           if more_after else None)
+            previous_cursor = (encode_cursor(getattr(first, key), first.pk)
+                               if more_before else None)
+        else:
+            next_cursor = previous_cursor = None
+
+        page = KeysetPage(objects, next_cursor, previous_cursor)
+        return (None, page, objects, page.has_other_pages())
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.templatetags.story_tags
+=====================================
+Template tags for displaying stories.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django import template
+
+from ..fragments import get_story_fragments
+
+register = template.Library()
+
+
+@register.assignment_tag
+def story_fragments(stories):
+    """
+    Returns ``(story, fragment)`` pairs for a list of stories, where the
+    fragment is the story's cached, viewer-independent HTML. Use it like::
+
+        {% story_fragments stories as entries %}
+        {% for story, fragment in entries %}...{% endfor %}
+    """
+    return get_story_fragments(stories)
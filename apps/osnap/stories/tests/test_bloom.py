@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.tests.test_bloom
+==============================
+These test the Bloom filters used to pre-filter duplicate links.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from snaketest import SnakeTestMixin
+
+from ..bloom import BloomFilter, RecentLinkFilter, RollingBloomFilter
+from ..models import Story
+from ..utils import hash_url
+
+class BloomFilterTests(SimpleTestCase, SnakeTestMixin):
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.01)
+        for n in range(1000):
+            bloom.add("key%d" % n)
+
+        self.assert_true(all("key%d" % n in bloom for n in range(1000)))
+        false_positives = sum("other%d" % n in bloom for n in range(10000))
+        self.assert_true(false_positives < 300)
+        self.assert_almost_equal(bloom.false_positive_rate, 0.01, 2)
+        self.assert_true(bloom.memory_size < 1300)
+
+    def test_rolling_bloom_filter(self):
+        now = timezone.now()
+        rolling = RollingBloomFilter(timedelta(hours=6), 100, 0.01)
+        rolling.add("fresh")
+        rolling.add("stale", now - timedelta(hours=4))
+        rolling.add("ancient", now - timedelta(hours=7))
+
+        self.assert_in("fresh", rolling)
+        self.assert_in("stale", rolling)
+        self.assert_not_in("ancient", rolling)
+        self.assert_not_in("never", rolling)
+        self.assert_true(0 < rolling.false_positive_rate < 0.01)
+        self.assert_true(rolling.memory_size > 0)
+
+
+class RecentLinkFilterTests(TestCase, SnakeTestMixin):
+    def test_sync(self):
+        story = Story.objects.create(title="Link", url="http://example.com/")
+        recent = RecentLinkFilter(48)
+
+        with self.assert_num_queries(1):
+            self.assert_true(recent.might_contain(story.url_hash))
+        other = hash_url("http://example.org/")
+        with self.assert_num_queries(0):
+            self.assert_false(recent.might_contain(other))
+
+    def test_sync_out_of_order(self):
+        recent = RecentLinkFilter(48, sync_interval=0)
+        Story.objects.create(id=100, title="Fast",
+                             url="http://example.com/fast")
+        recent.sync()
+
+        # This story got its primary key and submit date first, but its
+        # transaction committed after the last sync.
+        late = Story.objects.create(
+            id=50, title="Slow", url="http://example.com/slow",
+            submit_date=timezone.now() - timedelta(seconds=30)
+        )
+        self.assert_true(recent.might_contain(late.url_hash))
+
+    def test_find_duplicate_link_skips_database(self):
+        draft = Story(title="Brand new", url="http://example.net/new")
+        Story.objects.find_duplicate_link(draft, 48)
+        with self.assert_num_queries(0):
+            self.assert_none(Story.objects.find_duplicate_link(draft, 48))
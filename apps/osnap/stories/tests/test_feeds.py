@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.tests.test_feeds
+==============================
+These test the RSS and Atom feeds.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from xml.dom import minidom
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from snaketest import SnakeTestMixin
+
+from ..models import Story
+
+class FeedTests(TestCase, SnakeTestMixin):
+    def setUp(self):
+        cache.clear()
+        self.link = Story.objects.create(title="A link",
+                                         url="http://example.com/a")
+        self.post = Story.objects.create(title="A post", text="Hello")
+
+    def get_feed(self, url, **headers):
+        response = self.client.get(url, **headers)
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+        return response, content
+
+    def titles(self, content, tag):
+        dom = minidom.parseString(content)
+        return [node.getElementsByTagName('title')[0].firstChild.data
+                for node in dom.getElementsByTagName(tag)]
+
+    def test_rss_and_atom(self):
+        response, content = self.get_feed('/stories/new/feed.rss')
+        self.assert_true(response.streaming)
+        self.assert_equal(self.titles(content, 'item'), ["A post", "A link"])
+
+        response, content = self.get_feed('/stories/new/feed.atom')
+        self.assert_equal(self.titles(content, 'entry'), ["A post", "A link"])
+        self.assert_in(b'http://example.com/a', content)
+
+    def test_descriptions_are_html(self):
+        Story.objects.create(title="Markup", text="*Hi* <script>")
+        response, content = self.get_feed('/stories/new/feed.rss')
+        dom = minidom.parseString(content)
+        description = dom.getElementsByTagName('description')[1]
+        self.assert_equal(description.firstChild.data,
+                          "<p><em>Hi</em> &lt;script&gt;</p>")
+
+    def test_feeds_are_cached(self):
+        response, first = self.get_feed('/feed.rss')
+        last_modified = response['Last-Modified']
+
+        with self.assert_num_queries(1):
+            response, cached = self.get_feed('/feed.rss')
+        self.assert_false(response.streaming)
+        self.assert_equal(cached, first)
+
+        response, content = self.get_feed(
+            '/feed.rss', HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assert_equal(response.status_code, 304)
+
+        # A new story means a new feed.
+        Story.objects.create(title="Breaking news", text="Hi")
+        response, content = self.get_feed('/feed.rss')
+        self.assert_in("Breaking news", self.titles(content, 'item'))
+
+    def test_cached_per_site(self):
+        self.get_feed('/feed.rss')
+        response, content = self.get_feed('/feed.rss',
+                                          HTTP_HOST='mirror.example.org')
+        self.assert_true(response.streaming)
+        self.assert_in(b'http://mirror.example.org/', content)
+
+        response, content = self.get_feed('/feed.rss',
+                                          **{'wsgi.url_scheme': 'https'})
+        self.assert_true(response.streaming)
+        self.assert_in(b'https://testserver', content)
+
+    def test_domain_feed(self):
+        response, content = self.get_feed('/domains/example.com/feed.atom')
+        self.assert_equal(self.titles(content, 'entry'), ["A link"])
+
+        response = self.client.get('/domains/example.net/feed.atom')
+        self.assert_equal(response.status_code, 404)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.tests.test_fragments
+==================================
+These test the cached story fragments.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from snaketest import SnakeTestMixin
+
+from osnap.people.models import User
+from ..fragments import FRAGMENT_KEY, get_story_fragments, get_story_versions
+from ..models import Story
+
+class StoryFragmentTests(TransactionTestCase, SnakeTestMixin):
+    # Caches are invalidated when transactions commit, and TestCase never
+    # commits.
+    def setUp(self):
+        self.voter = User.objects.create(username='voter',
+                                         email='voter@example.com')
+        self.story = Story.objects.create(title="Cached",
+                                          url="http://example.com/")
+
+    def get_fragment(self):
+        return self.get_fragment_of(self.story)
+
+    def get_fragment_of(self, story):
+        story = Story.objects.get(pk=story.pk)
+        return get_story_fragments([story])[0][1]
+
+    def test_fragments_are_cached(self):
+        html = self.get_fragment()
+        self.assert_in("0 points", html)
+
+        version = get_story_versions([self.story.pk])[self.story.pk]
+        key = FRAGMENT_KEY % (self.story.pk, version)
+        self.assert_equal(cache.get(key), html)
+
+        # Nothing has changed, so the cached copy is used.
+        cache.set(key, "From the cache")
+        self.assert_equal(self.get_fragment(), "From the cache")
+
+    def test_votes_invalidate(self):
+        self.get_fragment()
+        self.story.votes.add_vote(self.voter, +1)
+        self.assert_in("1 point", self.get_fragment())
+
+        self.story.votes.remove_vote(self.voter)
+        self.assert_in("0 points", self.get_fragment())
+
+    def test_saves_invalidate(self):
+        self.get_fragment()
+        self.story.title = "Renamed"
+        self.story.save()
+        self.assert_in("Renamed", self.get_fragment())
+
+    def test_invalidated_on_commit(self):
+        version = get_story_versions([self.story.pk])[self.story.pk]
+        with transaction.atomic():
+            self.story.title = "Renamed"
+            self.story.save()
+            self.assert_equal(
+                get_story_versions([self.story.pk])[self.story.pk], version
+            )
+        self.assert_not_equal(
+            get_story_versions([self.story.pk])[self.story.pk], version
+        )
+
+    def test_submitter_changes_invalidate(self):
+        self.story.submitter = self.voter
+        self.story.save()
+        self.assert_in("voter", self.get_fragment())
+
+        # Logging in doesn't change anything they show.
+        version = get_story_versions([self.story.pk])[self.story.pk]
+        self.voter.last_login = self.voter.date_joined
+        self.voter.save(update_fields=['last_login'])
+        self.assert_equal(
+            get_story_versions([self.story.pk])[self.story.pk], version
+        )
+
+        self.voter.username = 'renamed'
+        self.voter.save()
+        self.assert_not_equal(
+            get_story_versions([self.story.pk])[self.story.pk], version
+        )
+        self.assert_in("renamed", self.get_fragment())
+
+        self.voter.delete()
+        self.assert_in("a ghost", self.get_fragment())
+
+    def test_listing_page(self):
+        self.story.votes.add_vote(self.voter, +1)
+        self.client.get('/')
+        response = self.client.get('/')
+        self.assertContains(response, "1 point")
+        self.assertContains(response, "example.com")
+
+    def test_odd_hosts(self):
+        odd = Story.objects.create(title="IPv6", url="http://[2001:db8::1]/x")
+        self.assert_equal(odd.domain, "")
+        self.assertContains(self.client.get('/'), "IPv6")
+
+        # Stories saved before domains were checked are shown without a
+        # link to their domain.
+        Story.objects.filter(pk=odd.pk).update(domain="2001:db8::1")
+        cache.clear()
+        html = self.get_fragment_of(odd)
+        self.assert_in("IPv6", html)
+        self.assert_not_in("/domains/", html)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.tests.test_managers
+=================================
+These test the database functionality in `StoryManager`.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.test import TestCase
+from django.utils import timezone
+
+from snaketest import SnakeTestMixin
+
+from osnap.people.models import User
+from ..models import Domain, Story
+
+class DuplicateLinkTests(TestCase, SnakeTestMixin):
+    def test_find_duplicate_link(self):
+        original = Story.objects.create(title="Original",
+                    url="http://www.example.com/news/?utm_source=feed")
+        self.assert_equal(original.canonical_url, "example.com/news")
+
+        draft = Story(title="Again", url="https://example.com/news#top")
+        self.assert_equal(Story.objects.find_duplicate_link(draft, 48),
+                          original)
+        self.assert_none(Story.objects.find_duplicate_link(draft, 0))
+
+        Story.objects.filter(pk=original.pk) \
+                     .update(submit_date=timezone.now() - timedelta(days=3))
+        self.assert_none(Story.objects.find_duplicate_link(draft, 48))
+
+    def test_backfill_url_hashes(self):
+        link = Story.objects.create(title="Link", url="http://example.com/")
+        text = Story.objects.create(title="Text", text="Hi")
+        Story.objects.update(canonical_url='', url_hash='', domain='')
+        Domain.objects.all().delete()
+
+        call_command('backfill_url_hashes', batch_size=1, verbosity=0)
+
+        self.assert_fields_equal(Story.objects.get(pk=link.pk),
+                                 canonical_url="example.com",
+                                 url_hash=link.url_hash, domain="example.com")
+        self.assert_equal(Domain.objects.get(name="example.com").story_count,
+                          1)
+        self.assert_equal(Story.objects.get(pk=text.pk).url_hash, '')
+
+
+class DomainTests(TestCase, SnakeTestMixin):
+    def setUp(self):
+        self.voter = User.objects.create(username='voter',
+                                         email='voter@example.com')
+
+    def test_domain_stats(self):
+        first = Story.objects.create(title="First",
+                                     url="http://www.Example.com/1")
+        second = Story.objects.create(title="Second",
+                                      url="https://example.com/2")
+        first.votes.add_vote(self.voter, +1)
+        second.votes.add_vote(self.voter, -1)
+        first.votes.add_vote(self.voter, -1)
+
+        self.assert_equal(first.domain, "example.com")
+        self.assert_fields_equal(Domain.objects.get(name="example.com"),
+                                 story_count=2, total_points=-2,
+                                 average_points=-1.0)
+
+        second.published = False
+        second.save()
+        self.assert_fields_equal(Domain.objects.get(name="example.com"),
+                                 story_count=1, total_points=-1)
+
+        first.url = "http://example.org/1"
+        first.save()
+        self.assert_fields_equal(Domain.objects.get(name="example.com"),
+                                 story_count=0, total_points=0)
+        self.assert_fields_equal(Domain.objects.get(name="example.org"),
+                                 story_count=1, total_points=-1)
+
+        first.delete()
+        self.assert_fields_equal(Domain.objects.get(name="example.org"),
+                                 story_count=0, total_points=0)
+
+        # Deleting a stale copy takes away the points it has now.
+        third = Story.objects.create(title="Third",
+                                     url="http://example.org/3")
+        stale = Story.objects.get(pk=third.pk)
+        third.votes.add_vote(self.voter, +1)
+        stale.delete()
+        self.assert_fields_equal(Domain.objects.get(name="example.org"),
+                                 story_count=0, total_points=0)
+
+    def test_domain_view(self):
+        story = Story.objects.create(title="Link",
+                                     url="http://example.com/link")
+        Story.objects.create(title="Elsewhere", url="http://example.org/")
+
+        response = self.client.get('/domains/example.com/')
+        self.assert_equal(list(response.context['stories']), [story])
+        self.assert_equal(response.context['domain'].story_count, 1)
+
+        response = self.client.get('/domains/example.net/')
+        self.assert_equal(response.status_code, 404)
+
+
+class StoryRankTests(TestCase, SnakeTestMixin):
+    def setUp(self):
+        self.voters = [User.objects.create(username='voter%d' % n,
+                                           email='voter%d@example.com' % n)
+                       for n in range(3)]
+
+    def test_votes_rank_stories(self):
+        story = Story.objects.create(title="Hot off the presses",
+                                     url="http://example.com/hot")
+        for voter in self.voters:
+            story.votes.add_vote(voter, +1)
+
+        self.assert_fields_equal(story, upvotes=3, downvotes=0, points=3)
+        self.assert_true(story.rank > 0)
+        self.assert_true(story.confidence > 0)
+
+        saved = Story.objects.get(pk=story.pk)
+        self.assert_almost_equal(saved.rank, story.rank)
+
+    def test_refresh_ranks(self):
+        now = timezone.now()
+        recent = Story.objects.create(title="Recent", text="Hi",
+                                      submit_date=now - timedelta(hours=5))
+        ancient = Story.objects.create(title="Ancient", text="Hi",
+                                       submit_date=now - timedelta(days=30))
+        Story.objects.filter(pk__in=[recent.pk, ancient.pk]) \
+                     .update(upvotes=10, rank=100)
+
+        call_command('refresh_story_ranks', hours=48, verbosity=0)
+
+        recent = Story.objects.get(pk=recent.pk)
+        self.assert_almost_equal(recent.rank,
+                                 recent.compute_rank(10, 0, now), 3)
+        self.assert_equal(Story.objects.get(pk=ancient.pk).rank, 0)
+
+        # Voting on it doesn't bring its rank back.
+        ancient.votes.add_vote(self.voters[0], +1)
+        self.assert_fields_equal(Story.objects.get(pk=ancient.pk),
+                                 upvotes=11, rank=0)
+
+    def test_refresh_ranks_skips_changed_counts(self):
+        now = timezone.now()
+        stories = [Story.objects.create(title="Story %d" % n, text="Hi",
+                                        submit_date=now - timedelta(hours=n))
+                   for n in range(1, 4)]
+        voted = stories[1]
+
+        # Stands in for a vote that comes in after the batch is read.
+        compute_rank = Story.compute_rank
+        def compute_rank_during_vote(story, upvotes, downvotes, now=None):
+            if story.pk == voted.pk:
+                voted.votes.add_vote(self.voters[0], +1)
+            return compute_rank(story, upvotes, downvotes, now)
+
+        Story.compute_rank = compute_rank_during_vote
+        try:
+            count = Story.objects.refresh_ranks(hours=48, batch_size=2)
+        finally:
+            Story.compute_rank = compute_rank
+
+        self.assert_equal(count, 2)
+        voted = Story.objects.get(pk=voted.pk)
+        self.assert_equal(voted.upvotes, 1)
+        self.assert_almost_equal(voted.rank, voted.compute_rank(1, 0), 3)
+
+    def test_save_keeps_vote_counts(self):
+        story = Story.objects.create(title="Stale", text="Hi")
+        stale = Story.objects.get(pk=story.pk)
+        story.votes.add_vote(self.voters[0], +1)
+
+        stale.title = "Edited"
+        stale.save()
+        self.assert_fields_equal(Story.objects.get(pk=story.pk),
+                                 title="Edited", upvotes=1)
+
+    def test_front_page_order(self):
+        now = timezone.now()
+        old = Story.objects.create(title="Old", text="Hi",
+                                   submit_date=now - timedelta(hours=10))
+        new = Story.objects.create(title="New", text="Hi")
+        old.votes.add_vote(self.voters[0], +1)
+
+        response = self.client.get('/')
+        self.assert_equal(list(response.context['stories']), [old, new])
+
+        response = self.client.get('/stories/new/')
+        self.assert_equal(list(response.context['stories']), [new, old])
+
+
+class StoryListingTests(TestCase, SnakeTestMixin):
+    def setUp(self):
+        self.viewer = User.objects.create(username='viewer',
+                                          email='viewer@example.com')
+        for n in range(5):
+            submitter = User.objects.create(username='submitter%d' % n,
+                                            email='sub%d@example.com' % n)
+            story = Story.objects.create(title="Story %d" % n, text="Hi",
+                                         submitter=submitter)
+            if n % 2:
+                story.votes.add_vote(self.viewer, +1)
+
+    def render_listing(self, user):
+        stories = list(Story.objects.for_listing(user))
+        return render_to_string('osnap/stories/list.html',
+                                {'stories': stories})
+
+    def test_listing_queries(self):
+        # One for the stories and submitters, one for the viewer's votes.
+        with self.assert_num_queries(2):
+            html = self.render_listing(self.viewer)
+        self.assert_equal(html.count('voted-up'), 2)
+        self.assert_in('submitter4', html)
+
+        with self.assert_num_queries(1):
+            html = self.render_listing(AnonymousUser())
+        self.assert_not_in('voted-up', html)
@@ -8,7 +8,7 @@ These test custom Python code in our models.
 :license:   GNU GPL version 2 or later, see LICENSE for details
 """
 from __future__ import unicode_literals
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
 
 from snaketest import SnakeTestMixin
 
@@ -20,15 +20,24 @@ class StoryModelTests(SimpleTestCase, SnakeTestMixin):
                      url="http://www.example.com/")
 
         self.assert_str(link, "Best Web site ever")
-        self.assert_equal(link.domain, "www.example.com")
+        link.update_link_fields()
+        self.assert_equal(link.domain, "example.com")
 
         question = Story(title="How do I get into Red Hat Tower?",
                          text="I just wanted to see the Linux but "
                               "the security guard threw me out. :-(")
 
         self.assert_str(question, "How do I get into Red Hat Tower?")
+        question.update_link_fields()
         self.assert_equal(question.domain, "")
 
+    def test_long_canonical_url(self):
+        # Quotes come out three times longer once they're re-encoded.
+        link = Story(url="http://example.com/?q=" + '"' * 170)
+        link.update_link_fields()
+        self.assert_equal(len(link.canonical_url), 200)
+        self.assert_true(link.canonical_url.startswith("example.com?q=%22"))
+
     def test_get_absolute_url(self):
         # Besides coverage, the main goal of testing this is to avoid
         # breaking links.
@@ -51,3 +60,12 @@ class StoryModelTests(SimpleTestCase, SnakeTestMixin):
         story.url = ""
         self.assert_model_validates(story)
 
+
+class StoryMarkdownTests(TestCase, SnakeTestMixin):
+    def test_text_rendered_on_save(self):
+        story = Story.objects.create(title="Post",
+                                     text="[Click me](javascript:alert(1))")
+        self.assert_equal(story.text_html, '<p><a href="">Click me</a></p>')
+
+        response = self.client.get(story.get_absolute_url())
+        self.assertContains(response, '<a href="">Click me</a>', html=True)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.tests.test_pagecache
+==================================
+These test the page cache for anonymous visitors on the story pages.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from snaketest import SnakeTestMixin
+
+from osnap import pagecache
+from osnap.people.models import User
+from ..models import Story
+
+@override_settings(OSNAP_PAGE_CACHE_ENABLED=True)
+class PageCacheTests(TransactionTestCase, SnakeTestMixin):
+    # Caches are invalidated when transactions commit, and TestCase never
+    # commits.
+    def setUp(self):
+        self.story = Story.objects.create(title="First story", text="Hi")
+
+    def test_cached_until_invalidated(self):
+        self.assertContains(self.client.get('/'), "First story")
+        with self.assert_num_queries(0):
+            self.assertContains(self.client.get('/'), "First story")
+
+        Story.objects.create(title="Second story", text="Hi")
+        self.assertContains(self.client.get('/'), "Second story")
+
+    def test_story_page_invalidated_by_votes(self):
+        voter = User.objects.create(username='voter',
+                                    email='voter@example.com')
+        url = self.story.get_absolute_url()
+        self.assertContains(self.client.get(url), "0 points")
+
+        self.story.votes.add_vote(voter, +1)
+        self.assertContains(self.client.get(url), "1 point")
+
+    def test_stale_while_locked(self):
+        self.client.get('/')
+        Story.objects.create(title="Second story", text="Hi")
+
+        # Pretend another worker is already rendering the new page.
+        request = RequestFactory().get('/')
+        lock = pagecache.LOCK_KEY % pagecache._page_key(request)
+        cache.add(lock, 1)
+        try:
+            self.assertNotContains(self.client.get('/'), "Second story")
+        finally:
+            cache.delete(lock)
+
+        self.assertContains(self.client.get('/'), "Second story")
+
+    @override_settings(OSNAP_PAGE_CACHE_LOCK_WAIT=0.1)
+    def test_nothing_to_serve_while_locked(self):
+        request = RequestFactory().get('/')
+        lock = pagecache.LOCK_KEY % pagecache._page_key(request)
+        cache.add(lock, 1)
+        try:
+            # Nobody stores it in time, so it's rendered anyway.
+            self.assertContains(self.client.get('/'), "First story")
+        finally:
+            cache.delete(lock)
+
+    def test_unknown_params_share_a_page(self):
+        self.client.get('/')
+        with self.assert_num_queries(0):
+            self.assertContains(self.client.get('/?utm_source=x'),
+                                "First story")
+
+        request = RequestFactory().get('/', {'after': 'abc'})
+        self.assert_not_equal(pagecache._page_key(request),
+                              pagecache._page_key(RequestFactory().get('/')))
+
+    def test_logged_in_not_cached(self):
+        self.client.get('/')
+        User.objects.create_user('reader', 'reader@example.com', 'pass')
+        self.client.login(username='reader', password='pass')
+        response = self.client.get('/')
+        self.assert_in('stories', response.context)
+
+
+class ConditionalGetTests(TransactionTestCase, SnakeTestMixin):
+    # ETags come from tag versions, which change when transactions commit.
+    def setUp(self):
+        self.author = User.objects.create(username='author',
+                                          email='author@example.com')
+        self.story = Story.objects.create(title="Story", text="Hi",
+                                          submitter=self.author)
+        self.url = self.story.get_absolute_url()
+
+    def assert_revalidates(self, url, changed, queries):
+        etag = self.client.get(url)['ETag']
+        with self.assert_num_queries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assert_equal(response.status_code, 304)
+
+        changed()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assert_equal(response.status_code, 200)
+
+    def test_story_etag(self):
+        voter = User.objects.create(username='voter',
+                                    email='voter@example.com')
+        self.assert_revalidates(self.url,
+                                lambda: self.story.votes.add_vote(voter, +1), 1)
+
+    def test_story_etag_follows_submitter(self):
+        def rename():
+            self.author.full_name = "Arthur Author"
+            self.author.save()
+        self.assert_revalidates(self.url, rename, 1)
+
+    def test_profile_etag(self):
+        def rename():
+            self.author.biography = "I write things."
+            self.author.save()
+        self.assert_revalidates('/~author/', rename, 0)
+
+    def test_unpublished_story(self):
+        Story.objects.filter(pk=self.story.pk).update(published=False)
+        response = self.client.get(self.url)
+        self.assert_equal(response.status_code, 404)
+        self.assert_false(response.has_header('ETag'))
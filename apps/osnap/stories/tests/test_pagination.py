@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.stories.tests.test_pagination
+===================================
+These test the keyset pagination on the story listings.
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from datetime import timedelta
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from snaketest import SnakeTestMixin
+
+from ..models import Story
+from ..pagination import decode_cursor, encode_cursor
+
+@override_settings(OSNAP_STORIES_PER_PAGE=2)
+class KeysetPaginationTests(TestCase, SnakeTestMixin):
+    def setUp(self):
+        now = timezone.now()
+        # Stories 0 and 1 share a submit date, so the ID breaks the tie.
+        self.stories = [
+            Story.objects.create(title="Story %d" % n, text="Hi",
+                                 submit_date=now - timedelta(hours=n // 2))
+            for n in range(5)
+        ]
+
+    def get_page(self, query=''):
+        response = self.client.get('/stories/new/' + query)
+        self.assert_equal(response.status_code, 200)
+        return response.context['page_obj']
+
+    def test_cursor_round_trip(self):
+        field = Story._meta.get_field('submit_date')
+        story = self.stories[3]
+        self.assert_equal(decode_cursor(encode_cursor(story.submit_date,
+                                                      story.pk), field),
+                          (story.submit_date, story.pk))
+        self.assert_raises(ValueError, decode_cursor, 'garbage!', field)
+
+    def test_walk_pages(self):
+        s = self.stories
+        first = self.get_page()
+        self.assert_equal(list(first), [s[1], s[0]])
+        self.assert_false(first.has_previous())
+
+        second = self.get_page('?after=' + first.next_cursor)
+        self.assert_equal(list(second), [s[3], s[2]])
+        self.assert_true(second.has_previous())
+
+        last = self.get_page('?after=' + second.next_cursor)
+        self.assert_equal(list(last), [s[4]])
+        self.assert_false(last.has_next())
+
+        back = self.get_page('?before=' + last.previous_cursor)
+        self.assert_equal(list(back), [s[3], s[2]])
+        self.assert_equal(back.next_cursor, second.next_cursor)
+
+        back = self.get_page('?before=' + back.previous_cursor)
+        self.assert_equal(list(back), [s[1], s[0]])
+        self.assert_false(back.has_previous())
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/stories/new/?after=nonsense')
+        self.assert_equal(response.status_code, 404)
@@ -13,7 +13,7 @@ from functools import wraps
 from django.test import SimpleTestCase
 from django.utils.six import text_type
 
-from ..utils import decorated_view
+from ..utils import canonicalize_url, decorated_view, domain_of, hash_url
 
 def stringify_inputs(f):
     @wraps(f)
@@ -51,8 +51,40 @@ class UtilityTests(SimpleTestCase):
         self.assertEquals(dispatch.dispatch(32), "spam-32")
         self.assertEquals(PrefixDispatcher.dispatch(dispatch, 32), "spam-32")
 
+    def test_decorated_view_stacked(self):
+        prefix = lambda f: lambda v: f("spam-" + v)
+
+        @decorated_view(stringify_inputs)
+        @decorated_view(prefix)
+        class DispatchTo(object):
+            def dispatch(self, v):
+                return v
+
+        self.assertEqual(DispatchTo().dispatch(32), "spam-32")
+
     def test_decorated_view_errors(self):
         with self.assertRaises(TypeError):
             # Well, we have a class with no 'dispatch' method right here...
             decorated_view(stringify_inputs)(UtilityTests)
 
+    def test_canonicalize_url(self):
+        canonical = "example.com/news/story?a=1&b=2"
+        for url in ["http://example.com/news/story?a=1&b=2",
+                    "https://www.example.com/news/story/?b=2&a=1",
+                    "http://EXAMPLE.com:80/news/story?a=1&utm_source=x&b=2",
+                    "http://example.com/news/story?b=2&a=1#comments"]:
+            self.assertEqual(canonicalize_url(url), canonical)
+            self.assertEqual(hash_url(url), hash_url(canonical))
+
+        self.assertEqual(canonicalize_url("http://example.com:8000/"),
+                         "example.com:8000")
+        self.assertNotEqual(hash_url("http://example.com/news/story"),
+                            hash_url("http://example.com/news/story?a=1"))
+
+    def test_domain_of(self):
+        self.assertEqual(domain_of("https://www.Example.com:8000/x"),
+                         "example.com")
+        self.assertEqual(domain_of("http://192.0.2.1/x"), "192.0.2.1")
+        # There's no URL to list these on, so they don't get a domain.
+        self.assertEqual(domain_of("http://[2001:db8::1]/x"), "")
+        self.assertEqual(domain_of("http://ex%20ample.com/"), "")
@@ -2,8 +2,9 @@
 """
 osnap.stories.urls
 ==================
-A default URLConf. Aside from the front page, this all uses ``stories/``
-as a prefix. (I may need to rethink this in the future.)
+A default URLConf. Aside from the front page and the per-domain listings,
+this all uses ``stories/`` as a prefix. (I may need to rethink this in the
+future.)
 
 :copyright: (C) 2013 Matthew Frazier
 :license:   GNU GPL version 2 or later, see LICENSE for details
@@ -12,7 +13,10 @@ from __future__ import unicode_literals
 from django.conf.urls import patterns
 from django.conf.urls import url
 
-from .views import FrontPageView, StoryDetailView, SubmitStoryView
+from .feeds import DomainStoriesFeed, FrontPageFeed, NewStoriesFeed
+from .views import (DomainStoriesView, FrontPageView, NewStoriesView,
+                    StoryDetailView, SubmitStoryView)
+from .utils import DOMAIN_PATTERN
 
 urlpatterns = patterns("",
     url(
@@ -20,6 +24,32 @@ urlpatterns = patterns("",
         view=FrontPageView.as_view(),
         name="osnap_front_page"
     ),
+    url(
+        regex=r"^feed\.(?P<format>rss|atom)$",
+        view=FrontPageFeed.as_view(),
+        name="osnap_front_page_feed"
+    ),
+    url(
+        regex=r"^stories/new/$",
+        view=NewStoriesView.as_view(),
+        name="osnap_new_stories"
+    ),
+    url(
+        regex=r"^stories/new/feed\.(?P<format>rss|atom)$",
+        view=NewStoriesFeed.as_view(),
+        name="osnap_new_stories_feed"
+    ),
+    url(
+        regex=r"^domains/(?P<domain>%s)/$" % DOMAIN_PATTERN,
+        view=DomainStoriesView.as_view(),
+        name="osnap_domain_stories"
+    ),
+    url(
+        regex=r"^domains/(?P<domain>%s)/feed\.(?P<format>rss|atom)$" %
+              DOMAIN_PATTERN,
+        view=DomainStoriesFeed.as_view(),
+        name="osnap_domain_stories_feed"
+    ),
     url(
         regex=r"^stories/(?P<id>\d+)/$",
         view=StoryDetailView.as_view(),
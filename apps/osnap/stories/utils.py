@@ -8,7 +8,26 @@ Industry-standard `utils.py` file full of random stuff.
 :license:   GNU GPL version 2 or later, see LICENSE for details
 """
 from __future__ import unicode_literals
+import hashlib
+import re
+from urllib import urlencode
+from urlparse import parse_qsl, urlsplit
+
 from django.utils.decorators import method_decorator
+from django.utils.encoding import force_bytes, force_text
+
+#: Query parameters that only say where a link was shared, not what it
+#: points to. (Anything starting with ``utm_`` is stripped as well.)
+TRACKING_PARAMETERS = frozenset(['fbclid', 'gclid', 'ref_src'])
+
+#: What a domain can look like. The per-domain URLs use this too, so every
+#: domain `domain_of` returns can be linked to.
+DOMAIN_PATTERN = r"[\w.-]+"
+
+_domain_re = re.compile(r"^%s$" % DOMAIN_PATTERN, re.UNICODE)
+
+#: How long the hex digests from `hash_url` are.
+URL_HASH_LENGTH = 40
 
 def decorated_view(decorator):
     """
@@ -24,6 +43,9 @@ def decorated_view(decorator):
         for parent in cls.__mro__:
             if 'dispatch' in parent.__dict__:
                 dispatch = parent.__dict__['dispatch']
+                # The first one found is the one that gets called, and it
+                # may already be decorated.
+                break
 
         if dispatch is None:
             raise TypeError("%s is missing a dispatch method" % cls.__name__)
@@ -34,3 +56,69 @@ def decorated_view(decorator):
         return cls
     return decorate
 
+
+def _normalize_host(host):
+    host = (host or '').rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+def domain_of(url):
+    """
+    Returns the domain `url` points to, lowercased and without any leading
+    ``www.`` or port, which is what `Story.domain` stores. Hosts that don't
+    look like domains (IPv6 addresses, say) give an empty string, since
+    there's nowhere to list their stories.
+
+    :param url: The URL to find the domain of.
+    """
+    host = _normalize_host(urlsplit(url.strip()).hostname)
+    return host if _domain_re.match(host) else ''
+
+
+def canonicalize_url(url):
+    """
+    Reduces a URL to a canonical form, so that trivially different links to
+    the same page compare equal. The scheme, a leading ``www.``, default
+    ports, trailing slashes, tracking parameters (like ``utm_source``), and
+    the fragment are all dropped, the host is lowercased, and the remaining
+    query parameters are sorted.
+
+    The result isn't a usable URL any more, just something to compare.
+    It's usually shorter than the original, but not always -- the query
+    is re-encoded, which can expand some characters -- so truncate it
+    before storing it anywhere with a length limit. (`hash_url` hashes the
+    whole thing.)
+
+    :param url: The URL to canonicalize.
+    """
+    parts = urlsplit(url.strip())
+
+    host = _normalize_host(parts.hostname)
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port not in (80, 443):
+        host = '%s:%d' % (host, port)
+
+    path = parts.path.rstrip('/')
+
+    params = [(k, v) for (k, v) in
+              parse_qsl(force_bytes(parts.query), keep_blank_values=True)
+              if not (k.startswith(b'utm_') or k in TRACKING_PARAMETERS)]
+    query = urlencode(sorted(params))
+
+    return host + path + ('?' + force_text(query) if query else '')
+
+
+def hash_url(url):
+    """
+    Returns the fixed-width hash of `url`'s canonical form, which is what
+    `Story.url_hash` stores.
+
+    :param url: The URL to hash.
+    """
+    canonical = canonicalize_url(url)
+    return force_text(hashlib.sha1(force_bytes(canonical)).hexdigest())
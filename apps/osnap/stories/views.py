@@ -9,26 +9,93 @@ Views for working with stories directly. (All class-based, of course.)
 """
 from __future__ import unicode_literals
 from django.http import HttpResponseRedirect
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
 from django.views.generic import ListView, DetailView
 from django.views.generic.edit import CreateView
 from django.utils.translation import ugettext as _
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 
+from osnap.comments.models import Comment
+from osnap.pagecache import cache_anonymous_page, get_tag_version, page_etag
+
 from .forms import StorySubmitForm
-from .models import Story
+from .fragments import get_story_versions
+from .models import Domain, Story
+from .pagination import KeysetPaginationMixin
 from .utils import decorated_view
 
 # Create your views here.
 
-class FrontPageView(ListView):
+class StoryListView(KeysetPaginationMixin, ListView):
+    """
+    The base for views that list published stories, a page at a time.
+    Subclasses set `keyset_field` to choose the order.
+    """
     model = Story
     queryset = Story.objects.filter(published=True)
 
-    template_name = "osnap/front-page.html"
     context_object_name = "stories"
 
+    def get_queryset(self):
+        queryset = super(StoryListView, self).get_queryset()
+        return queryset.for_listing(self.request.user)
+
+
+@decorated_view(cache_anonymous_page('stories'))
+class FrontPageView(StoryListView):
+    keyset_field = 'rank'
+
+    template_name = "osnap/front-page.html"
+
+
+@decorated_view(cache_anonymous_page('stories'))
+class NewStoriesView(StoryListView):
+    keyset_field = 'submit_date'
+
+    template_name = "osnap/stories/new.html"
+
 
+@decorated_view(cache_anonymous_page('stories'))
+class DomainStoriesView(StoryListView):
+    keyset_field = 'submit_date'
+
+    template_name = "osnap/stories/domain.html"
+
+    def get(self, request, *args, **kwargs):
+        self.domain = get_object_or_404(Domain, name=kwargs['domain'])
+        return super(DomainStoriesView, self).get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super(DomainStoriesView, self).get_queryset()
+        return queryset.filter(domain=self.domain.name)
+
+    def get_context_data(self, **kwargs):
+        context = super(DomainStoriesView, self).get_context_data(**kwargs)
+        context['domain'] = self.domain
+        return context
+
+
+def story_etag(request, id):
+    """
+    Builds the story page's ETag from one small query and two cache lookups,
+    so that clients re-checking a story don't make us render it.
+    """
+    row = Story.objects.filter(pk=id, published=True) \
+               .values_list('submit_date', 'upvotes', 'downvotes',
+                            'submitter__username').first()
+    if row is None:
+        return None
+
+    submit_date, upvotes, downvotes, username = row
+    return page_etag(request, 'story', id, submit_date.isoformat(),
+                     upvotes, downvotes, get_story_versions([id])[id],
+                     get_tag_version('user:%s' % username) if username else '')
+
+
+@decorated_view(condition(etag_func=story_etag))
+@decorated_view(cache_anonymous_page('story:{id}'))
 class StoryDetailView(DetailView):
     model = Story
     queryset = Story.objects.filter(published=True)
@@ -38,6 +105,14 @@ class StoryDetailView(DetailView):
     template_name = "osnap/stories/detail.html"
     context_object_name = "story"
 
+    def get_context_data(self, **kwargs):
+        context = super(StoryDetailView, self).get_context_data(**kwargs)
+        context['thread'] = Comment.objects.thread_page(
+            self.object, after=self.request.GET.get('after'),
+            user=self.request.user
+        )
+        return context
+
 
 @decorated_view(login_required)
 class SubmitStoryView(CreateView):
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+osnap.transactions
+==================
+Runs code after the current transaction commits. Cache invalidation needs
+this: if a version is bumped while the transaction is still open, another
+process can read the new version and the old rows, and cache the old rows
+under the new version, where they'll stay.
+
+(Newer versions of Django have `transaction.on_commit`, which does the
+same thing.)
+
+:copyright: (C) 2013 Matthew Frazier
+:license:   GNU GPL version 2 or later, see LICENSE for details
+"""
+from __future__ import unicode_literals
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def on_commit(func, using=None):
+    """
+    Calls `func` (with no arguments) once the transaction that's open on the
+    `using` database commits, or right away if there isn't one. If the
+    transaction is rolled back, `func` is never called.
+
+    Functions added inside a savepoint that's rolled back are still called
+    when the transaction commits, so `func` should be harmless to call when
+    nothing changed -- like invalidating a cache is.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if connection.get_autocommit():
+        func()
+    else:
+        _get_hooks(connection).append(func)
+
+
+def _get_hooks(connection):
+    hooks = getattr(connection, 'osnap_commit_hooks', None)
+    if hooks is not None:
+        return hooks
+
+    # Every commit and rollback, whether it's from atomic or the older
+    # transaction functions, ends up at one of these.
+    hooks = connection.osnap_commit_hooks = []
+    commit, rollback = connection.commit, connection.rollback
+
+    def commit_and_run_hooks():
+        commit()
+        pending = hooks[:]
+        del hooks[:]
+        for func in pending:
+            func()
+
+    def rollback_and_discard_hooks():
+        del hooks[:]
+        rollback()
+
+    connection.commit = commit_and_run_hooks
+    connection.rollback = rollback_and_discard_hooks
+    return hooks
@@ -89,6 +89,57 @@ USE_TZ = True
 
 ########## OSNAP CONFIGURATION
 OSNAP_DUPLICATE_FILTER_HOURS = 48
+
+# The in-memory filter that lets most submissions skip the duplicate check:
+# how many links it expects per OSNAP_DUPLICATE_FILTER_HOURS, how often it
+# gives a false alarm, how many seconds between checks for stories submitted
+# to other processes, and how many seconds each check overlaps the last (so
+# stories that take a while to commit aren't missed).
+OSNAP_DUPLICATE_PREFILTER = True
+OSNAP_DUPLICATE_PREFILTER_CAPACITY = 10000
+OSNAP_DUPLICATE_PREFILTER_ERROR_RATE = 0.001
+OSNAP_DUPLICATE_PREFILTER_SYNC = 5
+OSNAP_DUPLICATE_PREFILTER_OVERLAP = 300
+
+# How quickly story ranks decay, and how many hours back the
+# refresh_story_ranks command recalculates them.
+OSNAP_RANKING_GRAVITY = 1.8
+OSNAP_RANKING_HORIZON_HOURS = 72
+
+# How many stories are shown on each page of a story listing.
+OSNAP_STORIES_PER_PAGE = 30
+
+# How many seconds a rendered story or comment fragment stays in the cache.
+# (Fragments are invalidated when what they show changes, so this only
+# limits how long stale ones take up space.)
+OSNAP_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Pages for visitors who aren't logged in are served from the cache for
+# OSNAP_PAGE_CACHE_TIMEOUT seconds, then served stale for up to
+# OSNAP_PAGE_CACHE_STALE_TIMEOUT more while one worker (holding the lock
+# for at most OSNAP_PAGE_CACHE_LOCK_TIMEOUT seconds) renders a new copy.
+# If there's no copy to serve, the other workers wait for it for up to
+# OSNAP_PAGE_CACHE_LOCK_WAIT seconds.
+OSNAP_PAGE_CACHE_ENABLED = True
+OSNAP_PAGE_CACHE_TIMEOUT = 60
+OSNAP_PAGE_CACHE_STALE_TIMEOUT = 600
+OSNAP_PAGE_CACHE_LOCK_TIMEOUT = 30
+OSNAP_PAGE_CACHE_LOCK_WAIT = 5
+
+# How many stories are in each feed, and how many seconds a rendered feed is
+# cached for. (Feeds are also regenerated when a new story is submitted.)
+OSNAP_FEED_ITEMS = 30
+OSNAP_FEED_CACHE_TIMEOUT = 60 * 5
+
+# How many top-level comments are shown on each page of a story's thread,
+# how many levels of replies are loaded with them (deeper ones are a click
+# away), and how deeply comments can be nested at all.
+OSNAP_COMMENT_THREADS_PER_PAGE = 50
+OSNAP_COMMENT_DEPTH = 8
+OSNAP_COMMENT_MAX_DEPTH = 40
+
+# How many entries are shown on each page of a user's recent activity.
+OSNAP_ACTIVITY_PER_PAGE = 20
 ########## END OSNAP CONFIGURATION
 
 
@@ -247,6 +298,8 @@ OUR_REUSABLE_APPS = (
 OSNAP_APPS = (
     'osnap.stories',
     'osnap.people',
+    'osnap.comments',
+    'osnap.activity',
 )
 
 # See: https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
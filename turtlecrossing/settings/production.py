@@ -64,7 +64,15 @@ DATABASES = {}
 
 ########## CACHE CONFIGURATION
 # See: https://docs.djangoproject.com/en/dev/ref/settings/#caches
-CACHES = {}
+# The page and fragment caches need a cache that's shared between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': environ.get('MEMCACHED_LOCATION',
+                                '127.0.0.1:11211').split(','),
+        'KEY_PREFIX': 'txing',
+    }
+}
 ########## END CACHE CONFIGURATION
 
 
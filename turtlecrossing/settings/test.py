@@ -21,4 +21,11 @@ DATABASES = {
         "PORT": "",
     },
 }
+########## END IN-MEMORY TEST DATABASE
 
+
+########## PAGE CACHE
+# Most tests look at the context of the responses they get, which cached
+# pages don't have. The page cache's own tests turn it back on.
+OSNAP_PAGE_CACHE_ENABLED = False
+########## END PAGE CACHE
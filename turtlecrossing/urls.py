@@ -25,5 +25,9 @@ urlpatterns = patterns('',
     url(r'^', include('osnap.stories.urls')),
 
     url(r'^', include('osnap.people.urls')),
+
+    url(r'^', include('osnap.comments.urls')),
+
+    url(r'^democracy/', include('democracy.urls')),
 )
 